@@ -0,0 +1,105 @@
+from helpers import *
+from usage_telemetry import usage_summary, reset_usage_stats
+from structured_verdicts import print_batched_judge_stats
+from metrics import true_positive_rate, true_negative_rate
+import response_cache
+from sklearn.metrics import f1_score
+import pandas as pd
+import statistics
+import time
+from datetime import datetime
+
+# Measure the batched statement judges on the labelled HaluEval and SummEval rows stored under 'Data/'.
+# Every summary is judged by the per-statement loop and by the batched judge with one batch per sentence and with one
+# batch per summary, one call at a time and without the response cache, such that the latencies compare.
+# The statements are extracted once per summary before the judges run and are shared by the three modes.
+# It reports the latency, the judge calls and the prompt and completion tokens of each mode, how often the predictions
+# of a batched mode agree with the loop and the F1 score, TPR and TNR of each mode.
+
+# TODO: Set parameters for the number of rows per dataset, the strategy, the judging model and the lexical threshold
+n = 25
+strategy = "statement_level"
+judging_LLM = "gpt4o_mini"
+lexical_threshold = None
+
+strategies = {"statement_level": lambda *args, **options: (statement_level(*args, **options), None),
+              "chain_tailored_thoughts": chain_tailored_thoughts}
+modes = {"per statement": None, "sentence": "sentence", "summary": "summary"}
+
+response_cache.disable_response_cache()
+
+datasets = {
+    "HaluEval": pd.read_csv("Data/HaluEval/chain_tailored_thoughts.csv"),
+    "SummEval": pd.read_csv("Data/SummEval/Sentence_Level.csv"),
+}
+
+results = []
+
+for (dataset, df) in datasets.items():
+    df = df.dropna(subset=['Document']).iloc[:n]
+    print("-" * 100)
+    print(f"BENCHMARKING THE BATCHED {strategy.upper()} JUDGE ON {len(df)} {dataset} SUMMARIES ...")
+    print("-" * 100)
+
+    judgements = {mode: [] for mode in modes}
+    for i in range(len(df)):
+        row = df.iloc[i]
+        document = row['Document']
+        label = int(row['True Label'])
+        summary = row['Hallucinated Summary'] if label == 1 else row['Right Summary']
+
+        decomposition = SummaryDecomposition(summary)
+        statements = sum(len(decomposition.get_statements(sentence)) for sentence in decomposition.get_sentences())
+
+        # The modes alternate per summary, such that a drift in the API latency affects all alike
+        for (mode, batch_statements) in modes.items():
+            reset_usage_stats()
+            start = time.perf_counter()
+            (prediction, _) = strategies[strategy](judging_LLM, document, summary, decomposition, lexical_threshold=lexical_threshold, batch_statements=batch_statements)
+            seconds = time.perf_counter() - start
+            usage = usage_summary().get(strategy, {})
+            judgements[mode].append({'Label': label,
+                                     'Prediction': prediction,
+                                     'Statements': statements,
+                                     'Seconds': seconds,
+                                     'Calls': usage.get("calls", 0),
+                                     'Prompt Tokens': usage.get("prompt_tokens", 0),
+                                     'Completion Tokens': usage.get("completion_tokens", 0)})
+        print(f"Row {row['Row']}: " + ", ".join(f"{records[-1]['Seconds']:.2f}s {mode}" for (mode, records) in judgements.items()))
+
+    result = {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+              'Dataset': dataset,
+              'Strategy': strategy,
+              'Judging LLM': judging_LLM,
+              'Lexical Threshold': lexical_threshold,
+              'Number of Summaries': len(df),
+              'Number of Statements': sum(record['Statements'] for record in judgements['per statement'])}
+    for (mode, records) in judgements.items():
+        name = mode.title()
+        true_labels = [record['Label'] for record in records]
+        predictions = [record['Prediction'] for record in records]
+        seconds = [record['Seconds'] for record in records]
+        result.update({f'Mean Latency ({name})': statistics.mean(seconds),
+                       f'Median Latency ({name})': statistics.median(seconds),
+                       f'Judge Calls ({name})': sum(record['Calls'] for record in records),
+                       f'Prompt Tokens ({name})': sum(record['Prompt Tokens'] for record in records),
+                       f'Completion Tokens ({name})': sum(record['Completion Tokens'] for record in records),
+                       f'F1 Score ({name})': f1_score(true_labels, predictions),
+                       f'TPR ({name})': true_positive_rate(true_labels, predictions),
+                       f'TNR ({name})': true_negative_rate(true_labels, predictions)})
+        if mode != 'per statement':
+            result[f'Agreement ({name})'] = statistics.mean(batched['Prediction'] == looped['Prediction']
+                                                            for (batched, looped) in zip(records, judgements['per statement']))
+            result[f'Token Drop ({name})'] = 1 - ((result[f'Prompt Tokens ({name})'] + result[f'Completion Tokens ({name})'])
+                                                  / max(1, result['Prompt Tokens (Per Statement)'] + result['Completion Tokens (Per Statement)']))
+            result[f'Latency Drop ({name})'] = 1 - result[f'Mean Latency ({name})'] / result['Mean Latency (Per Statement)']
+    results.append(result)
+
+print("-" * 100)
+print("Results:\n")
+results = pd.DataFrame(results)
+print(results.to_string(index=False))
+print_batched_judge_stats()
+
+# Append the new results to the existing CSV file
+results.to_csv("batched_judge_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("batched_judge_benchmark_results.csv"), index=False)
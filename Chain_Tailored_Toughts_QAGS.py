@@ -1,6 +1,8 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
+from live_metrics import LiveMetrics
 import pandas as pd
 from datetime import datetime
 
@@ -19,6 +21,12 @@ print(df_hallucinated.__len__)
 # TODO: Set parameters for the number of rows to analyse
 n = 60
 
+# TODO: Set the sentence splitter, "llm" for the gpt4o_mini extractor or "rule" for the local splitter
+sentence_splitter = "llm"
+
+# TODO: Set the lexical support threshold to skip the judge for statements contained in a document sentence, None to judge every statement
+lexical_threshold = None
+
 # Initialize lists to store true labels and predicted labels for F1 score calculation
 true_labels = []
 baseline_preds = []
@@ -29,6 +37,15 @@ gpt4o_mini_cott_sentence_level_preds = []
 gpt4o_mini_cott_statement_level_preds = []
 count = 0
 
+# Running metrics printed after every row, see live_metrics.py
+live_metrics = LiveMetrics(total=n)
+live_cells = {("baseline", "gpt4o_mini"): baseline_preds,
+              ("sentence_level", "gpt4o_mini"): gpt4o_mini_sentence_level_preds,
+              ("statement_level", "gpt4o_mini"): gpt4o_mini_statement_level_preds,
+              ("chain_thoughts", "gpt4o_mini"): gpt4o_mini_cot_preds,
+              ("chain_tailored_thoughts_sentence", "gpt4o_mini"): gpt4o_mini_cott_sentence_level_preds,
+              ("chain_tailored_thoughts", "gpt4o_mini"): gpt4o_mini_cott_statement_level_preds}
+
 for i in range(len(df_hallucinated)):
     
     if count == n:
@@ -70,22 +87,25 @@ for i in range(len(df_hallucinated)):
     print(text.upper())
     true_labels.append(0)
     
+    # Extract the sentences and statements once and share them between the decomposed strategies
+    right_summary_decomposition = SummaryDecomposition(right_summary, sentence_splitter=sentence_splitter)
+    
     baseline_pred = baseline(document, right_summary, 'gpt4o_mini')
     baseline_preds.append(baseline_pred)
         
-    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, right_summary)   
+    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, right_summary, right_summary_decomposition)   
     gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
     
-    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, right_summary)   
+    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, right_summary, right_summary_decomposition, lexical_threshold=lexical_threshold)   
     gpt4o_mini_statement_level_preds.append(gpt4o_mini_statement_level_pred)
                 
     (gpt4o_mini_cot_pred, gpt4o_mini_cot_reasoning) = chain_thoughts(document, right_summary)
     gpt4o_mini_cot_preds.append(gpt4o_mini_cot_pred)
 
-    (gpt4o_mini_cott_sentence_level_pred, gpt4o_mini_cott_sentence_level_reasoning) = chain_tailored_thoughts_sentence("gpt4o_mini", document, right_summary)
+    (gpt4o_mini_cott_sentence_level_pred, gpt4o_mini_cott_sentence_level_reasoning) = chain_tailored_thoughts_sentence("gpt4o_mini", document, right_summary, right_summary_decomposition)
     gpt4o_mini_cott_sentence_level_preds.append(gpt4o_mini_cott_sentence_level_pred)
     
-    (gpt4o_mini_cott_statement_level_pred, gpt4o_mini_cott_statement_level_reasoning) = chain_tailored_thoughts("gpt4o_mini", document, right_summary)
+    (gpt4o_mini_cott_statement_level_pred, gpt4o_mini_cott_statement_level_reasoning) = chain_tailored_thoughts("gpt4o_mini", document, right_summary, right_summary_decomposition, lexical_threshold=lexical_threshold)
     gpt4o_mini_cott_statement_level_preds.append(gpt4o_mini_cott_statement_level_pred)
     
     
@@ -118,22 +138,25 @@ for i in range(len(df_hallucinated)):
     print(text.upper())
     true_labels.append(1) 
     
+    # Extract the sentences and statements once and share them between the decomposed strategies
+    hallucinated_summary_decomposition = SummaryDecomposition(hallucinated_summary, sentence_splitter=sentence_splitter)
+    
     baseline_pred = baseline(document, hallucinated_summary, 'gpt4o_mini')
     baseline_preds.append(baseline_pred)
     
-    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, hallucinated_summary)
+    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, hallucinated_summary, hallucinated_summary_decomposition)
     gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
     
-    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, hallucinated_summary)
+    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, hallucinated_summary, hallucinated_summary_decomposition, lexical_threshold=lexical_threshold)
     gpt4o_mini_statement_level_preds.append(gpt4o_mini_statement_level_pred)
     
     (gpt4o_mini_cot_pred, gpt4o_mini_cot_reasoning) = chain_thoughts(document, hallucinated_summary)
     gpt4o_mini_cot_preds.append(gpt4o_mini_cot_pred)
     
-    (gpt4o_mini_cott_sentence_level_pred, gpt4o_mini_cott_sentence_level_reasoning) = chain_tailored_thoughts_sentence("gpt4o_mini", document, hallucinated_summary)
+    (gpt4o_mini_cott_sentence_level_pred, gpt4o_mini_cott_sentence_level_reasoning) = chain_tailored_thoughts_sentence("gpt4o_mini", document, hallucinated_summary, hallucinated_summary_decomposition)
     gpt4o_mini_cott_sentence_level_preds.append(gpt4o_mini_cott_sentence_level_pred)
     
-    (gpt4o_mini_cott_statement_level_pred, gpt4o_mini_cott_statement_level_reasoning) = chain_tailored_thoughts("gpt4o_mini", document, hallucinated_summary)
+    (gpt4o_mini_cott_statement_level_pred, gpt4o_mini_cott_statement_level_reasoning) = chain_tailored_thoughts("gpt4o_mini", document, hallucinated_summary, hallucinated_summary_decomposition, lexical_threshold=lexical_threshold)
     gpt4o_mini_cott_statement_level_preds.append(gpt4o_mini_cott_statement_level_pred)
     
     
@@ -156,34 +179,41 @@ for i in range(len(df_hallucinated)):
     }])], ignore_index=True)
     
     count += 1
+
+    for ((strategy, LLM), preds) in live_cells.items():
+        live_metrics.update(strategy, LLM, true_labels[-2], preds[-2])
+        live_metrics.update(strategy, LLM, true_labels[-1], preds[-1])
+    live_metrics.advance()
     
     # Save the current iteration results to a CSV file
     results_per_iteration.to_csv("chain_tailored_thoughts.csv", mode='a', header=not pd.io.common.file_exists("chain_tailored_thoughts.csv"), index=False)
 
 
+live_metrics.close()
+
 print("-" * 100)
 print(f"Results after {n} iterations:\n")
 
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
+accuracies['baseline_TNR'] = true_negative_rate(true_labels, baseline_preds)
+accuracies['baseline_TPR'] = true_positive_rate(true_labels, baseline_preds)
 
-accuracies['gpt4o_mini_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_sentence_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_sentence_level_preds)
+accuracies['gpt4o_mini_sentence_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_sentence_level_preds)
 
-accuracies['gpt4o_mini_statement_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_statement_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_statement_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_statement_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_statement_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_statement_level_preds)
+accuracies['gpt4o_mini_statement_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_statement_level_preds)
 
-accuracies['gpt4o_mini_cot_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_cot_preds[i] == 0]) / n
-accuracies['gpt4o_mini_cot_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_cot_preds[i] == 1]) / n
+accuracies['gpt4o_mini_cot_TNR'] = true_negative_rate(true_labels, gpt4o_mini_cot_preds)
+accuracies['gpt4o_mini_cot_TPR'] = true_positive_rate(true_labels, gpt4o_mini_cot_preds)
 
-accuracies['gpt4o_mini_cott_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_cott_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_cott_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_cott_sentence_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_cott_sentence_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_cott_sentence_level_preds)
+accuracies['gpt4o_mini_cott_sentence_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_cott_sentence_level_preds)
 
-accuracies['gpt4o_mini_cott_statement_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_cott_statement_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_cott_statement_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_cott_statement_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_cott_statement_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_cott_statement_level_preds)
+accuracies['gpt4o_mini_cott_statement_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_cott_statement_level_preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
@@ -213,6 +243,9 @@ gpt4o_mini_cott_sentence_level_f1 = f1_score(true_labels, gpt4o_mini_cott_senten
 gpt4o_mini_cott_statement_level_f1 = f1_score(true_labels, gpt4o_mini_cott_statement_level_preds)
 
 
+if lexical_threshold is not None:
+    print_lexical_support_stats()
+
 print("Baseline F1 Score:", baseline_f1)
 print("GPT4o Mini Sentence Level F1 Score:", gpt4o_mini_sentence_level_f1)
 print("GPT4o Mini Statement Level F1 Score:", gpt4o_mini_statement_level_f1)
@@ -1,6 +1,7 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
@@ -146,19 +147,19 @@ print(f"Results after {n} iterations:\n")
 
 accuracies = {}
 
-accuracies['baseline_GPT35_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_gpt35_preds[i] == 0]) / n
-accuracies['baseline_GPT35_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_gpt35_preds[i] == 1]) / n
-accuracies['baseline_GPT4_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_gpt4_preds[i] == 0]) / n
-accuracies['baseline_GPT4_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_gpt4_preds[i] == 1]) / n
-accuracies['baseline_GPT4o_Mini_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_gpt4o_mini_preds[i] == 0]) / n
-accuracies['baseline_GPT4o_Mini_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_gpt4o_mini_preds[i] == 1]) / n
-
-accuracies['sentence_GPT35_TNR'] = sum([1 for i in range(0, 2*n, 2) if sentence_gpt35_preds[i] == 0]) / n
-accuracies['sentence_GPT35_TPR'] = sum([1 for i in range(1, 2*n, 2) if sentence_gpt35_preds[i] == 1]) / n
-accuracies['sentence_GPT4_TNR'] = sum([1 for i in range(0, 2*n, 2) if sentence_gpt4_preds[i] == 0]) / n
-accuracies['sentence_GPT4_TPR'] = sum([1 for i in range(1, 2*n, 2) if sentence_gpt4_preds[i] == 1]) / n
-accuracies['sentence_GPT4o_Mini_TNR'] = sum([1 for i in range(0, 2*n, 2) if sentence_gpt4o_mini_preds[i] == 0]) / n
-accuracies['sentence_GPT4o_Mini_TPR'] = sum([1 for i in range(1, 2*n, 2) if sentence_gpt4o_mini_preds[i] == 1]) / n
+accuracies['baseline_GPT35_TNR'] = true_negative_rate(true_labels, baseline_gpt35_preds)
+accuracies['baseline_GPT35_TPR'] = true_positive_rate(true_labels, baseline_gpt35_preds)
+accuracies['baseline_GPT4_TNR'] = true_negative_rate(true_labels, baseline_gpt4_preds)
+accuracies['baseline_GPT4_TPR'] = true_positive_rate(true_labels, baseline_gpt4_preds)
+accuracies['baseline_GPT4o_Mini_TNR'] = true_negative_rate(true_labels, baseline_gpt4o_mini_preds)
+accuracies['baseline_GPT4o_Mini_TPR'] = true_positive_rate(true_labels, baseline_gpt4o_mini_preds)
+
+accuracies['sentence_GPT35_TNR'] = true_negative_rate(true_labels, sentence_gpt35_preds)
+accuracies['sentence_GPT35_TPR'] = true_positive_rate(true_labels, sentence_gpt35_preds)
+accuracies['sentence_GPT4_TNR'] = true_negative_rate(true_labels, sentence_gpt4_preds)
+accuracies['sentence_GPT4_TPR'] = true_positive_rate(true_labels, sentence_gpt4_preds)
+accuracies['sentence_GPT4o_Mini_TNR'] = true_negative_rate(true_labels, sentence_gpt4o_mini_preds)
+accuracies['sentence_GPT4o_Mini_TPR'] = true_positive_rate(true_labels, sentence_gpt4o_mini_preds)
 
 
 print("Baseline GPT-3.5 TNR:", accuracies['baseline_GPT35_TNR'])
@@ -0,0 +1,163 @@
+from results_store import ResultsStore, load_results_store
+import os
+import shutil
+import time
+from datetime import datetime
+import pandas as pd
+
+# Convert the row-level CSV files under 'Data/' into the partitioned Parquet results store, one run per file,
+# and compare the size and the time to read the predictions of one strategy with reading the CSV files.
+
+# TODO: Set the root directory of the store, which is rebuilt
+root = "results_store"
+
+# The prediction columns of every file, as (strategy, model, columns joined into the details)
+files = {
+    "Data/HaluEval/Comparative_analysis.csv": {
+        "Baseline GPT-3.5 Prediction": ("baseline", "gpt35", []),
+        "Baseline GPT-4 Prediction": ("baseline", "gpt4", []),
+        "Baseline GPT-4o Mini Prediction": ("baseline", "gpt4o_mini", []),
+        "Sentence Level GPT-3.5 Prediction": ("sentence_level", "gpt35", []),
+        "Sentence Level GPT-4 Prediction": ("sentence_level", "gpt4", []),
+        "Sentence Level GPT-4o Mini Prediction": ("sentence_level", "gpt4o_mini", []),
+    },
+    "Data/HaluEval/Sentence_Level.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Sentence Level Prediction": ("sentence_level", "phi3", []),
+        "GPT4o Mini Sentence Level Prediction": ("sentence_level", "gpt4o_mini", []),
+        "GPT4o Sentence Level Prediction": ("sentence_level", "gpt4o", []),
+    },
+    "Data/HaluEval/statement_level.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Statement Level Prediction": ("statement_level", "phi3", []),
+        "GPT4o Mini Statement Level Prediction": ("statement_level", "gpt4o_mini", []),
+    },
+    "Data/HaluEval/statement_level_filtered.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "GPT4o Mini Statement Level Prediction": ("statement_level", "gpt4o_mini", []),
+    },
+    "Data/HaluEval/tailored_reasoning.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "GPT4o Mini Statement Level Prediction": ("tailored_reasoning", "gpt4o_mini", ["Reasoning"]),
+    },
+    "Data/HaluEval/chain_tailored_thoughts.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "GPT4o Mini Sentence Level Prediction": ("sentence_level", "gpt4o_mini", []),
+        "GPT4o Mini Statement Level Prediction": ("statement_level", "gpt4o_mini", []),
+        "GPT4o Mini CoT Prediction": ("chain_thoughts", "gpt4o_mini", ["GPT4o Mini CoT Reasoning"]),
+        "GPT4o Mini CoTT Sentence Level Prediction": ("chain_tailored_thoughts_sentence", "gpt4o_mini", ["GPT4o Mini CoTT Sentence Level Reasoning"]),
+        "GPT4o Mini CoTT Statement Level Prediction": ("chain_tailored_thoughts", "gpt4o_mini", ["GPT4o Mini CoTT Statement Level Reasoning"]),
+    },
+    "Data/HaluEval/Knowledge_Filtering.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Knowledge Optimized Prediction": ("knowledge_filtering", "phi3", ["Phi3 Filtered Document"]),
+        "GPT4o Mini Knowledge Optimized Prediction": ("knowledge_filtering", "gpt4o_mini", ["GPT4o Mini Filtered Document"]),
+        "GPT4o Knowledge Optimized Prediction": ("knowledge_filtering", "gpt4o", ["GPT4o Filtered Document"]),
+    },
+    "Data/HaluEval/counterfactual_debate.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Counterfactual Debate Prediction": ("counterfactual_debate", "phi3", ["Phi3 Debate Hallucinated", "Phi3 Debate Supported"]),
+        "GPT4o Mini Counterfactual Debate Prediction": ("counterfactual_debate", "gpt4o_mini", ["GPT4o Mini Debate Hallucinated", "GPT4o Mini Debate Supported"]),
+        "GPT4o Counterfactual Debate Prediction": ("counterfactual_debate", "gpt4o", ["GPT4o Debate Hallucinated", "GPT4o Debate Supported"]),
+    },
+    "Data/QAGS/chain_tailored_thoughts.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "GPT4o Mini Sentence Level Prediction": ("sentence_level", "gpt4o_mini", []),
+        "GPT4o Mini Statement Level Prediction": ("statement_level", "gpt4o_mini", []),
+        "GPT4o Mini CoT Prediction": ("chain_thoughts", "gpt4o_mini", ["GPT4o Mini CoT Reasoning"]),
+        "GPT4o Mini CoTT Sentence Level Prediction": ("chain_tailored_thoughts_sentence", "gpt4o_mini", ["GPT4o Mini CoTT Sentence Level Reasoning"]),
+        "GPT4o Mini CoTT Statement Level Prediction": ("chain_tailored_thoughts", "gpt4o_mini", ["GPT4o Mini CoTT Statement Level Reasoning"]),
+    },
+    "Data/SummEval/Sentence_Level.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Sentence Level Prediction": ("sentence_level", "phi3", []),
+        "GPT4o Mini Sentence Level Prediction": ("sentence_level", "gpt4o_mini", []),
+        "GPT4o Sentence Level Prediction": ("sentence_level", "gpt4o", []),
+    },
+    "Data/SummEval/Knowledge_Filtering.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Knowledge Optimized Prediction": ("knowledge_filtering", "phi3", ["Phi3 Filtered Document"]),
+        "GPT4o Mini Knowledge Optimized Prediction": ("knowledge_filtering", "gpt4o_mini", ["GPT4o Mini Filtered Document"]),
+        "GPT4o Knowledge Optimized Prediction": ("knowledge_filtering", "gpt4o", ["GPT4o Filtered Document"]),
+    },
+    "Data/SummEval/counterfactual_debate.csv": {
+        "Baseline Prediction": ("baseline", "gpt4o_mini", []),
+        "Phi3 Counterfactual Debate Prediction": ("counterfactual_debate", "phi3", ["Phi3 Debate Hallucinated", "Phi3 Debate Supported"]),
+        "GPT4o Mini Counterfactual Debate Prediction": ("counterfactual_debate", "gpt4o_mini", ["GPT4o Mini Debate Hallucinated", "GPT4o Mini Debate Supported"]),
+        "GPT4o Counterfactual Debate Prediction": ("counterfactual_debate", "gpt4o", ["GPT4o Debate Hallucinated", "GPT4o Debate Supported"]),
+    },
+}
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, file)) for (directory, _, names) in os.walk(path) for file in names)
+
+if os.path.isdir(root):
+    shutil.rmtree(root)
+
+# Section: convert every file into long records, one per judged summary and prediction column
+
+timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+for (path, columns) in files.items():
+    df = pd.read_csv(path)
+    # Files appended to by several runs repeat the header line
+    df = df[pd.to_numeric(df['Row'], errors='coerce').notna()]
+    dataset = path.split("/")[1]
+    store = ResultsStore(root, run=os.path.splitext(os.path.basename(path))[0])
+    records = []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        summary = row['Hallucinated Summary'] if int(float(row['True Label'])) == 1 else row['Right Summary']
+        for (column, (strategy, model, detail_columns)) in columns.items():
+            if pd.isna(row[column]):
+                continue
+            details = [row[detail] for detail in detail_columns if isinstance(row[detail], str)]
+            records.append({
+                'Timestamp': timestamp,
+                'Dataset': dataset,
+                'Row': int(float(row['Row'])),
+                'True Label': int(float(row['True Label'])),
+                'Strategy': strategy,
+                'Model': model,
+                'Prediction': int(float(row[column])),
+                'Details': "\n".join(details) if details else None,
+                'Error': None,
+                'Seconds': None,
+                'Document': row['Document'] if isinstance(row['Document'], str) else None,
+                'Summary': summary if isinstance(summary, str) else None,
+            })
+    store.write(records)
+    print(f"{path}: {store.stats['records']} records, {store.stats['texts']} new texts, {store.stats['deduplicated_texts']} deduplicated")
+
+# Section: compare the size and the time to read the predictions of one strategy
+
+csv_size = sum(os.path.getsize(path) for path in files)
+store_size = directory_size(root)
+
+start = time.perf_counter()
+csv_predictions = pd.concat([pd.read_csv(path) for path in files if "counterfactual_debate" in path], ignore_index=True)
+csv_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+store_predictions = load_results_store(root, columns=["Dataset", "Row", "True Label", "Model", "Prediction"],
+                                       filters={"Strategy": "counterfactual_debate"})
+store_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+full_store = load_results_store(root, with_texts=True)
+full_seconds = time.perf_counter() - start
+
+results = pd.DataFrame([{
+    'Timestamp': timestamp,
+    'Number of Records': len(full_store),
+    'CSV Size (KB)': csv_size / 1024,
+    'Store Size (KB)': store_size / 1024,
+    'Counterfactual Debate Predictions from CSV (ms)': 1000 * csv_seconds,
+    'Counterfactual Debate Predictions from Store (ms)': 1000 * store_seconds,
+    'Predictions Read from Store': len(store_predictions),
+    'Full Store with Texts (ms)': 1000 * full_seconds,
+}])
+print("Results:\n")
+print(results.to_string(index=False))
+
+# Append the new results to the existing CSV file
+results.to_csv("convert_results_store_results.csv", mode='a', header=not pd.io.common.file_exists("convert_results_store_results.csv"), index=False)
@@ -0,0 +1,83 @@
+from cost_planner import plan_run
+import pandas as pd
+from datetime import datetime
+
+# Dry run of an experiment script: the calls, tokens, cost and duration it will take, without any API call.
+# The summaries are read from the CSV files under 'Data/'; every row of the experiment judges a right and a hallucinated summary.
+
+# TODO: Set the experiment, the number of rows, the concurrency per model (None for the synchronous scripts) and whether the Batch API is used
+experiment = "Chain_Tailored_Toughts_QAGS"
+n = 60
+concurrency = None
+batch = False
+# TODO: Set to True when the decomposition is shared between strategies or the response cache is on, identical prompts are then sent once
+deduplicate = True
+
+# The strategies of the experiment scripts, as (strategy, LLM) pairs
+experiments = {
+    "Chain_Tailored_Toughts_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("sentence_level", "gpt4o_mini"), ("statement_level", "gpt4o_mini"), ("chain_thoughts", None), ("chain_tailored_thoughts_sentence", "gpt4o_mini"), ("chain_tailored_thoughts", "gpt4o_mini")]),
+    "Chain_Tailored_Toughts_QAGS": ("QAGS", [("baseline", "gpt4o_mini"), ("sentence_level", "gpt4o_mini"), ("statement_level", "gpt4o_mini"), ("chain_thoughts", None), ("chain_tailored_thoughts_sentence", "gpt4o_mini"), ("chain_tailored_thoughts", "gpt4o_mini")]),
+    "Chain_Tailored_Toughts_SummEval": ("SummEval", [("baseline", "gpt4o_mini"), ("sentence_level", "gpt4o_mini"), ("statement_level", "gpt4o_mini"), ("chain_thoughts", None), ("chain_tailored_thoughts_sentence", "gpt4o_mini"), ("chain_tailored_thoughts", "gpt4o_mini")]),
+    "Counterfactual_Debate_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("counterfactual_debate", "phi3"), ("counterfactual_debate", "gpt4o_mini"), ("counterfactual_debate", "gpt4o")]),
+    "Counterfactual_Debate_SummEval": ("SummEval", [("baseline", "gpt4o_mini"), ("counterfactual_debate_modified", "phi3"), ("counterfactual_debate_modified", "gpt4o_mini"), ("counterfactual_debate_modified", "gpt4o")]),
+    "Collaborative_Debate_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("collaborative_debate", "phi3"), ("collaborative_debate", "gpt4o_mini"), ("collaborative_debate", "gpt4o")]),
+    "Knowledge_Filtering_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("knowledge_filtering", "phi3"), ("knowledge_filtering", "gpt4o_mini"), ("knowledge_filtering", "gpt4o"), ("knowledge_filtering", "bm25")]),
+    "Knowledge_Filtering_SummEval": ("SummEval", [("baseline", "gpt4o_mini"), ("knowledge_filtering", "phi3"), ("knowledge_filtering", "gpt4o_mini"), ("knowledge_filtering", "gpt4o"), ("knowledge_filtering", "bm25")]),
+    "Sentence_Level_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("sentence_level", "phi3"), ("sentence_level", "gpt4o_mini"), ("sentence_level", "gpt4o")]),
+    "Statement_Level_HaluEval": ("HaluEval", [("baseline", "gpt4o_mini"), ("statement_level", "gpt4o_mini")]),
+}
+
+def load_summaries(dataset: str) -> list:
+    # (document, summary, label) tuples, a right and a hallucinated summary per row
+    if dataset == "QAGS":
+        correct = pd.read_csv("Data/QAGS/correct.csv").sample(frac=1, random_state=42).reset_index(drop=True)
+        hallucinated = pd.read_csv("Data/QAGS/hallucinated.csv").sample(frac=1, random_state=42).reset_index(drop=True)
+        rows = min(n, len(correct), len(hallucinated))
+        return [(frame.iloc[i]['article'], frame.iloc[i]['summary'], label) for i in range(rows) for (frame, label) in ((correct, 0), (hallucinated, 1))]
+
+    df = pd.read_csv(f"Data/{dataset}/Sentence_Level.csv" if dataset == "SummEval" else f"Data/{dataset}/chain_tailored_thoughts.csv")
+    summaries = []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        summary = row['Hallucinated Summary'] if row['True Label'] == 1 else row['Right Summary']
+        if isinstance(row['Document'], str) and isinstance(summary, str):
+            summaries.append((row['Document'], summary, int(row['True Label'])))
+    # The stored rows hold one summary each, the experiment judges 2 * n summaries
+    return summaries[:2 * n]
+
+(dataset, strategies) = experiments[experiment]
+summaries = load_summaries(dataset)
+plan = plan_run(summaries, strategies, concurrency, batch, deduplicate)
+
+print("-" * 100)
+print(f"PLAN FOR {experiment} ON {plan['summaries']} SUMMARIES (tokenizer: {plan['tokenizer']})")
+print("-" * 100)
+
+per_strategy = pd.DataFrame(plan['strategies']).T
+print(per_strategy.round(3).to_string())
+print("-" * 100)
+print(f"Calls: {plan['expected_calls']:.0f} expected with early exit, {plan['max_calls']} at most")
+if plan['estimated_tokens']:
+    print("WARNING: tiktoken was not available, so the tokens, cost and duration are estimated from characters; install tiktoken or set TIKTOKEN_CACHE_DIR")
+print(f"Tokens: {plan['prompt_tokens']:.0f} prompt and {plan['completion_tokens']:.0f} completion tokens expected{' (estimated from characters)' if plan['estimated_tokens'] else ''}")
+print(f"Cost: ${plan['expected_cost']:.2f} expected, ${plan['max_cost']:.2f} at most{' with the Batch API' if batch else ''}")
+print(f"Duration: {plan['sequential_seconds'] / 60:.1f} minutes sequentially, {plan['wall_clock_seconds'] / 60:.1f} minutes at concurrency {concurrency}")
+
+# Append the plan to the existing CSV file
+results = pd.DataFrame([{
+    'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    'Experiment': experiment,
+    'Number of Summaries': plan['summaries'],
+    'Tokenizer': plan['tokenizer'],
+    'Concurrency': str(concurrency),
+    'Batch API': batch,
+    'Expected Calls': plan['expected_calls'],
+    'Max Calls': plan['max_calls'],
+    'Prompt Tokens': plan['prompt_tokens'],
+    'Completion Tokens': plan['completion_tokens'],
+    'Expected Cost ($)': plan['expected_cost'],
+    'Max Cost ($)': plan['max_cost'],
+    'Sequential Minutes': plan['sequential_seconds'] / 60,
+    'Wall Clock Minutes': plan['wall_clock_seconds'] / 60,
+}])
+results.to_csv("cost_planner_results.csv", mode='a', header=not pd.io.common.file_exists("cost_planner_results.csv"), index=False)
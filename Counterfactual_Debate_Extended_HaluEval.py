@@ -1,136 +1,67 @@
-from helpers import *
-from datasets import load_dataset
+from replay import load_transcripts, replay
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
-
-# Initialize lists to store true labels and predicted labels for F1 score calculation
-true_labels = []
-baseline_preds = []
-phi3_sentence_level_preds = []
-gpt4o_mini_sentence_level_preds = []
-gpt4o_sentence_level_preds = []
-
-# Read the csv
-results_per_iteration = pd.read_csv("counterfactual_debate.csv")
-
-for i in range(50):    
-    # Take row i
-    row = results_per_iteration.iloc[i]    
-    
-    # Extract pregenerated debates
-    debate_phi3 = "\n" + row['Phi3 Debate Hallucinated'] + "\n" + row['Phi3 Debate Supported'] + "\n"
-    debate_gpt4o_mini = "\n" + row['GPT4o Mini Debate Hallucinated'] + "\n" + row['GPT4o Mini Debate Supported'] + "\n"
-    debate_gpt4o = "\n" + row['GPT4o Debate Hallucinated'] + "\n" + row['GPT4o Debate Supported'] + "\n"
-    
-    print("-" * 100)
-    print("ANALYZING ROW", i+1, "OF", 50, "...")
-    print("-" * 100)
-
-    # Print the values of the selected row
-    document = row['Document']
-    print("Document:", document)
-    
-    right_summary = row['Right Summary']
-    halucinated_summary = row['Hallucinated Summary']
-
-    if i % 2 == 0:
-        print("Right Summary:", right_summary)
-        print("-" * 100)
-        
-        # Run the analysis for right summary
-        print("Running the process for a supported summary")
-        true_labels.append(0)
-        
-        baseline_pred = baseline(document, right_summary)
-        baseline_preds.append(baseline_pred)
-        
-        phi3_sentence_level_pred = counterfactual_debate_extended(document, right_summary, debate_phi3)
-        phi3_sentence_level_preds.append(phi3_sentence_level_pred)
-            
-        gpt4o_mini_sentence_level_pred = counterfactual_debate_extended(document, right_summary, debate_gpt4o_mini)
-        gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
-        
-        gpt4o_sentence_level_pred = counterfactual_debate_extended(document, right_summary, debate_gpt4o)
-        gpt4o_sentence_level_preds.append(gpt4o_sentence_level_pred)
-        
-    else:
-        print('Hallucinated Summary:', halucinated_summary)
-        print("-" * 100)
-        
-        # Run the analysis for hallucinated summary
-        print("Running the process for a hallucinated summary")
-        true_labels.append(1)
-        
-        baseline_pred = baseline(document, halucinated_summary)
-        baseline_preds.append(baseline_pred)
-        
-        phi3_sentence_level_pred = counterfactual_debate_extended(document, halucinated_summary, debate_phi3)
-        phi3_sentence_level_preds.append(phi3_sentence_level_pred)
-        
-        gpt4o_mini_sentence_level_pred = counterfactual_debate_extended(document, halucinated_summary, debate_gpt4o_mini)
-        gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
-        
-        gpt4o_sentence_level_pred = counterfactual_debate_extended(document, halucinated_summary, debate_gpt4o)
-        gpt4o_sentence_level_preds.append(gpt4o_sentence_level_pred)
+# Judge the summaries again from the debates stored by Counterfactual_Debate_HaluEval.py, with the extended judge.
+# Only the final judgement is run, for all debates concurrently, and the baseline predictions are read from the same file.
+
+# TODO: Set the file with the stored debates and the number of rows to judge again
+debates_file = "counterfactual_debate.csv"
+n = 25
+
+# TODO: Set the judge model, the judge prompt ("extended" or "reasoning") and the concurrency limit of the judge
+judge_LLM = "gpt4o"
+prompt = "extended"
+concurrency = {"gpt4o": 16}
+
+# The stored debates of each model, and the name of its results
+debaters = {"phi3_debate": "Phi3 Sentence Level",
+            "gpt4o_mini_debate": "GPT4o Mini Sentence Level",
+            "gpt4o_debate": "GPT4o Sentence Level"}
+
+stored = pd.read_csv(debates_file)
+stored = stored[pd.to_numeric(stored['Row'], errors='coerce').notna()]
+stored['Row'] = stored['Row'].astype(float).astype(int)
+stored['True Label'] = stored['True Label'].astype(float).astype(int)
+stored = stored.drop_duplicates(['Row', 'True Label'], keep='last')
+rows = sorted(set(stored['Row']))[:n]
+
+items = load_transcripts(debates_file, list(debaters), rows=rows)
+print(f"Judging {len(items)} stored debates of {len(rows)} rows again with {judge_LLM}")
+records = pd.DataFrame(replay(items, [judge_LLM], [prompt], concurrency=concurrency))
+
+failed = records[records['Prediction'].isna()]
+if len(failed):
+    print(f"{len(failed)} judgements failed and are left out of the metrics")
+
+# Take the labels and predictions per debater, and the stored baseline predictions of the same rows
+predictions = {}
+baseline = stored[stored['Row'].isin(rows)]
+predictions['Baseline'] = (baseline['True Label'].tolist(), baseline['Baseline Prediction'].astype(float).astype(int).tolist())
+for (transcript, name) in debaters.items():
+    judged = records[(records['Transcript'] == transcript) & records['Prediction'].notna()]
+    predictions[name] = (judged['True Label'].astype(int).tolist(), judged['Prediction'].astype(int).tolist())
 
 print("-" * 100)
-print(f"Results after 50 iterations:\n")
+print(f"Results after {len(rows)} rows:\n")
 
-# Calculate and print the accuracies
+# Calculate and print the accuracies and F1 scores
+results = {'Timestamp': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")]}
 accuracies = {}
-
-accuracies['baseline_TNR'] = sum([1 for i in range(0,  50, 2) if baseline_preds[i] == 0]) / 25
-accuracies['baseline_TPR'] = sum([1 for i in range(1,  50, 2) if baseline_preds[i] == 1]) / 25
-
-accuracies['phi3_sentence_level_TNR'] = sum([1 for i in range(0,  50, 2) if phi3_sentence_level_preds[i] == 0]) / 25
-accuracies['phi3_sentence_level_TPR'] = sum([1 for i in range(1,  50, 2) if phi3_sentence_level_preds[i] == 1]) / 25
-
-accuracies['gpt4o_mini_sentence_level_TNR'] = sum([1 for i in range(0,  50, 2) if gpt4o_mini_sentence_level_preds[i] == 0]) / 25
-accuracies['gpt4o_mini_sentence_level_TPR'] = sum([1 for i in range(1,  50, 2) if gpt4o_mini_sentence_level_preds[i] == 1]) / 25
-
-accuracies['gpt4o_sentence_level_TNR'] = sum([1 for i in range(0,  50, 2) if gpt4o_sentence_level_preds[i] == 0]) / 25
-accuracies['gpt4o_sentence_level_TPR'] = sum([1 for i in range(1,  50, 2) if gpt4o_sentence_level_preds[i] == 1]) / 25
-
-print("Baseline (TNR):", accuracies['baseline_TNR'])
-print("Baseline (TPR):", accuracies['baseline_TPR'])
-print("Phi3 Sentence Level (TNR):", accuracies['phi3_sentence_level_TNR'])
-print("Phi3 Sentence Level (TPR):", accuracies['phi3_sentence_level_TPR'])
-print("GPT4o Mini Sentence Level (TNR):", accuracies['gpt4o_mini_sentence_level_TNR'])
-print("GPT4o Mini Sentence Level (TPR):", accuracies['gpt4o_mini_sentence_level_TPR'])
-print("GPT4o Sentence Level (TNR):", accuracies['gpt4o_sentence_level_TNR'])
-print("GPT4o Sentence Level (TPR):", accuracies['gpt4o_sentence_level_TPR'])
-
-# Calculate and print the F1 scores
-baseline_f1 = f1_score(true_labels, baseline_preds)
-phi3_sentence_level_f1 = f1_score(true_labels, phi3_sentence_level_preds)
-gpt4o_mini_sentence_level_f1 = f1_score(true_labels, gpt4o_mini_sentence_level_preds)
-gpt4o_sentence_level_f1 = f1_score(true_labels, gpt4o_sentence_level_preds)
-
-print("Baseline F1 Score:", baseline_f1)
-print("Phi3 Sentence Level F1 Score:", phi3_sentence_level_f1)
-print("GPT4o Mini Sentence Level F1 Score:", gpt4o_mini_sentence_level_f1)
-print("GPT4o Sentence Level F1 Score:", gpt4o_sentence_level_f1)
+for (name, (labels, preds)) in predictions.items():
+    results[f'{name} F1 Score'] = [f1_score(labels, preds)]
+    accuracies[f'{name} (TPR)'] = true_positive_rate(labels, preds)
+    accuracies[f'{name} (TNR)'] = true_negative_rate(labels, preds)
+    print(f"{name} (TNR):", accuracies[f'{name} (TNR)'])
+    print(f"{name} (TPR):", accuracies[f'{name} (TPR)'])
+    print(f"{name} F1 Score:", results[f'{name} F1 Score'][0])
+for (name, accuracy) in accuracies.items():
+    results[name] = [accuracy]
 
 # Create a DataFrame for the new results
-results = pd.DataFrame({
-    'Timestamp': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-    'Baseline F1 Score': [baseline_f1],
-    'Phi3 Sentence Level F1 Score': [phi3_sentence_level_f1],
-    'GPT4o Mini Sentence Level F1 Score': [gpt4o_mini_sentence_level_f1],
-    'GPT4o Sentence Level F1 Score': [gpt4o_sentence_level_f1],
-    'Baseline (TPR)': [accuracies['baseline_TPR']],
-    'Baseline (TNR)': [accuracies['baseline_TNR']],
-    'Phi3 Sentence Level (TPR)': [accuracies['phi3_sentence_level_TPR']],
-    'Phi3 Sentence Level (TNR)': [accuracies['phi3_sentence_level_TNR']],
-    'GPT4o Mini Sentence Level (TPR)': [accuracies['gpt4o_mini_sentence_level_TPR']],
-    'GPT4o Mini Sentence Level (TNR)': [accuracies['gpt4o_mini_sentence_level_TNR']],
-    'GPT4o Sentence Level (TPR)': [accuracies['gpt4o_sentence_level_TPR']],
-    'GPT4o Sentence Level (TNR)': [accuracies['gpt4o_sentence_level_TNR']]
-})
+results = pd.DataFrame(results)
 
 # Append the new results to the existing CSV file
 results.to_csv("counterfactual_debate_extended_results.csv", mode='a', header=not pd.io.common.file_exists("counterfactual_debate_extended_results.csv"), index=False)
-
-        
\ No newline at end of file
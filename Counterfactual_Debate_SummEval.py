@@ -1,6 +1,7 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
@@ -128,17 +129,17 @@ print(f"Results after {n} iterations:\n")
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
+accuracies['baseline_TNR'] = true_negative_rate(true_labels, baseline_preds)
+accuracies['baseline_TPR'] = true_positive_rate(true_labels, baseline_preds)
 
-accuracies['phi3_counterfactual_debate_TNR'] = sum([1 for i in range(0, 2*n, 2) if phi3_counterfactual_debate_preds[i] == 0]) / n
-accuracies['phi3_counterfactual_debate_TPR'] = sum([1 for i in range(1, 2*n, 2) if phi3_counterfactual_debate_preds[i] == 1]) / n
+accuracies['phi3_counterfactual_debate_TNR'] = true_negative_rate(true_labels, phi3_counterfactual_debate_preds)
+accuracies['phi3_counterfactual_debate_TPR'] = true_positive_rate(true_labels, phi3_counterfactual_debate_preds)
 
-accuracies['gpt4o_mini_counterfactual_debate_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_counterfactual_debate_preds[i] == 0]) / n
-accuracies['gpt4o_mini_counterfactual_debate_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_counterfactual_debate_preds[i] == 1]) / n
+accuracies['gpt4o_mini_counterfactual_debate_TNR'] = true_negative_rate(true_labels, gpt4o_mini_counterfactual_debate_preds)
+accuracies['gpt4o_mini_counterfactual_debate_TPR'] = true_positive_rate(true_labels, gpt4o_mini_counterfactual_debate_preds)
 
-accuracies['gpt4o_counterfactual_debate_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_counterfactual_debate_preds[i] == 0]) / n
-accuracies['gpt4o_counterfactual_debate_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_counterfactual_debate_preds[i] == 1]) / n
+accuracies['gpt4o_counterfactual_debate_TNR'] = true_negative_rate(true_labels, gpt4o_counterfactual_debate_preds)
+accuracies['gpt4o_counterfactual_debate_TPR'] = true_positive_rate(true_labels, gpt4o_counterfactual_debate_preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
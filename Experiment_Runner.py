@@ -0,0 +1,36 @@
+from experiment_runner import run_matrix, summarize
+import json
+import sys
+import pandas as pd
+
+# Run a whole sweep of datasets, strategies and models in one process, instead of the experiment scripts one after another.
+# The matrix can also be read from a JSON file: python Experiment_Runner.py sweep.json
+
+# TODO: Set the matrix, every dataset × strategy × model combination is run on the first n rows
+matrix = [
+    {"dataset": "HaluEval", "strategies": ["baseline", "sentence_level", "statement_level", "chain_thoughts", "chain_tailored_thoughts_sentence", "chain_tailored_thoughts"], "models": ["gpt4o_mini"], "n": 100},
+    {"dataset": "SummEval", "strategies": ["counterfactual_debate_modified", "knowledge_filtering"], "models": ["gpt4o_mini", "gpt4o"], "n": 25},
+]
+
+# TODO: Set the concurrency limit per model, whether the OpenAI calls go through the Batch API and the results files (.jsonl or .parquet)
+concurrency = {"gpt4o_mini": 16, "gpt4o": 8}
+batch = False
+results_file = "experiment_runner.jsonl"
+metrics_file = "experiment_runner_results.csv"
+
+# TODO: Set the checkpoint file, a restarted sweep skips the judgements stored there (None to run everything again)
+checkpoint_file = "experiment_runner_checkpoint.jsonl"
+
+if len(sys.argv) > 1:
+    with open(sys.argv[1]) as file:
+        matrix = json.load(file)
+
+records = run_matrix(matrix, results_file, batch, concurrency=concurrency, checkpoint_file=checkpoint_file)
+
+print("-" * 100)
+print(f"Results after {len(records)} judged summaries:\n")
+results = summarize(records)
+print(results.to_string(index=False))
+
+# Append the new results to the existing CSV file
+results.to_csv(metrics_file, mode='a', header=not pd.io.common.file_exists(metrics_file), index=False)
@@ -1,6 +1,7 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
@@ -15,6 +16,10 @@ df = df.sample(frac=1, random_state=42).reset_index(drop=True)
 # Set parameters for the number of rows to analyze
 n = 25
 
+# TODO: Set the knowledge retrieved by the bm25 filter, top_k document sentences per summary sentence or else the share of query terms to cover
+bm25_top_k = None
+bm25_coverage = 0.8
+
 # Ignore the rows already analyzed
 #df = df.iloc[25:]
 
@@ -24,6 +29,7 @@ baseline_preds = []
 phi3_knowledge_summary_optimized_preds = []
 gpt4o_mini_knowledge_summary_optimized_preds = []
 gpt4o_knowledge_summary_optimized_preds = []
+bm25_knowledge_summary_optimized_preds = []
 
 for i in range(n):
     row = df.iloc[i]
@@ -38,7 +44,8 @@ for i in range(n):
     'Row', 'Document', 'Right Summary', 'Hallucinated Summary', 
     'True Label', 'Baseline Prediction', 'Phi3 Knowledge Optimized Prediction', 
     'GPT4o Mini Knowledge Optimized Prediction', 'GPT4o Knowledge Optimized Prediction',
-    'Phi3 Filtered Document', 'GPT4o Mini Filtered Document', 'GPT4o Filtered Document'
+    'Phi3 Filtered Document', 'GPT4o Mini Filtered Document', 'GPT4o Filtered Document',
+    'BM25 Knowledge Optimized Prediction', 'BM25 Filtered Document'
     ])
 
     print("-" * 100)
@@ -67,6 +74,9 @@ for i in range(n):
     (gpt4o_knowledge_summary_optimized_pred, filtered_document_gpt4o) = knowledge_filtering("gpt4o", document, right_summary)
     gpt4o_knowledge_summary_optimized_preds.append(gpt4o_knowledge_summary_optimized_pred)
     
+    (bm25_knowledge_summary_optimized_pred, filtered_document_bm25) = knowledge_filtering("bm25", document, right_summary, bm25_top_k, bm25_coverage)
+    bm25_knowledge_summary_optimized_preds.append(bm25_knowledge_summary_optimized_pred)
+    
     # Save the results of the current iteration for the true summary
     results_per_iteration = pd.concat([results_per_iteration, pd.DataFrame([{
         'Row': i+1, 
@@ -81,6 +91,8 @@ for i in range(n):
         'GPT4o Mini Filtered Document': filtered_document_gpt4o_mini,
         'GPT4o Knowledge Optimized Prediction': gpt4o_knowledge_summary_optimized_pred,
         'GPT4o Filtered Document': filtered_document_gpt4o,
+        'BM25 Knowledge Optimized Prediction': bm25_knowledge_summary_optimized_pred,
+        'BM25 Filtered Document': filtered_document_bm25,
     }])], ignore_index=True)
     
     # Run the analysis for hallucinated summary
@@ -100,6 +112,9 @@ for i in range(n):
     (gpt4o_knowledge_summary_optimized_pred, filtered_document_gpt4o) = knowledge_filtering("gpt4o", document, hallucinated_summary)
     gpt4o_knowledge_summary_optimized_preds.append(gpt4o_knowledge_summary_optimized_pred)
     
+    (bm25_knowledge_summary_optimized_pred, filtered_document_bm25) = knowledge_filtering("bm25", document, hallucinated_summary, bm25_top_k, bm25_coverage)
+    bm25_knowledge_summary_optimized_preds.append(bm25_knowledge_summary_optimized_pred)
+    
     # Save the results of the current iteration for the hallucinated summary
     results_per_iteration = pd.concat([results_per_iteration, pd.DataFrame([{
         'Row': i+1, 
@@ -113,11 +128,13 @@ for i in range(n):
         'GPT4o Mini Knowledge Optimized Prediction': gpt4o_mini_knowledge_summary_optimized_pred,
         'GPT4o Mini Filtered Document': filtered_document_gpt4o_mini,
         'GPT4o Knowledge Optimized Prediction': gpt4o_knowledge_summary_optimized_pred,
-        'GPT4o Filtered Document': filtered_document_gpt4o
+        'GPT4o Filtered Document': filtered_document_gpt4o,
+        'BM25 Knowledge Optimized Prediction': bm25_knowledge_summary_optimized_pred,
+        'BM25 Filtered Document': filtered_document_bm25
     }])], ignore_index=True)
     
-    # Save the current iteration results to a CSV file
-    results_per_iteration.to_csv("Knowledge_Filtering.csv", mode='a', header=not pd.io.common.file_exists("Knowledge_Filtering.csv"), index=False)
+    # Save the current iteration results to a CSV file, apart from the files written before the bm25 filter, whose columns differ
+    results_per_iteration.to_csv("Knowledge_Filtering_with_bm25.csv", mode='a', header=not pd.io.common.file_exists("Knowledge_Filtering_with_bm25.csv"), index=False)
 
 
 print("-" * 100)
@@ -126,17 +143,20 @@ print(f"Results after {n} iterations:\n")
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
+accuracies['baseline_TNR'] = true_negative_rate(true_labels, baseline_preds)
+accuracies['baseline_TPR'] = true_positive_rate(true_labels, baseline_preds)
+
+accuracies['phi3_knowledge_summary_optimized_TNR'] = true_negative_rate(true_labels, phi3_knowledge_summary_optimized_preds)
+accuracies['phi3_knowledge_summary_optimized_TPR'] = true_positive_rate(true_labels, phi3_knowledge_summary_optimized_preds)
 
-accuracies['phi3_knowledge_summary_optimized_TNR'] = sum([1 for i in range(0, 2*n, 2) if phi3_knowledge_summary_optimized_preds[i] == 0]) / n
-accuracies['phi3_knowledge_summary_optimized_TPR'] = sum([1 for i in range(1, 2*n, 2) if phi3_knowledge_summary_optimized_preds[i] == 1]) / n
+accuracies['gpt4o_mini_knowledge_summary_optimized_TNR'] = true_negative_rate(true_labels, gpt4o_mini_knowledge_summary_optimized_preds)
+accuracies['gpt4o_mini_knowledge_summary_optimized_TPR'] = true_positive_rate(true_labels, gpt4o_mini_knowledge_summary_optimized_preds)
 
-accuracies['gpt4o_mini_knowledge_summary_optimized_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_knowledge_summary_optimized_preds[i] == 0]) / n
-accuracies['gpt4o_mini_knowledge_summary_optimized_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_knowledge_summary_optimized_preds[i] == 1]) / n
+accuracies['gpt4o_knowledge_summary_optimized_TNR'] = true_negative_rate(true_labels, gpt4o_knowledge_summary_optimized_preds)
+accuracies['gpt4o_knowledge_summary_optimized_TPR'] = true_positive_rate(true_labels, gpt4o_knowledge_summary_optimized_preds)
 
-accuracies['gpt4o_knowledge_summary_optimized_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_knowledge_summary_optimized_preds[i] == 0]) / n
-accuracies['gpt4o_knowledge_summary_optimized_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_knowledge_summary_optimized_preds[i] == 1]) / n
+accuracies['bm25_knowledge_summary_optimized_TNR'] = true_negative_rate(true_labels, bm25_knowledge_summary_optimized_preds)
+accuracies['bm25_knowledge_summary_optimized_TPR'] = true_positive_rate(true_labels, bm25_knowledge_summary_optimized_preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
@@ -146,17 +166,21 @@ print("GPT4o Mini Knowledge Optimized (TNR):", accuracies['gpt4o_mini_knowledge_
 print("GPT4o Mini Knowledge Optimized (TPR):", accuracies['gpt4o_mini_knowledge_summary_optimized_TPR'])
 print("GPT4o Knowledge Optimized (TNR):", accuracies['gpt4o_knowledge_summary_optimized_TNR'])
 print("GPT4o Knowledge Optimized (TPR):", accuracies['gpt4o_knowledge_summary_optimized_TPR'])
+print("BM25 Knowledge Optimized (TNR):", accuracies['bm25_knowledge_summary_optimized_TNR'])
+print("BM25 Knowledge Optimized (TPR):", accuracies['bm25_knowledge_summary_optimized_TPR'])
 
 # Calculate and print the F1 scores
 baseline_f1 = f1_score(true_labels, baseline_preds)
 phi3_knowledge_optimized_f1 = f1_score(true_labels, phi3_knowledge_summary_optimized_preds)
 gpt4o_mini_knowledge_optimized_f1 = f1_score(true_labels, gpt4o_mini_knowledge_summary_optimized_preds)
 gpt4o_knowledge_optimized_f1 = f1_score(true_labels, gpt4o_knowledge_summary_optimized_preds)
+bm25_knowledge_optimized_f1 = f1_score(true_labels, bm25_knowledge_summary_optimized_preds)
 
 print("Baseline F1 Score:", baseline_f1)
 print("Phi3 Knowledge Optimized F1 Score:", phi3_knowledge_optimized_f1)
 print("GPT4o Mini Knowledge Optimized F1 Score:", gpt4o_mini_knowledge_optimized_f1)
 print("GPT4o Knowledge Optimized F1 Score:", gpt4o_knowledge_optimized_f1)
+print("BM25 Knowledge Optimized F1 Score:", bm25_knowledge_optimized_f1)
 
 # Create a DataFrame for the new results
 results = pd.DataFrame({
@@ -173,8 +197,11 @@ results = pd.DataFrame({
     'GPT4o Mini Knowledge Optimized (TPR)': [accuracies['gpt4o_mini_knowledge_summary_optimized_TPR']],
     'GPT4o Mini Knowledge Optimized (TNR)': [accuracies['gpt4o_mini_knowledge_summary_optimized_TNR']],
     'GPT4o Knowledge Optimized (TPR)': [accuracies['gpt4o_knowledge_summary_optimized_TPR']],
-    'GPT4o Knowledge Optimized (TNR)': [accuracies['gpt4o_knowledge_summary_optimized_TNR']]
+    'GPT4o Knowledge Optimized (TNR)': [accuracies['gpt4o_knowledge_summary_optimized_TNR']],
+    'BM25 Knowledge Optimized F1 Score': [bm25_knowledge_optimized_f1],
+    'BM25 Knowledge Optimized (TPR)': [accuracies['bm25_knowledge_summary_optimized_TPR']],
+    'BM25 Knowledge Optimized (TNR)': [accuracies['bm25_knowledge_summary_optimized_TNR']]
 })
 
 # Append the new results to the existing CSV file
-results.to_csv("Knowledge_Filtering_results.csv", mode='a', header=not pd.io.common.file_exists("Knowledge_Filtering_results.csv"), index=False)
\ No newline at end of file
+results.to_csv("Knowledge_Filtering_with_bm25_results.csv", mode='a', header=not pd.io.common.file_exists("Knowledge_Filtering_with_bm25_results.csv"), index=False)
\ No newline at end of file
@@ -0,0 +1,131 @@
+from helpers import *
+from lexical_support import document_sentence_index
+import response_cache
+from sklearn.metrics import f1_score
+import pandas as pd
+import time
+from datetime import datetime
+
+# Measure the lexical support fast path on the labelled HaluEval and SummEval rows stored under 'Data/'.
+# For every threshold it reports how many judge calls are skipped and, with the judge enabled,
+# how often a skipped statement would have been judged HALLUCINATED and what that costs in accuracy.
+
+# TODO: Set parameters for the number of rows per dataset, the judging model, the thresholds and whether to call the LLMs
+n = 100
+judging_LLM = "gpt4o_mini"
+thresholds = [1.0, 0.9, 0.8, 0.7]
+use_LLM = True
+
+# With use_LLM the statements are extracted by gpt4o_mini and judged one by one, all answers are cached.
+# Without it the sentences of the rule-based splitter stand in for the statements and only the skip rates are reported.
+if use_LLM and response_cache.active_cache is None:
+    response_cache.enable_response_cache()
+
+datasets = {
+    "HaluEval": pd.read_csv("Data/HaluEval/chain_tailored_thoughts.csv"),
+    "SummEval": pd.read_csv("Data/SummEval/Sentence_Level.csv"),
+}
+
+def summary_prediction(verdicts: list, skipped: list) -> int:
+    # The statement level prediction when the skipped statements count as supported
+    return int(any(verdict == 1 and not skip for (verdict, skip) in zip(verdicts, skipped)))
+
+def calls_until_exit(verdicts: list, skipped: list) -> int:
+    # The number of judge calls of the sequential early exit strategy
+    calls = 0
+    for (verdict, skip) in zip(verdicts, skipped):
+        if skip:
+            continue
+        calls += 1
+        if verdict == 1:
+            break
+    return calls
+
+results = []
+
+for (dataset, df) in datasets.items():
+    df = df.dropna(subset=['Document']).iloc[:n]
+    print("-" * 100)
+    print(f"BENCHMARKING {len(df)} {dataset} SUMMARIES ...")
+    print("-" * 100)
+
+    units = []
+    latencies = []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        document = row['Document']
+        label = int(row['True Label'])
+        summary = row['Hallucinated Summary'] if label == 1 else row['Right Summary']
+
+        decomposition = SummaryDecomposition(summary, sentence_splitter="rule")
+        for sentence in decomposition.get_sentences():
+            statements = decomposition.get_statements(sentence) if use_LLM else [sentence]
+            for statement in statements:
+                start = time.perf_counter()
+                (coverage, covering_sentence) = document_sentence_index(document).support(statement)
+                latencies.append(time.perf_counter() - start)
+
+                unit = {'Row': row['Row'], 'True Label': label, 'Coverage': coverage}
+                if use_LLM:
+                    judgement = response_dict[judging_LLM](create_statement_level_hallucination_judge(document, summary, sentence, statement))
+                    unit['Verdict'] = 1 if "HALLUCINATED" in judgement else 0
+                    if coverage >= min(thresholds) and unit['Verdict'] == 1:
+                        print(f"Covered ({coverage:.2f}) but judged hallucinated:\n  statement: {statement}\n  document sentence: {covering_sentence}")
+                units.append(unit)
+
+    units = pd.DataFrame(units)
+    summaries = units.groupby(['Row', 'True Label'], sort=False)
+
+    for threshold in thresholds:
+        units['Skipped'] = (units['Coverage'] >= threshold) & (units['Coverage'] > 0.0)
+        result = {
+            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Dataset': dataset,
+            'Threshold': threshold,
+            'Unit': 'statement' if use_LLM else 'sentence',
+            'Number of Summaries': summaries.ngroups,
+            'Number of Units': len(units),
+            'Skip Rate': units['Skipped'].mean(),
+            'Skip Rate (Supported Summaries)': units[units['True Label'] == 0]['Skipped'].mean(),
+            'Skip Rate (Hallucinated Summaries)': units[units['True Label'] == 1]['Skipped'].mean(),
+            'Pre-check Latency (ms)': 1000 * sum(latencies) / len(latencies),
+        }
+
+        if use_LLM:
+            labels = []
+            predictions = []
+            fast_predictions = []
+            calls = 0
+            fast_calls = 0
+            for ((row_number, label), group) in summaries:
+                verdicts = units.loc[group.index, 'Verdict'].tolist()
+                skipped = units.loc[group.index, 'Skipped'].tolist()
+                no_skips = [False] * len(verdicts)
+                labels.append(label)
+                predictions.append(summary_prediction(verdicts, no_skips))
+                fast_predictions.append(summary_prediction(verdicts, skipped))
+                calls += calls_until_exit(verdicts, no_skips)
+                fast_calls += calls_until_exit(verdicts, skipped)
+
+            skipped_units = units[units['Skipped']]
+            result.update({
+                'Judging LLM': judging_LLM,
+                'Skipped Judged Hallucinated': int(skipped_units['Verdict'].sum()),
+                'Skipped Judged Hallucinated (Share)': skipped_units['Verdict'].mean() if len(skipped_units) else 0.0,
+                'Judge Calls': calls,
+                'Judge Calls with Fast Path': fast_calls,
+                'Accuracy': sum(p == l for (p, l) in zip(predictions, labels)) / len(labels),
+                'Accuracy with Fast Path': sum(p == l for (p, l) in zip(fast_predictions, labels)) / len(labels),
+                'F1 Score': f1_score(labels, predictions),
+                'F1 Score with Fast Path': f1_score(labels, fast_predictions),
+                'Changed Predictions': sum(p != f for (p, f) in zip(predictions, fast_predictions)),
+            })
+        results.append(result)
+
+print("-" * 100)
+print("Results:\n")
+results = pd.DataFrame(results)
+print(results.to_string(index=False))
+
+# Append the new results to the existing CSV file
+results.to_csv("lexical_support_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("lexical_support_benchmark_results.csv"), index=False)
@@ -0,0 +1,51 @@
+from metrics import bootstrap_intervals, confusion_matrices, mcnemar_tests, threshold_curves, threshold_sweep
+from result_sink import load_results
+from datetime import datetime
+import pandas as pd
+
+# Report the metrics of every dataset, strategy and model in a results file of the experiment runner
+# (.jsonl, .parquet or the directory of a results store), with bootstrap confidence intervals and
+# McNemar tests between all pairs of strategies and models judging the same summaries.
+# When the run recorded verdict probabilities, the ROC and precision-recall curves of every cell are written as well,
+# with the best threshold of each.
+
+# TODO: Set the results file, the number of resamples, the confidence level and the p-value below which a difference is reported
+results_file = "experiment_runner.jsonl"
+resamples = 2000
+confidence = 0.95
+significance = 0.05
+
+records = load_results(results_file, with_texts=False)
+timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+matrices = confusion_matrices(records)
+print("Confusion matrices:\n")
+print(matrices.to_string(index=False))
+
+intervals = bootstrap_intervals(records, resamples=resamples, confidence=confidence)
+print("-" * 100)
+print(f"{int(100 * confidence)}% bootstrap confidence intervals over {resamples} resamples:\n")
+print(intervals.to_string(index=False))
+
+tests = mcnemar_tests(records)
+print("-" * 100)
+print(f"Pairs with a McNemar p-value below {significance}:\n")
+print(tests[tests['P Value'] < significance].sort_values('P Value').to_string(index=False))
+
+curves = threshold_curves(records)
+sweep = threshold_sweep(records)
+if len(sweep):
+    print("-" * 100)
+    print("Threshold sweep over the verdict probabilities:\n")
+    print(sweep.to_string(index=False))
+
+# Append the new results to the existing CSV files
+intervals.insert(0, 'Timestamp', timestamp)
+intervals.to_csv("metrics_report_intervals.csv", mode='a', header=not pd.io.common.file_exists("metrics_report_intervals.csv"), index=False)
+tests.insert(0, 'Timestamp', timestamp)
+tests.to_csv("metrics_report_tests.csv", mode='a', header=not pd.io.common.file_exists("metrics_report_tests.csv"), index=False)
+if len(sweep):
+    sweep.insert(0, 'Timestamp', timestamp)
+    sweep.to_csv("metrics_report_thresholds.csv", mode='a', header=not pd.io.common.file_exists("metrics_report_thresholds.csv"), index=False)
+    curves.insert(0, 'Timestamp', timestamp)
+    curves.to_csv("metrics_report_curves.csv", mode='a', header=not pd.io.common.file_exists("metrics_report_curves.csv"), index=False)
@@ -0,0 +1,76 @@
+from retrieval import bm25_filter, bm25_retriever
+from sentence_splitter import split_sentences
+import pandas as pd
+import time
+from datetime import datetime
+
+# Compare the bm25 knowledge filter with the phi3, gpt4o_mini and gpt4o filtered documents
+# stored in the Knowledge_Filtering CSV files under 'Data/', without any API calls.
+# The LLM filters copy document sentences verbatim, so the agreement is measured on sentences.
+
+# TODO: Set the bm25 settings to compare, (top_k, coverage) with top_k None for the coverage knob
+settings = [(1, None), (2, None), (3, None), (None, 0.6), (None, 0.8), (None, 1.0)]
+
+filters = {"Phi3": "Phi3 Filtered Document",
+           "GPT4o Mini": "GPT4o Mini Filtered Document",
+           "GPT4o": "GPT4o Filtered Document"}
+
+def normalize(text: str) -> set:
+    return {" ".join(sentence.split()) for sentence in split_sentences(text)}
+
+results = []
+
+for dataset in ("HaluEval", "SummEval"):
+    df = pd.read_csv(f"Data/{dataset}/Knowledge_Filtering.csv")
+    rows = []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        summary = row['Hallucinated Summary'] if row['True Label'] == 1 else row['Right Summary']
+        if not isinstance(row['Document'], str) or not isinstance(summary, str):
+            continue
+        rows.append((row, summary))
+
+    for (top_k, coverage) in settings:
+        # Time the index construction as well, as the knowledge_filtering calls of a row build it once
+        bm25_retriever.cache_clear()
+        latencies = []
+        lengths = []
+        recalls = {name: [] for name in filters}
+        precisions = {name: [] for name in filters}
+        for (row, summary) in rows:
+            start = time.perf_counter()
+            filtered_document = bm25_filter(row['Document'], summary, top_k, coverage)
+            latencies.append(time.perf_counter() - start)
+            lengths.append(len(filtered_document) / len(row['Document']))
+
+            retrieved = normalize(filtered_document)
+            for (name, column) in filters.items():
+                if not isinstance(row[column], str):
+                    continue
+                reference = normalize(row[column]) & normalize(row['Document'])
+                if not reference or not retrieved:
+                    continue
+                matches = len(retrieved & reference)
+                recalls[name].append(matches / len(reference))
+                precisions[name].append(matches / len(retrieved))
+
+        result = {
+            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Dataset': dataset,
+            'Top K': top_k,
+            'Coverage': coverage,
+            'Number of Summaries': len(rows),
+            'Filtered Share of Document': sum(lengths) / len(lengths),
+            'BM25 Latency (ms)': 1000 * sum(latencies) / len(latencies),
+        }
+        for name in filters:
+            result[f'Recall of {name} Sentences'] = sum(recalls[name]) / len(recalls[name]) if recalls[name] else float('nan')
+            result[f'Precision against {name} Sentences'] = sum(precisions[name]) / len(precisions[name]) if precisions[name] else float('nan')
+        results.append(result)
+
+print("Results:\n")
+results = pd.DataFrame(results)
+print(results.to_string(index=False))
+
+# Append the new results to the existing CSV file
+results.to_csv("retrieval_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("retrieval_benchmark_results.csv"), index=False)
@@ -1,6 +1,7 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
@@ -119,17 +120,17 @@ print(f"Results after {n} iterations:\n")
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
+accuracies['baseline_TNR'] = true_negative_rate(true_labels, baseline_preds)
+accuracies['baseline_TPR'] = true_positive_rate(true_labels, baseline_preds)
 
-accuracies['phi3_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if phi3_sentence_level_preds[i] == 0]) / n
-accuracies['phi3_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if phi3_sentence_level_preds[i] == 1]) / n
+accuracies['phi3_sentence_level_TNR'] = true_negative_rate(true_labels, phi3_sentence_level_preds)
+accuracies['phi3_sentence_level_TPR'] = true_positive_rate(true_labels, phi3_sentence_level_preds)
 
-accuracies['gpt4o_mini_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_sentence_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_sentence_level_preds)
+accuracies['gpt4o_mini_sentence_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_sentence_level_preds)
 
-accuracies['gpt4o_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_sentence_level_preds[i] == 1]) / n
+accuracies['gpt4o_sentence_level_TNR'] = true_negative_rate(true_labels, gpt4o_sentence_level_preds)
+accuracies['gpt4o_sentence_level_TPR'] = true_positive_rate(true_labels, gpt4o_sentence_level_preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
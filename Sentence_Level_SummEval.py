@@ -1,8 +1,11 @@
 from helpers import *
+from checkpoint import Checkpoint
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
+import random
 
 # Retrieve the HaluEval dataset from Hugginface
 ds = load_dataset("mteb/summeval")
@@ -18,12 +21,11 @@ n = 25
 # Ignore the rows already analyzed
 #df = df.iloc[25:] Set parameters for the number of rows to analyse
 
-# Initialize lists to store true labels and predicted labels for F1 score calculation
-true_labels = []
-baseline_preds = []
-phi3_sentence_level_preds = []
-gpt4o_mini_sentence_level_preds = []
-gpt4o_sentence_level_preds = []
+# The judgements are stored row by row, a restarted run skips the ones already made
+checkpoint = Checkpoint("Sentence_Level_checkpoint.jsonl")
+
+# Draw the summaries with a fixed seed, such that a restarted run judges the same summaries
+random.seed(42)
 
 for i in range(n):
     row = df.iloc[i]
@@ -33,6 +35,9 @@ for i in range(n):
     
     if right_summary == None or hallucinated_summary == None:
         continue
+
+    # Rows restored completely from the checkpoint are already in the CSV file
+    computed = checkpoint.computed
     
     results_per_iteration = pd.DataFrame(columns=[
     'Row', 'Document', 'Right Summary', 'Hallucinated Summary', 
@@ -52,19 +57,14 @@ for i in range(n):
     
     # Run the analysis for right summary
     print("Running the process for a non-hallucinated summary")
-    true_labels.append(0)
     
-    baseline_pred = baseline(document, right_summary)
-    baseline_preds.append(baseline_pred)
+    baseline_pred = checkpoint.run(("SummEval", i, 0, "baseline", "gpt4o_mini"), right_summary, lambda: baseline(document, right_summary))
     
-    phi3_sentence_level_pred = sentence_level("phi3", document, right_summary)
-    phi3_sentence_level_preds.append(phi3_sentence_level_pred)
+    phi3_sentence_level_pred = checkpoint.run(("SummEval", i, 0, "sentence_level", "phi3"), right_summary, lambda: sentence_level("phi3", document, right_summary))
         
-    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, right_summary)
-    gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
+    gpt4o_mini_sentence_level_pred = checkpoint.run(("SummEval", i, 0, "sentence_level", "gpt4o_mini"), right_summary, lambda: sentence_level("gpt4o_mini", document, right_summary))
     
-    gpt4o_sentence_level_pred = sentence_level("gpt4o", document, right_summary)
-    gpt4o_sentence_level_preds.append(gpt4o_sentence_level_pred)
+    gpt4o_sentence_level_pred = checkpoint.run(("SummEval", i, 0, "sentence_level", "gpt4o"), right_summary, lambda: sentence_level("gpt4o", document, right_summary))
     
     # Save the results of the current iteration for the true summary
     results_per_iteration = pd.concat([results_per_iteration, pd.DataFrame([{
@@ -82,19 +82,14 @@ for i in range(n):
     # Run the analysis for hallucinated summary
     print("-" * 100)
     print("Running the process for a hallucinated summary")
-    true_labels.append(1) 
     
-    baseline_pred = baseline(document, hallucinated_summary)
-    baseline_preds.append(baseline_pred)
+    baseline_pred = checkpoint.run(("SummEval", i, 1, "baseline", "gpt4o_mini"), hallucinated_summary, lambda: baseline(document, hallucinated_summary))
     
-    phi3_sentence_level_pred = sentence_level("phi3", document, hallucinated_summary)
-    phi3_sentence_level_preds.append(phi3_sentence_level_pred)
+    phi3_sentence_level_pred = checkpoint.run(("SummEval", i, 1, "sentence_level", "phi3"), hallucinated_summary, lambda: sentence_level("phi3", document, hallucinated_summary))
         
-    gpt4o_mini_sentence_level_pred = sentence_level("gpt4o_mini", document, hallucinated_summary)
-    gpt4o_mini_sentence_level_preds.append(gpt4o_mini_sentence_level_pred)
+    gpt4o_mini_sentence_level_pred = checkpoint.run(("SummEval", i, 1, "sentence_level", "gpt4o_mini"), hallucinated_summary, lambda: sentence_level("gpt4o_mini", document, hallucinated_summary))
     
-    gpt4o_sentence_level_pred = sentence_level("gpt4o", document, hallucinated_summary)
-    gpt4o_sentence_level_preds.append(gpt4o_sentence_level_pred)
+    gpt4o_sentence_level_pred = checkpoint.run(("SummEval", i, 1, "sentence_level", "gpt4o"), hallucinated_summary, lambda: sentence_level("gpt4o", document, hallucinated_summary))
     
     # Save the results of the current iteration for the hallucinated summary
     results_per_iteration = pd.concat([results_per_iteration, pd.DataFrame([{
@@ -110,26 +105,27 @@ for i in range(n):
     }])], ignore_index=True)
     
     # Save the current iteration results to a CSV file
-    results_per_iteration.to_csv("Sentence_Level.csv", mode='a', header=not pd.io.common.file_exists("Sentence_Level.csv"), index=False)
+    if checkpoint.computed > computed:
+        results_per_iteration.to_csv("Sentence_Level.csv", mode='a', header=not pd.io.common.file_exists("Sentence_Level.csv"), index=False)
 
 
 print("-" * 100)
 print(f"Results after {n} iterations:\n")
 
+# Rebuild the labels and predictions of the analyzed rows from the checkpoint, including the rows judged before a restart
+predictions = {}
+for (name, strategy, LLM) in (("baseline", "baseline", "gpt4o_mini"),
+                              ("phi3_sentence_level", "sentence_level", "phi3"),
+                              ("gpt4o_mini_sentence_level", "sentence_level", "gpt4o_mini"),
+                              ("gpt4o_sentence_level", "sentence_level", "gpt4o")):
+    predictions[name] = checkpoint.predictions("SummEval", strategy, LLM, rows=range(n))
+
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
-
-accuracies['phi3_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if phi3_sentence_level_preds[i] == 0]) / n
-accuracies['phi3_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if phi3_sentence_level_preds[i] == 1]) / n
-
-accuracies['gpt4o_mini_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_sentence_level_preds[i] == 1]) / n
-
-accuracies['gpt4o_sentence_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_sentence_level_preds[i] == 0]) / n
-accuracies['gpt4o_sentence_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_sentence_level_preds[i] == 1]) / n
+for (name, (labels, preds)) in predictions.items():
+    accuracies[f'{name}_TNR'] = true_negative_rate(labels, preds)
+    accuracies[f'{name}_TPR'] = true_positive_rate(labels, preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
@@ -141,10 +137,10 @@ print("GPT4o Sentence Level (TNR):", accuracies['gpt4o_sentence_level_TNR'])
 print("GPT4o Sentence Level (TPR):", accuracies['gpt4o_sentence_level_TPR'])
 
 # Calculate and print the F1 scores
-baseline_f1 = f1_score(true_labels, baseline_preds)
-phi3_sentence_level_f1 = f1_score(true_labels, phi3_sentence_level_preds)
-gpt4o_mini_sentence_level_f1 = f1_score(true_labels, gpt4o_mini_sentence_level_preds)
-gpt4o_sentence_level_f1 = f1_score(true_labels, gpt4o_sentence_level_preds)
+baseline_f1 = f1_score(*predictions['baseline'])
+phi3_sentence_level_f1 = f1_score(*predictions['phi3_sentence_level'])
+gpt4o_mini_sentence_level_f1 = f1_score(*predictions['gpt4o_mini_sentence_level'])
+gpt4o_sentence_level_f1 = f1_score(*predictions['gpt4o_sentence_level'])
 
 print("Baseline F1 Score:", baseline_f1)
 print("Phi3 Sentence Level F1 Score:", phi3_sentence_level_f1)
@@ -0,0 +1,99 @@
+from helpers import *
+from sentence_splitter import split_sentences
+import pandas as pd
+import time
+from datetime import datetime
+
+# Compare the rule-based sentence splitter with the gpt4o_mini sentence extractor
+# on the HaluEval, SummEval and QAGS summaries stored under 'Data/'
+
+# TODO: Set parameters for the number of summaries per dataset and whether to call the LLM extractor
+n = 50
+use_LLM = True
+
+def load_summaries() -> dict:
+    halueval = pd.read_csv("Data/HaluEval/chain_tailored_thoughts.csv")
+    summeval = pd.read_csv("Data/SummEval/Sentence_Level.csv")
+    qags = pd.concat([pd.read_csv("Data/QAGS/correct.csv"), pd.read_csv("Data/QAGS/hallucinated.csv")], ignore_index=True)
+
+    datasets = {
+        "HaluEval": pd.concat([halueval['Right Summary'], halueval['Hallucinated Summary']]),
+        "SummEval": pd.concat([summeval['Right Summary'], summeval['Hallucinated Summary']]),
+        "QAGS": qags['summary'],
+    }
+    return {name: [summary for summary in summaries.dropna().drop_duplicates() if summary.strip()][:n] for (name, summaries) in datasets.items()}
+
+def normalize(sentences: list) -> list:
+    return [" ".join(sentence.split()) for sentence in sentences if sentence.strip()]
+
+def sentence_f1(predicted: list, reference: list) -> float:
+    matches = len(set(predicted) & set(reference))
+    if matches == 0:
+        return 0.0
+    precision = matches / len(predicted)
+    recall = matches / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+results = []
+
+for (dataset, summaries) in load_summaries().items():
+    print("-" * 100)
+    print(f"BENCHMARKING {len(summaries)} {dataset} SUMMARIES ...")
+    print("-" * 100)
+
+    rule_latencies = []
+    llm_latencies = []
+    rule_counts = []
+    llm_counts = []
+    exact_matches = []
+    count_matches = []
+    f1_scores = []
+
+    for summary in summaries:
+        start = time.perf_counter()
+        rule_sentences = normalize(split_sentences(summary))
+        rule_latencies.append(time.perf_counter() - start)
+        rule_counts.append(len(rule_sentences))
+
+        if not use_LLM:
+            continue
+
+        start = time.perf_counter()
+        llm_sentences = normalize(gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split('\n'))
+        llm_latencies.append(time.perf_counter() - start)
+        llm_counts.append(len(llm_sentences))
+
+        exact_matches.append(rule_sentences == llm_sentences)
+        count_matches.append(len(rule_sentences) == len(llm_sentences))
+        f1_scores.append(sentence_f1(rule_sentences, llm_sentences))
+
+        if rule_sentences != llm_sentences:
+            print("Summary:", summary)
+            print("Rule-based split:", rule_sentences)
+            print("LLM split:", llm_sentences)
+            print("-" * 25)
+
+    result = {
+        'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'Dataset': dataset,
+        'Number of Summaries': len(summaries),
+        'Rule Sentences per Summary': sum(rule_counts) / len(rule_counts),
+        'Rule Latency (ms)': 1000 * sum(rule_latencies) / len(rule_latencies),
+    }
+    if use_LLM:
+        result.update({
+            'LLM Sentences per Summary': sum(llm_counts) / len(llm_counts),
+            'LLM Latency (ms)': 1000 * sum(llm_latencies) / len(llm_latencies),
+            'Exact Agreement': sum(exact_matches) / len(exact_matches),
+            'Sentence Count Agreement': sum(count_matches) / len(count_matches),
+            'Sentence F1': sum(f1_scores) / len(f1_scores),
+        })
+    results.append(result)
+
+print("-" * 100)
+print("Results:\n")
+results = pd.DataFrame(results)
+print(results.to_string(index=False))
+
+# Append the new results to the existing CSV file
+results.to_csv("sentence_splitter_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("sentence_splitter_benchmark_results.csv"), index=False)
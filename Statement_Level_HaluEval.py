@@ -1,6 +1,7 @@
 from helpers import *
 from datasets import load_dataset
 from sklearn.metrics import f1_score
+from metrics import true_positive_rate, true_negative_rate
 import pandas as pd
 from datetime import datetime
 
@@ -18,6 +19,9 @@ df = df.sample(frac=1, random_state=42).reset_index(drop=True)
 # TODO: Set parameters for the number of rows to analyse
 n = 25
 
+# TODO: Set the lexical support threshold to skip the judge for statements contained in a document sentence, None to judge every statement
+lexical_threshold = None
+
 # Initialize lists to store true labels and predicted labels for F1 score calculation
 true_labels = []
 baseline_preds = []
@@ -68,13 +72,13 @@ for i in range(len(df)):
     baseline_pred = baseline(document, right_summary)
     baseline_preds.append(baseline_pred)
     
-    #phi3_statement_level_pred = statement_level("phi3", document, right_summary)
+    #phi3_statement_level_pred = statement_level("phi3", document, right_summary, lexical_threshold=lexical_threshold)
     #phi3_statement_level_preds.append(phi3_statement_level_pred)
         
-    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, right_summary)
+    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, right_summary, lexical_threshold=lexical_threshold)
     gpt4o_mini_statement_level_preds.append(gpt4o_mini_statement_level_pred)
     
-    #gpt4o_statement_level_pred = statement_level("gpt4o", document, right_summary)
+    #gpt4o_statement_level_pred = statement_level("gpt4o", document, right_summary, lexical_threshold=lexical_threshold)
     #gpt4o_statement_level_preds.append(gpt4o_statement_level_pred)
     
     # Save the results of the current iteration for the true summary
@@ -99,13 +103,13 @@ for i in range(len(df)):
     baseline_pred = baseline(document, hallucinated_summary)
     baseline_preds.append(baseline_pred)
     
-    #phi3_statement_level_pred = statement_level("phi3", document, hallucinated_summary)
+    #phi3_statement_level_pred = statement_level("phi3", document, hallucinated_summary, lexical_threshold=lexical_threshold)
     #phi3_statement_level_preds.append(phi3_statement_level_pred)
         
-    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, hallucinated_summary)
+    gpt4o_mini_statement_level_pred = statement_level("gpt4o_mini", document, hallucinated_summary, lexical_threshold=lexical_threshold)
     gpt4o_mini_statement_level_preds.append(gpt4o_mini_statement_level_pred)
     
-    #gpt4o_statement_level_pred = statement_level("gpt4o", document, hallucinated_summary)
+    #gpt4o_statement_level_pred = statement_level("gpt4o", document, hallucinated_summary, lexical_threshold=lexical_threshold)
     #gpt4o_statement_level_preds.append(gpt4o_statement_level_pred)
     
     # Save the results of the current iteration for the hallucinated summary
@@ -133,17 +137,17 @@ print(f"Results after {n} iterations:\n")
 # Calculate and print the accuracies
 accuracies = {}
 
-accuracies['baseline_TNR'] = sum([1 for i in range(0, 2*n, 2) if baseline_preds[i] == 0]) / n
-accuracies['baseline_TPR'] = sum([1 for i in range(1, 2*n, 2) if baseline_preds[i] == 1]) / n
+accuracies['baseline_TNR'] = true_negative_rate(true_labels, baseline_preds)
+accuracies['baseline_TPR'] = true_positive_rate(true_labels, baseline_preds)
 
-#accuracies['phi3_statement_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if phi3_statement_level_preds[i] == 0]) / n
-#accuracies['phi3_statement_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if phi3_statement_level_preds[i] == 1]) / n
+#accuracies['phi3_statement_level_TNR'] = true_negative_rate(true_labels, phi3_statement_level_preds)
+#accuracies['phi3_statement_level_TPR'] = true_positive_rate(true_labels, phi3_statement_level_preds)
 
-accuracies['gpt4o_mini_statement_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_mini_statement_level_preds[i] == 0]) / n
-accuracies['gpt4o_mini_statement_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_mini_statement_level_preds[i] == 1]) / n
+accuracies['gpt4o_mini_statement_level_TNR'] = true_negative_rate(true_labels, gpt4o_mini_statement_level_preds)
+accuracies['gpt4o_mini_statement_level_TPR'] = true_positive_rate(true_labels, gpt4o_mini_statement_level_preds)
 
-#accuracies['gpt4o_statement_level_TNR'] = sum([1 for i in range(0, 2*n, 2) if gpt4o_statement_level_preds[i] == 0]) / n
-#accuracies['gpt4o_statement_level_TPR'] = sum([1 for i in range(1, 2*n, 2) if gpt4o_statement_level_preds[i] == 1]) / n
+#accuracies['gpt4o_statement_level_TNR'] = true_negative_rate(true_labels, gpt4o_statement_level_preds)
+#accuracies['gpt4o_statement_level_TPR'] = true_positive_rate(true_labels, gpt4o_statement_level_preds)
 
 print("Baseline (TNR):", accuracies['baseline_TNR'])
 print("Baseline (TPR):", accuracies['baseline_TPR'])
@@ -160,6 +164,9 @@ baseline_f1 = f1_score(true_labels, baseline_preds)
 gpt4o_mini_statement_level_f1 = f1_score(true_labels, gpt4o_mini_statement_level_preds)
 #gpt4o_statement_level_f1 = f1_score(true_labels, gpt4o_statement_level_preds)
 
+if lexical_threshold is not None:
+    print_lexical_support_stats()
+
 print("Baseline F1 Score:", baseline_f1)
 #print("Phi3 Statement Level F1 Score:", phi3_statement_level_f1)
 print("GPT4o Mini Statement Level F1 Score:", gpt4o_mini_statement_level_f1)
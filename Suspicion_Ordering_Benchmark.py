@@ -0,0 +1,101 @@
+from helpers import *
+from sentence_splitter import split_sentences
+from suspicion import DocumentIndex, suspicion_score, order_by_suspicion
+import response_cache
+import pandas as pd
+from datetime import datetime
+
+# Measure how many sentence level judge calls the early exit needs per summary
+# when the sentences are judged in summary order versus in suspicion order.
+# The stored HaluEval rows provide the documents and summaries; the sentences are split locally.
+
+# TODO: Set parameters for the number of rows, the judging model and whether to call the judge
+n = 100
+judging_LLM = "gpt4o_mini"
+use_LLM = True
+
+# The per-sentence verdicts are cached, such that rerunning the benchmark is free
+if use_LLM and response_cache.active_cache is None:
+    response_cache.enable_response_cache()
+
+df = pd.read_csv("Data/HaluEval/chain_tailored_thoughts.csv").iloc[:2 * n]
+
+def calls_until_exit(verdicts: list) -> int:
+    # The number of judge calls until the first hallucinated verdict, or all of them
+    for (index, verdict) in enumerate(verdicts):
+        if verdict == 1:
+            return index + 1
+    return len(verdicts)
+
+def expected_calls_random(verdicts: list) -> float:
+    # The expected position of the first hallucinated sentence in a uniformly random order
+    hallucinated = sum(verdicts)
+    if hallucinated == 0:
+        return len(verdicts)
+    return (len(verdicts) + 1) / (hallucinated + 1)
+
+records = []
+
+for i in range(len(df)):
+    row = df.iloc[i]
+    document = row['Document']
+    label = int(row['True Label'])
+    summary = row['Hallucinated Summary'] if label == 1 else row['Right Summary']
+
+    sentences = split_sentences(summary)
+    document_index = DocumentIndex(document)
+    scores = [suspicion_score(document_index, sentence) for sentence in sentences]
+    record = {'Row': row['Row'], 'True Label': label, 'Sentences': len(sentences), 'Max Suspicion': max(scores), 'Mean Suspicion': sum(scores) / len(scores)}
+
+    if use_LLM:
+        response_function = response_dict[judging_LLM]
+        verdicts = {}
+        for sentence in sentences:
+            judgement = response_function(create_sentence_level_hallucination_judge(document, summary, sentence))
+            verdicts[sentence] = 1 if "[HALLUCINATED]" in judgement else 0
+
+        summary_order = [verdicts[sentence] for sentence in sentences]
+        suspicion_order = [verdicts[sentence] for sentence in order_by_suspicion(document, sentences)]
+        record.update({
+            'Hallucinated Sentences': sum(summary_order),
+            'Calls Summary Order': calls_until_exit(summary_order),
+            'Calls Suspicion Order': calls_until_exit(suspicion_order),
+            'Expected Calls Random Order': expected_calls_random(summary_order),
+        })
+        print(f"Row {row['Row']} ({'hallucinated' if label else 'supported'}): {record['Calls Summary Order']} calls in summary order, {record['Calls Suspicion Order']} in suspicion order")
+    records.append(record)
+
+records = pd.DataFrame(records)
+
+print("-" * 100)
+print(f"Results after {len(records)} summaries:\n")
+
+def pairwise_auc(column: str) -> float:
+    # The probability that a hallucinated summary scores above a supported one
+    hallucinated_scores = records[records['True Label'] == 1][column].values
+    supported_scores = records[records['True Label'] == 0][column].values
+    return sum((h > s) + 0.5 * (h == s) for h in hallucinated_scores for s in supported_scores) / (len(hallucinated_scores) * len(supported_scores))
+
+# The ordering only needs to rank sentences within a summary, the separation across summaries is reported for reference
+for column in ('Max Suspicion', 'Mean Suspicion'):
+    print(f"{column} AUC:", pairwise_auc(column))
+
+results = {
+    'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    'Number of Summaries': len(records),
+    'Judging LLM': judging_LLM if use_LLM else '',
+    'Sentences per Summary': records['Sentences'].mean(),
+    'Max Suspicion AUC': pairwise_auc('Max Suspicion'),
+    'Mean Suspicion AUC': pairwise_auc('Mean Suspicion'),
+}
+
+if use_LLM:
+    # Only summaries with a hallucinated verdict can exit early, so they are reported separately
+    flagged = records[records['Hallucinated Sentences'] > 0]
+    for (name, subset) in (("All", records), ("Flagged", flagged)):
+        for column in ('Calls Summary Order', 'Calls Suspicion Order', 'Expected Calls Random Order'):
+            results[f'{column} ({name})'] = subset[column].mean() if len(subset) else float('nan')
+            print(f"{column} per summary ({name}):", results[f'{column} ({name})'])
+
+# Append the new results to the existing CSV file
+pd.DataFrame([results]).to_csv("suspicion_ordering_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("suspicion_ordering_benchmark_results.csv"), index=False)
@@ -0,0 +1,93 @@
+from helpers import *
+from replay import load_transcripts
+from cost_planner import MODEL_NAMES
+from usage_telemetry import usage_summary
+from verdict_only import find_label, HALLUCINATION_LABELS
+from metrics import true_positive_rate, true_negative_rate
+from sklearn.metrics import f1_score
+import pandas as pd
+import statistics
+import time
+from datetime import datetime
+
+# Measure the verdict-only mode of the final judges on the debates stored by Counterfactual_Debate_HaluEval.py.
+# Every judge prompt is sent once freely and once restricted to its labels, one call at a time and without the
+# response cache, such that the latencies compare. It reports the latency and the completion tokens of both modes,
+# how often their predictions agree and the F1 score, TPR and TNR of each.
+# collaborative_debate shares its judge prompt with counterfactual_debate_modified, its debates are not stored.
+
+# TODO: Set the file with the stored debates, the number of rows, the stored debates to judge and the judging model
+debates_file = "Data/HaluEval/counterfactual_debate.csv"
+n = 25
+debate = "gpt4o_debate"
+judging_LLM = "gpt4o"
+
+# The final judges, as the prompt built from a stored debate and the labels of the answer, the first one meaning hallucinated
+judges = {
+    "counterfactual_debate": (lambda item: create_judge_messages(item["summary"], item["text"]), HALLUCINATION_LABELS),
+    "counterfactual_debate_modified": (lambda item: create_extended_judge_messages(item["document"], item["summary"], item["text"]), HALLUCINATION_LABELS),
+    "knowledge_filtering": (lambda item: create_knowledge_filtered_hallucination_judge(bm25_filter(item["document"], item["summary"]), item["summary"]), TRUTH_LABELS),
+}
+
+verdict_only.enable_verdict_only([MODEL_NAMES[judging_LLM]])
+response_function = response_dict[judging_LLM]
+
+items = load_transcripts(debates_file, [debate])
+rows = sorted(set(item["row"] for item in items))[:n]
+items = [item for item in items if item["row"] in rows]
+
+results = []
+
+for (judge, (create_messages, labels)) in judges.items():
+    print("-" * 100)
+    print(f"BENCHMARKING THE {judge.upper()} JUDGE ON {len(items)} DEBATES ...")
+    print("-" * 100)
+
+    judgements = {"free": [], "verdict only": []}
+    for item in items:
+        messages = create_messages(item)
+        # The modes alternate per debate, such that a drift in the API latency affects both alike
+        for mode in judgements:
+            with strategy_context(f"{judge} {mode}"):
+                start = time.perf_counter()
+                if mode == "verdict only":
+                    with verdict_only_judge(labels):
+                        judgement = response_function(messages)
+                else:
+                    judgement = response_function(messages)
+            judgements[mode].append({'Label': item["label"],
+                                     'Prediction': 1 if labels[0] in judgement else 0,
+                                     'Labelled': find_label(judgement, labels) is not None,
+                                     'Seconds': time.perf_counter() - start})
+        print(f"Row {item['row']}: {judgements['free'][-1]['Seconds']:.2f}s free, {judgements['verdict only'][-1]['Seconds']:.2f}s verdict only")
+
+    usage = usage_summary()
+    result = {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+              'Judge': judge,
+              'Judging LLM': judging_LLM,
+              'Number of Judgements': len(items)}
+    for (mode, records) in judgements.items():
+        name = mode.title()
+        true_labels = [record['Label'] for record in records]
+        predictions = [record['Prediction'] for record in records]
+        seconds = [record['Seconds'] for record in records]
+        result.update({f'Mean Latency ({name})': statistics.mean(seconds),
+                       f'Median Latency ({name})': statistics.median(seconds),
+                       f'Completion Tokens ({name})': usage.get(f"{judge} {mode}", {}).get("completion_tokens", 0),
+                       f'Answers without a Label ({name})': sum(not record['Labelled'] for record in records),
+                       f'F1 Score ({name})': f1_score(true_labels, predictions),
+                       f'TPR ({name})': true_positive_rate(true_labels, predictions),
+                       f'TNR ({name})': true_negative_rate(true_labels, predictions)})
+    result['Latency Drop'] = 1 - result['Mean Latency (Verdict Only)'] / result['Mean Latency (Free)']
+    result['Agreement'] = statistics.mean(free['Prediction'] == restricted['Prediction']
+                                          for (free, restricted) in zip(judgements['free'], judgements['verdict only']))
+    results.append(result)
+
+print("-" * 100)
+print("Results:\n")
+results = pd.DataFrame(results)
+print(results.to_string(index=False))
+verdict_only.print_verdict_only_stats()
+
+# Append the new results to the existing CSV file
+results.to_csv("verdict_only_benchmark_results.csv", mode='a', header=not pd.io.common.file_exists("verdict_only_benchmark_results.csv"), index=False)
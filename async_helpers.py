@@ -0,0 +1,663 @@
+import asyncio
+import contextlib
+import openai
+import weakref
+from typing import Tuple
+from openai.types.chat import ChatCompletion
+import response_cache
+import batch_mode
+import rate_limiter
+import retries
+import hedging
+import streaming
+import verdict_only
+import verdict_probabilities
+import structured_verdicts
+from verdict_only import verdict_only_judge, TRUTH_LABELS
+from streaming import verdict_stream
+import time
+from usage_telemetry import record_usage, track_strategy
+from suspicion import order_by_suspicion
+from retrieval import bm25_filter, BM25_COVERAGE
+from lexical_support import lexically_supported, LEXICAL_SUPPORT_JUDGEMENT
+from helpers import (
+    api_key,
+    SummaryDecomposition,
+    create_summary_sentence_extractor_messages,
+    create_sentence_statement_extractor_messages,
+    create_document_sentences_extractor_messages,
+    create_hallucination_abduction_messages,
+    create_supported_abduction_messages,
+    create_hallucinated_critic_messages,
+    create_supported_critic_messages,
+    create_defence_hallucination_messages,
+    create_defence_supported_messages,
+    create_judge_messages,
+    create_extended_judge_messages,
+    create_collaboration_messages,
+    create_collaboration_feedback_messages,
+    create_statement_hallucination_abduction_messages,
+    create_statement_supported_abduction_messages,
+    create_chain_debates_judge_messages,
+    create_zeroshot_hallucination_judge,
+    create_chain_thought_hallucination_judge,
+    create_knowledge_filtered_hallucination_judge,
+    create_sentence_level_hallucination_judge,
+    create_statement_level_hallucination_judge,
+    create_chain_tailored_thoughts_hallucination_judge,
+    create_chain_tailored_thoughts_sentence_hallucination_judge,
+    create_batched_statements_judge_messages,
+)
+
+# Utilities
+
+async_client_local = openai.AsyncOpenAI(
+    base_url="http://localhost:11434/v1",
+    api_key="nokeyneeded",
+)
+async_client_openai = openai.AsyncOpenAI(
+    api_key=api_key,
+)
+
+# Maximum number of requests in flight per model, change with set_concurrency_limit
+concurrency_limits = {"gpt4o": 16,
+                      "gpt4o_mini": 32,
+                      "phi3": 2,
+                      "gpt4": 8,
+                      "gpt35": 16}
+
+# One set of semaphores per event loop, since asyncio primitives are bound to the loop they are used in
+_semaphores = weakref.WeakKeyDictionary()
+
+def set_concurrency_limit(LLM: str, limit: int) -> None:
+    '''This function sets the maximum number of concurrent requests for a model.
+    The new limit applies to every event loop started afterwards.
+
+    - Input: the model key as used in async_response_dict and the limit
+    - Output: None
+    '''
+    if limit < 1:
+        raise ValueError("The concurrency limit must be at least 1")
+    concurrency_limits[LLM] = limit
+    _semaphores.clear()
+
+def _get_semaphore(LLM: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    loop_semaphores = _semaphores.setdefault(loop, {})
+    if LLM not in loop_semaphores:
+        loop_semaphores[LLM] = asyncio.Semaphore(concurrency_limits[LLM])
+    return loop_semaphores[LLM]
+
+# Functions for asynchronous LLM invocation
+
+async def chat_completion_async(LLM: str, client: openai.AsyncOpenAI, **params) -> ChatCompletion:
+    '''This function sends a chat completion request within the concurrency limit of the model.
+    Like helpers.chat_completion, it answers from the response cache when the cache is switched on,
+    waits for the rate limits of the model, retries transient errors, hedges slow calls, streams judges that stop
+    at the verdict, restricts verdict-only judges to their labels and collects the verdict probabilities of judges.
+    Batch requests are not rate limited, the Batch API has its own quota, and are not streamed.
+
+    - Input: the model key, the async client and the keyword arguments of chat.completions.create
+    - Output: the chat completion
+    '''
+    labels = verdict_only.labels_for(params)
+    if labels is not None:
+        params = verdict_only.constrain(params, labels)
+    judged_labels = verdict_probabilities.judge_labels(params)
+    if judged_labels is not None:
+        params = verdict_probabilities.request_logprobs(params)
+    session = batch_mode.active_session
+    batched = session is not None and LLM in session.batch_LLMs
+    streamed = not batched and streaming.streams(params)
+    cache_params = streaming.cache_params(params) if streamed else params
+    cache = response_cache.active_cache
+    if cache is not None:
+        cached = cache.get(cache_params)
+        if cached is not None:
+            response = ChatCompletion.model_validate_json(cached)
+            verdict_probabilities.record(response, judged_labels)
+            return verdict_only.canonical(response, labels, params["model"])
+
+    if batched:
+        # In batch mode the request waits for the next batch round instead of being sent
+        response = await session.wait(params)
+        record_usage(response)
+    else:
+        limiter = rate_limiter.get_rate_limiter(params["model"])
+
+        async def send(options: dict) -> ChatCompletion:
+            # The concurrency slot is held per attempt, not during the backoff between attempts
+            async with _get_semaphore(LLM):
+                reserved = await limiter.reserve_async(rate_limiter.estimate_tokens(params)) if limiter is not None else 0
+                start = time.perf_counter()
+                try:
+                    if streamed:
+                        response = await streaming.stream_completion_async(client.with_options(**options), params)
+                    else:
+                        response = await client.with_options(**options).chat.completions.create(**params)
+                except BaseException:
+                    # Also when the task is cancelled, the tokens were not used
+                    if limiter is not None:
+                        limiter.reconcile(reserved, 0)
+                    raise
+                record_usage(response, time.perf_counter() - start)
+                if limiter is not None:
+                    limiter.reconcile(reserved, rate_limiter.used_tokens(response))
+                return response
+
+        # Every attempt is hedged when hedging is on for the model, the duplicate takes its own concurrency slot
+        # In batch mode a round is not submitted while the call is in flight, it may lead to more batch requests
+        with session.direct_call() if session is not None else contextlib.nullcontext():
+            response = await retries.call_with_retries_async(params["model"], lambda options: hedging.hedged_call_async(params["model"], lambda: send(options)))
+
+    if cache is not None:
+        cache.put(cache_params, response.model_dump_json())
+    verdict_probabilities.record(response, judged_labels)
+    return verdict_only.canonical(response, labels, params["model"])
+
+async def _async_response(LLM: str, client: openai.AsyncOpenAI, model: str, messages: list, **options) -> str:
+    response = await chat_completion_async(LLM, client,
+        model=model,
+        temperature=0.0,
+        n=1,
+        messages=messages,
+        **options,
+    )
+
+    return response.choices[0].message.content
+
+async def phi3_response_async(messages: list, **options) -> str:
+    return await _async_response("phi3", async_client_local, "phi3:14b-instruct", messages, **options)
+
+async def gpt4o_mini_response_async(messages: list, **options) -> str:
+    return await _async_response("gpt4o_mini", async_client_openai, "gpt-4o-mini", messages, **options)
+
+async def gpt35_response_async(messages: list, **options) -> str:
+    return await _async_response("gpt35", async_client_openai, "gpt-3.5-turbo-0125", messages, **options)
+
+async def gpt4_response_async(messages: list, **options) -> str:
+    return await _async_response("gpt4", async_client_openai, "gpt-4-turbo", messages, **options)
+
+async def gpt4o_response_async(messages: list, **options) -> str:
+    return await _async_response("gpt4o", async_client_openai, "gpt-4o", messages, **options)
+
+# dict that converts string into async function response
+async_response_dict = {"gpt4o": gpt4o_response_async,
+                       "gpt4o_mini": gpt4o_mini_response_async,
+                       "phi3": phi3_response_async,
+                       "gpt4": gpt4_response_async,
+                       "gpt35": gpt35_response_async}
+
+# Functions for counterfactual debate
+
+@track_strategy
+async def counterfactual_debate_async(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
+
+    response_function = async_response_dict[debating_LLM]
+
+    async def debate_hallucinated_async() -> str:
+        stance_hallucinated = await response_function(create_hallucination_abduction_messages(document, summary))
+        stance_hallucinated_critique = await response_function(create_hallucinated_critic_messages(document, summary, stance_hallucinated))
+        stance_hallucinated_defence = await response_function(create_defence_hallucination_messages(document, summary, stance_hallucinated, stance_hallucinated_critique))
+        return f"The debate claiming [HALLUCINATED] :\nClaim: " + stance_hallucinated + "\nCritique: " + stance_hallucinated_critique + "\nDefence: " + stance_hallucinated_defence + "\n" + "End of the debate claiming [HALLUCINATED]."
+
+    async def debate_supported_async() -> str:
+        stance_supported = await response_function(create_supported_abduction_messages(document, summary))
+        stance_supported_critique = await response_function(create_supported_critic_messages(document, summary, stance_supported))
+        stance_supported_defence = await response_function(create_defence_supported_messages(document, summary, stance_supported, stance_supported_critique))
+        return f"The debate claiming [SUPPORTED] :\nClaim: " + stance_supported + "\nCritique: " + stance_supported_critique + "\nDefence: " + stance_supported_defence + "\n" + "End of the debate claiming [SUPPORTED]."
+
+    # Both sides of the debate are independent, so they are generated concurrently
+    (debate_hallucinated, debate_supported) = await asyncio.gather(debate_hallucinated_async(), debate_supported_async())
+    print("-" * 100)
+    print("Debates generated with ", debating_LLM)
+    print(debate_hallucinated)
+    print("-" * 100)
+    print(debate_supported)
+    print("-" * 100)
+
+    # Append the debates
+    debates = "\n" + debate_hallucinated + "\n" + debate_supported
+
+    with verdict_only_judge():
+        final_judgement = await gpt4o_response_async(create_judge_messages(summary, debates))
+    print("The final judgement after counterfactual debating:\n" + final_judgement)
+
+    if "[HALLUCINATED]" in final_judgement:
+        return (1, debate_hallucinated, debate_supported)
+
+    return (0, debate_hallucinated, debate_supported)
+
+@track_strategy
+async def counterfactual_debate_extended_async(document: str, summary: str, debate: str) -> int:
+
+    final_judgement = await gpt4o_response_async(create_extended_judge_messages(document, summary, debate))
+    print("The final judgement after counterfactual debating:\n" + final_judgement)
+
+    if "[HALLUCINATED]" in final_judgement:
+        return 1
+
+    return 0
+
+@track_strategy
+async def counterfactual_debate_modified_async(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
+
+    response_function = async_response_dict[debating_LLM]
+
+    # Both arguments are independent, so they are generated concurrently
+    (stance_hallucinated, stance_supported) = await asyncio.gather(
+        response_function(create_hallucination_abduction_messages(document, summary)),
+        response_function(create_supported_abduction_messages(document, summary)),
+    )
+    debate_hallucinated = f"The argument in favor of [HALLUCINATED]:\n" + stance_hallucinated + "\n" + "End of the argument in favor of [HALLUCINATED]."
+    debate_supported = f"The argument in favor of [SUPPORTED]:\n" + stance_supported + "\n" + "End of the argument in favor of [SUPPORTED]."
+
+    # Append the debates
+    debates = "\n" + debate_hallucinated + "\n" + debate_supported + "\n"
+
+    print("-" * 100)
+    print("Debate generated with ", debating_LLM)
+    print(debates)
+    print("-" * 100)
+
+    with verdict_only_judge():
+        final_judgement = await gpt4o_response_async(create_extended_judge_messages(document, summary, debates))
+    print("The final judgement after counterfactual debating:\n" + final_judgement)
+
+    if "[HALLUCINATED]" in final_judgement:
+        return (1, debate_hallucinated, debate_supported)
+
+    return (0, debate_hallucinated, debate_supported)
+
+# Functions for collaborative debates
+
+@track_strategy
+async def collaborative_debate_async(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
+
+    response_function = async_response_dict[debating_LLM]
+    # The feedback depends on the initial analysis, so these calls stay sequential
+    stance_hallucinated = await response_function(create_collaboration_messages(document, summary))
+    debate_hallucinated = f"The initial analysis of the summary:\n" + stance_hallucinated + "\n" + "End of the initial analysis of the summary."
+
+    stance_supported = await response_function(create_collaboration_feedback_messages(document, summary, stance_hallucinated))
+    debate_supported = f"The feedback on the analysis:\n" + stance_supported + "\n" + "End of the feedback on the analysis."
+
+    # Append the debates
+    debates = "\n" + debate_hallucinated + "\n" + debate_supported + "\n"
+
+    print("-" * 100)
+    print("Debate generated with ", debating_LLM)
+    print(debates)
+    print("-" * 100)
+
+    with verdict_only_judge():
+        final_judgement = await gpt4o_response_async(create_extended_judge_messages(document, summary, debates))
+    print("The final judgement after counterfactual debating:\n" + final_judgement)
+
+    if "[HALLUCINATED]" in final_judgement:
+        return (1, debate_hallucinated, debate_supported)
+
+    return (0, debate_hallucinated, debate_supported)
+
+# Functions for chain of tailored debates
+
+@track_strategy
+async def chain_debates_async(debating_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None) -> Tuple[int, str, str]:
+
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = await decomposition.get_sentences_async()
+
+    response_function = async_response_dict[debating_LLM]
+    debate_history = ""
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported without a debate
+    debate = ""
+
+    for statement in sentences:
+
+        # Both stances about the statement are independent, so they are generated concurrently
+        (stance_hallucinated, stance_supported) = await asyncio.gather(
+            response_function(create_statement_hallucination_abduction_messages(document, summary, statement)),
+            response_function(create_statement_supported_abduction_messages(document, summary, statement)),
+        )
+        debate_hallucinated = f"The argument claiming [HALLUCINATED] :\nClaim: " + stance_hallucinated + "\nEnd of the debate claiming [HALLUCINATED]."
+        debate_supported = f"The debate claiming [SUPPORTED] :\nClaim: " + stance_supported + "\nEnd of the debate claiming [SUPPORTED]."
+
+        print("-" * 100)
+        print("Debates generated with ", debating_LLM)
+        print(debate_hallucinated)
+        print("-" * 100)
+        print(debate_supported)
+        print("-" * 100)
+
+        # Append the debates
+        debate = "\n" + debate_hallucinated + "\n" + debate_supported
+
+        debate_history += "The debate about statement" + statement + "\n" + debate + "\n" "- " * 100 + "\n"
+
+        final_judgement = await gpt4o_response_async(create_chain_debates_judge_messages(document, summary, debate))
+        print("The final judgement after counterfactual debating:\n" + final_judgement)
+
+        if "[HALLUCINATED]" in final_judgement:
+            return (1, debate, debate_history)
+
+    return (0, debate, debate_history)
+
+# Functions for baseline
+
+@track_strategy
+async def baseline_async(document: str, summary: str, filtering_LLM: str = "gpt4o_mini") -> int:
+
+    response_function = async_response_dict[filtering_LLM]
+
+    baseline_judgement = await response_function(create_zeroshot_hallucination_judge(document, summary))
+    print(f"The baseline zeroshot judgement using {filtering_LLM}:\n" + baseline_judgement)
+    if "[HALLUCINATED]" in baseline_judgement:
+        return 1
+    return 0
+
+@track_strategy
+async def chain_thoughts_async(document: str, summary: str) -> Tuple[int, str]:
+    with verdict_stream():
+        thought_judgement = await gpt4o_mini_response_async(create_chain_thought_hallucination_judge(document, summary))
+    print("The chain of thought judgement:\n" + thought_judgement)
+    if "[HALLUCINATED]" in thought_judgement:
+        return (1, thought_judgement)
+    return (0, thought_judgement)
+
+# Functions for knowledge filtering
+
+@track_strategy
+async def knowledge_filtering_async(filtering_LLM: str, document: str, summary: str, top_k: int = None, coverage: float = BM25_COVERAGE) -> Tuple[int, str]:
+
+    # "bm25" retrieves the knowledge locally, top_k and coverage only apply to it
+    if filtering_LLM == "bm25":
+        filtered_document = bm25_filter(document, summary, top_k, coverage)
+    else:
+        response_function = async_response_dict[filtering_LLM]
+        filtered_document = await response_function(create_document_sentences_extractor_messages(document, summary))
+    print(f"The filtered document using {filtering_LLM}:\n" + filtered_document)
+
+    with verdict_only_judge(TRUTH_LABELS):
+        baseline_judgement = await gpt4o_response_async(create_knowledge_filtered_hallucination_judge(filtered_document, summary))
+    print(f"The judgement with filtered knowledge using {filtering_LLM}:\n" + baseline_judgement)
+
+    if "[TRUE]" in baseline_judgement:
+        return (1, filtered_document)
+    return (0, filtered_document)
+
+# Functions for sentence level detection
+
+@track_strategy
+async def sentence_level_async(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False) -> int:
+    response_function = async_response_dict[judging_LLM]
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = await decomposition.get_sentences_async()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+
+    # The sentences are judged one by one to keep the early exit on the first hallucinated sentence
+    for highlighted_sentence in sentences:
+        with verdict_stream():
+            partial_judgement = await response_function(create_sentence_level_hallucination_judge(document, summary, highlighted_sentence))
+        print("-" * 25)
+        print(f"The highlighted sentence:\n" + highlighted_sentence)
+        print(f"The partial judgement with sentence level detection using {judging_LLM}:\n" + partial_judgement)
+
+        if "[HALLUCINATED]" in partial_judgement:
+            return 1
+    return 0
+
+# Parallel fan-out with early exit
+
+# Counters of the fan-out mode, the saved calls are the cancelled and the never started judgements
+fan_out_stats = {"summaries": 0,
+                 "judgements": 0,
+                 "completed": 0,
+                 "cancelled_in_flight": 0,
+                 "not_started": 0}
+
+async def _decomposed_statements_async(decomposition: SummaryDecomposition) -> list:
+    # Extract the statements of all sentences concurrently
+    sentences = await decomposition.get_sentences_async()
+    statements_per_sentence = await asyncio.gather(*[decomposition.get_statements_async(sentence) for sentence in sentences])
+    return [(sentence, statement) for (sentence, statements) in zip(sentences, statements_per_sentence) for statement in statements]
+
+async def fan_out_judgements_async(judgement_factories: list, max_in_flight: int) -> Tuple[int, list]:
+    '''This function runs judgements concurrently and returns as soon as one of them says HALLUCINATED.
+    The judgements still in flight are cancelled and the ones not yet started are never sent.
+
+    - Input: a list of functions that each return a judgement coroutine and the maximum number of judgements in flight
+    - Output: the index of the hallucinated judgement (None if all are supported) and the judgements, None where cancelled
+    '''
+    limit = asyncio.Semaphore(max_in_flight)
+    # The judgements that entered the limit, whose calls were sent
+    started = set()
+
+    async def judge(index: int) -> Tuple[int, str]:
+        async with limit:
+            started.add(index)
+            return (index, await judgement_factories[index]())
+
+    tasks = [asyncio.ensure_future(judge(index)) for index in range(len(judgement_factories))]
+    judgements = [None] * len(tasks)
+    hallucinated_index = None
+    try:
+        for next_judgement in asyncio.as_completed(tasks):
+            (index, judgement) = await next_judgement
+            judgements[index] = judgement
+            if "HALLUCINATED" in judgement:
+                hallucinated_index = index
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # The counters come from the task states, as judgements finished before the break may not have been consumed,
+        # and are kept when a judgement raised, such that the calls made and cancelled on the error path count as well
+        finished = [index for (index, task) in enumerate(tasks) if task.done() and not task.cancelled()]
+        for index in finished:
+            if judgements[index] is None and tasks[index].exception() is None:
+                judgements[index] = tasks[index].result()[1]
+        completed = len(finished)
+        cancelled_in_flight = len(started) - completed
+        fan_out_stats["summaries"] += 1
+        fan_out_stats["judgements"] += len(tasks)
+        fan_out_stats["completed"] += completed
+        fan_out_stats["cancelled_in_flight"] += cancelled_in_flight
+        fan_out_stats["not_started"] += len(tasks) - len(started)
+        print(f"Fan-out finished {completed} of {len(tasks)} judgements, saving {len(tasks) - completed} calls ({cancelled_in_flight} cancelled in flight)")
+    return (hallucinated_index, judgements)
+
+# Functions for batched statement judges
+
+async def batched_statement_judgements_async(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition, suspicion_order: bool, lexical_threshold: float, batch_statements: str, reasoning: bool) -> Tuple[int, str]:
+    '''Asynchronous version of helpers.batched_statement_judgements.
+    With batch_statements="summary" the statements of all sentences are extracted concurrently.
+    '''
+    if batch_statements not in structured_verdicts.BATCH_SCOPES:
+        raise ValueError(f"Unknown batch scope: {batch_statements}")
+    response_function = async_response_dict[judging_LLM]
+    response_format = structured_verdicts.verdicts_response_format(judging_LLM, reasoning)
+    create_single_judge = create_chain_tailored_thoughts_hallucination_judge if reasoning else create_statement_level_hallucination_judge
+
+    async def judge_batch(pairs: list) -> str:
+        return await response_function(create_batched_statements_judge_messages(document, summary, pairs, reasoning), response_format=response_format)
+
+    async def judge_single(pair: Tuple[str, str]) -> str:
+        with verdict_stream():
+            return await response_function(create_single_judge(document, summary, *pair))
+
+    async def ordered_statements(sentence: str) -> list:
+        statements = await decomposition.get_statements_async(sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
+        return [(sentence, statement) for statement in statements]
+
+    sentences = await decomposition.get_sentences_async()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    if batch_statements == "summary":
+        groups = [[pair for pairs in await asyncio.gather(*[ordered_statements(sentence) for sentence in sentences]) for pair in pairs]]
+    else:
+        # The statements of a sentence are extracted when its batch is due, such that an early exit saves the extraction
+        groups = sentences
+
+    judgement = "[SUPPORTED]"
+    for group in groups:
+        if batch_statements == "sentence":
+            group = await ordered_statements(group)
+        if not group:
+            continue
+        pairs = [(sentence, statement) for (sentence, statement) in group
+                 if lexical_threshold is None or not lexically_supported(document, statement, lexical_threshold)]
+        judgements = await structured_verdicts.judge_in_batches_async(pairs, judge_batch, judge_single, reasoning) if pairs else []
+        for ((sentence, statement), partial_judgement) in zip(pairs, judgements):
+            if "HALLUCINATED" in partial_judgement:
+                print("-" * 25)
+                print(f"The highlighted statement:\n" + statement)
+                print(f"The partial judgement with batched statement level detection using {judging_LLM}:\n" + partial_judgement)
+                return (1, partial_judgement)
+        # As in the loop, a summary without hallucinations keeps the judgement of its last statement
+        judgement = judgements[-1] if pairs[-1:] == group[-1:] else LEXICAL_SUPPORT_JUDGEMENT
+    return (0, judgement)
+
+# Functions for statement level detection
+
+@track_strategy
+async def statement_level_async(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False, fan_out: bool = False, max_in_flight: int = 8, lexical_threshold: float = None, batch_statements: str = None) -> int:
+
+    response_function = async_response_dict[judging_LLM]
+    decomposition = decomposition or SummaryDecomposition(summary)
+
+    if batch_statements is not None:
+        return (await batched_statement_judgements_async(judging_LLM, document, summary, decomposition, suspicion_order, lexical_threshold, batch_statements, reasoning=False))[0]
+
+    if fan_out:
+        pairs = await _decomposed_statements_async(decomposition)
+        if suspicion_order:
+            # The most suspicious statements are submitted first when the limit holds the others back
+            pairs = order_by_suspicion(document, pairs, key=lambda pair: pair[1])
+        if lexical_threshold is not None:
+            pairs = [(sentence, statement) for (sentence, statement) in pairs if not lexically_supported(document, statement, lexical_threshold)]
+            if not pairs:
+                return 0
+        # The judgement tasks copy the context, so they stop at the verdict as well
+        with verdict_stream():
+            (hallucinated_index, judgements) = await fan_out_judgements_async(
+                [lambda sentence=sentence, statement=statement: response_function(create_statement_level_hallucination_judge(document, summary, sentence, statement)) for (sentence, statement) in pairs],
+                max_in_flight)
+        return 0 if hallucinated_index is None else 1
+
+    sentences = await decomposition.get_sentences_async()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+
+    for highlighted_sentence in sentences:
+        statements = await decomposition.get_statements_async(highlighted_sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
+
+        for highlighted_statement in statements:
+            if lexical_threshold is not None and lexically_supported(document, highlighted_statement, lexical_threshold):
+                continue
+
+            with verdict_stream():
+                partial_judgement = await response_function(create_statement_level_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
+            print("-" * 25)
+            print(f"The highlighted statement:\n" + highlighted_statement)
+            print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
+
+            if "HALLUCINATED" in partial_judgement:
+                return 1
+    return 0
+
+# Functions for chain of tailored thoughts
+
+@track_strategy
+async def chain_tailored_thoughts_async(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False, fan_out: bool = False, max_in_flight: int = 8, lexical_threshold: float = None, batch_statements: str = None) -> Tuple[int, str]:
+
+    response_function = async_response_dict[judging_LLM]
+    decomposition = decomposition or SummaryDecomposition(summary)
+
+    if batch_statements is not None:
+        return await batched_statement_judgements_async(judging_LLM, document, summary, decomposition, suspicion_order, lexical_threshold, batch_statements, reasoning=True)
+
+    if fan_out:
+        pairs = await _decomposed_statements_async(decomposition)
+        if not pairs:
+            return (0, "[SUPPORTED]")
+        if suspicion_order:
+            # The most suspicious statements are submitted first when the limit holds the others back
+            pairs = order_by_suspicion(document, pairs, key=lambda pair: pair[1])
+        if lexical_threshold is not None:
+            pairs = [(sentence, statement) for (sentence, statement) in pairs if not lexically_supported(document, statement, lexical_threshold)]
+            if not pairs:
+                return (0, LEXICAL_SUPPORT_JUDGEMENT)
+        # The judgement tasks copy the context, so they stop at the verdict as well
+        with verdict_stream():
+            (hallucinated_index, judgements) = await fan_out_judgements_async(
+                [lambda sentence=sentence, statement=statement: response_function(create_chain_tailored_thoughts_hallucination_judge(document, summary, sentence, statement)) for (sentence, statement) in pairs],
+                max_in_flight)
+        if hallucinated_index is None:
+            return (0, judgements[-1])
+        return (1, judgements[hallucinated_index])
+
+    sentences = await decomposition.get_sentences_async()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported
+    partial_judgement = "[SUPPORTED]"
+
+    for highlighted_sentence in sentences:
+        statements = await decomposition.get_statements_async(highlighted_sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
+
+        for highlighted_statement in statements:
+            if lexical_threshold is not None and lexically_supported(document, highlighted_statement, lexical_threshold):
+                partial_judgement = LEXICAL_SUPPORT_JUDGEMENT
+                continue
+
+            with verdict_stream():
+                partial_judgement = await response_function(create_chain_tailored_thoughts_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
+            print("-" * 25)
+            print(f"The highlighted statement:\n" + highlighted_statement)
+            print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
+
+            if "HALLUCINATED" in partial_judgement:
+                return (1, partial_judgement)
+    return (0, partial_judgement)
+
+@track_strategy
+async def chain_tailored_thoughts_sentence_async(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False) -> Tuple[int, str]:
+
+    response_function = async_response_dict[judging_LLM]
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = await decomposition.get_sentences_async()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported
+    partial_judgement = "[SUPPORTED]"
+
+    for highlighted_sentence in sentences:
+        with verdict_stream():
+            partial_judgement = await response_function(create_chain_tailored_thoughts_sentence_hallucination_judge(document, summary, highlighted_sentence))
+        print("-" * 25)
+        print(f"The highlighted sentence:\n" + highlighted_sentence)
+        print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
+
+        if "HALLUCINATED" in partial_judgement:
+            return (1, partial_judgement)
+    return (0, partial_judgement)
+
+# Running many rows at once
+
+async def gather_rows_async(coroutines: list) -> list:
+    '''This function runs the strategy coroutines of many rows concurrently and returns their results in order.
+    The per-model semaphores keep the number of requests in flight below the configured concurrency limits.
+
+    - Input: a list of coroutines, e.g. [sentence_level_async("gpt4o", document, summary) for ...]
+    - Output: the list of results in the same order
+    '''
+    return await asyncio.gather(*coroutines)
@@ -0,0 +1,253 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import openai
+from openai.types.chat import ChatCompletion
+import response_cache
+from response_cache import ResponseCache
+import helpers
+
+# Offline Batch API mode for whole experiments
+#
+# The async strategies in async_helpers.py are run for every row at once. Instead of calling the API,
+# every request is collected in a batch session. When all strategies are waiting, the collected prompts
+# are written to a batch JSONL file, submitted to the Batch API, polled and fed back to the waiting strategies.
+# Multi-stage strategies such as statement_level therefore advance one stage per batch round.
+#
+# Every coroutine of the experiment is tagged with its index, which the tasks it creates inherit. The session counts
+# per coroutine the batch answers and the shared work, such as a summary decomposition started by another coroutine,
+# it waits on, and the direct calls in flight, e.g. to the local phi3. A round is submitted once every live coroutine
+# waits and no direct call is in flight, such that no coroutine still on its way to a request misses the round and a
+# sweep does not pay for small partial rounds.
+#
+# All answers are stored in the response cache, such that the regular synchronous loop of an experiment
+# script replays them afterwards without any API calls.
+
+# The session that collects requests, None outside of batch mode
+active_session = None
+
+# The index of the experiment coroutine the current task belongs to
+current_coroutine = contextvars.ContextVar("current_coroutine", default=None)
+
+class BatchRequestError(RuntimeError):
+    pass
+
+class BatchSession:
+    '''A collection of pending chat completion requests that are answered in batch rounds.
+
+    - Input: the client used for the Batch API, the models that are batched, the prefix of the batch files,
+      the poll interval in seconds, the completion window and the maximum number of requests per batch
+    - Output: a session that is installed as batch_mode.active_session while the experiment runs
+    '''
+
+    def __init__(self, client: openai.OpenAI, batch_LLMs: set, batch_file: str, poll_interval: float, completion_window: str = "24h", max_requests_per_batch: int = 50_000):
+        self.client = client
+        self.batch_LLMs = batch_LLMs
+        self.batch_file = batch_file
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.max_requests_per_batch = max_requests_per_batch
+        self.pending = {}
+        # The answers of the last round, which reach the response cache only as their callers resume
+        self.answered = {}
+        # Per coroutine, the batch answers and the shared work it waits on, and the direct calls in flight
+        self.waiting = collections.defaultdict(set)
+        self.shared_waits = collections.Counter()
+        self.direct_calls = 0
+        self.changed = asyncio.Event()
+        self.rounds = 0
+        self.submitted_requests = 0
+        self.failed_requests = 0
+
+    def request(self, params: dict) -> asyncio.Future:
+        # Identical prompts within a round are submitted once and answered for every caller
+        key = ResponseCache.make_key(params)
+        future = asyncio.get_running_loop().create_future()
+        if key in self.answered:
+            future.set_result(self.answered[key])
+        elif key in self.pending:
+            self.pending[key][1].append(future)
+        else:
+            self.pending[key] = (params, [future])
+        return future
+
+    async def wait(self, params: dict) -> ChatCompletion:
+        '''This function queues a request for the next round and waits for its answer.
+
+        - Input: the keyword arguments of chat.completions.create
+        - Output: the chat completion
+        '''
+        future = self.request(params)
+        index = current_coroutine.get()
+        self.waiting[index].add(future)
+        self.changed.set()
+        try:
+            return await future
+        finally:
+            self.waiting[index].discard(future)
+            self.changed.set()
+
+    @contextlib.contextmanager
+    def direct_call(self):
+        '''This context manager marks a call of a model that is not batched, which may lead to more batch requests.'''
+        self.direct_calls += 1
+        self.changed.set()
+        try:
+            yield
+        finally:
+            self.direct_calls -= 1
+            self.changed.set()
+
+    @contextlib.contextmanager
+    def shared_wait(self):
+        '''This context manager marks a wait on work started by another coroutine, which is tracked under that coroutine.'''
+        index = current_coroutine.get()
+        self.shared_waits[index] += 1
+        self.changed.set()
+        try:
+            yield
+        finally:
+            self.shared_waits[index] -= 1
+            self.changed.set()
+
+    def blocked(self, index: int) -> bool:
+        # The coroutine cannot progress before the next round
+        return self.shared_waits[index] > 0 or any(not future.done() for future in self.waiting[index])
+
+    def write_batch_file(self, requests: list, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            for (key, params) in requests:
+                file.write(json.dumps({"custom_id": key,
+                                       "method": "POST",
+                                       "url": "/v1/chat/completions",
+                                       "body": params}, ensure_ascii=False) + "\n")
+
+    async def submit_round(self) -> None:
+        # Requests whose callers were cancelled in the meantime, e.g. by a fan-out early exit, are not submitted
+        pending = {key: (params, futures) for (key, (params, futures)) in self.pending.items() if not all(future.done() for future in futures)}
+        self.pending = {}
+        if not pending:
+            return
+        self.rounds += 1
+        requests = [(key, params) for (key, (params, futures)) in pending.items()]
+        chunks = [requests[start:start + self.max_requests_per_batch] for start in range(0, len(requests), self.max_requests_per_batch)]
+        print(f"Batch round {self.rounds}: submitting {len(requests)} requests in {len(chunks)} batch(es)")
+
+        self.answered = {}
+        outputs = {}
+        for chunk_outputs in await asyncio.gather(*[self._run_batch(chunk, index) for (index, chunk) in enumerate(chunks)]):
+            outputs.update(chunk_outputs)
+        self.submitted_requests += len(requests)
+
+        for (key, (params, futures)) in pending.items():
+            output = outputs.get(key)
+            if output is not None and output.get("response") and output["response"]["status_code"] == 200:
+                result = ChatCompletion.model_validate(output["response"]["body"])
+                self.answered[key] = result
+            else:
+                self.failed_requests += 1
+                error = output.get("error") if output is not None else "missing from the batch output"
+                result = BatchRequestError(f"Batch request {key} failed: {error}")
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        self.changed.set()
+
+    async def _run_batch(self, requests: list, index: int) -> dict:
+        (stem, extension) = os.path.splitext(self.batch_file)
+        path = f"{stem}_round_{self.rounds}_{index + 1}{extension or '.jsonl'}"
+        self.write_batch_file(requests, path)
+
+        with open(path, "rb") as file:
+            input_file = await asyncio.to_thread(self.client.files.create, file=file, purpose="batch")
+        batch = await asyncio.to_thread(self.client.batches.create,
+                                        input_file_id=input_file.id,
+                                        endpoint="/v1/chat/completions",
+                                        completion_window=self.completion_window)
+        print(f"Submitted batch {batch.id} with {len(requests)} requests ({path})")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(self.poll_interval)
+            batch = await asyncio.to_thread(self.client.batches.retrieve, batch.id)
+            print(f"Batch {batch.id} is {batch.status}")
+
+        outputs = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await asyncio.to_thread(self.client.files.content, file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    output = json.loads(line)
+                    outputs[output["custom_id"]] = output
+        return outputs
+
+async def shared(awaitable):
+    '''This function awaits work that other coroutines may share, e.g. the decomposition of a summary.
+
+    - Input: the awaitable
+    - Output: its result
+    '''
+    if active_session is None:
+        return await awaitable
+    with active_session.shared_wait():
+        return await awaitable
+
+async def _attributed(index: int, coroutine):
+    current_coroutine.set(index)
+    return await coroutine
+
+async def _wait_until_blocked(session: BatchSession, tasks: list) -> None:
+    # Wait until every live coroutine waits on a batch answer, cached answers resolve without a round
+    while True:
+        live = [index for (index, task) in enumerate(tasks) if not task.done()]
+        if not live:
+            return
+        if session.direct_calls == 0 and all(session.blocked(index) for index in live):
+            # A coroutine woken in this iteration reaches its next request or call in the next one
+            await asyncio.sleep(0)
+            if session.direct_calls == 0 and all(tasks[index].done() or session.blocked(index) for index in live):
+                return
+            continue
+        session.changed.clear()
+        changed = asyncio.ensure_future(session.changed.wait())
+        await asyncio.wait([changed, *[tasks[index] for index in live]], return_when=asyncio.FIRST_COMPLETED)
+        changed.cancel()
+
+async def run_in_batches_async(coroutines: list, client: openai.OpenAI = None, batch_LLMs: set = None, batch_file: str = "batch_requests.jsonl", poll_interval: float = 60.0, completion_window: str = "24h") -> list:
+    '''This function runs the async strategies of a whole experiment through the Batch API.
+
+    - Input: the strategy coroutines, the Batch API client (defaults to helpers.client_openai), the models answered in batches
+      (defaults to every OpenAI model, the local phi3 is called directly), the prefix of the batch files and the poll interval
+    - Output: the results of the coroutines in order, failed strategies hold their exception
+    '''
+    global active_session
+    if response_cache.active_cache is None:
+        response_cache.enable_response_cache()
+    if batch_LLMs is None:
+        batch_LLMs = {"gpt4o", "gpt4o_mini", "gpt4", "gpt35"}
+
+    session = BatchSession(client or helpers.client_openai, batch_LLMs, batch_file, poll_interval, completion_window)
+    active_session = session
+    try:
+        tasks = [asyncio.ensure_future(_attributed(index, coroutine)) for (index, coroutine) in enumerate(coroutines)]
+        while not all(task.done() for task in tasks):
+            await _wait_until_blocked(session, tasks)
+            await session.submit_round()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        active_session = None
+
+    print(f"Batch mode finished after {session.rounds} rounds with {session.submitted_requests} requests ({session.failed_requests} failed)")
+    return results
+
+def run_in_batches(coroutines: list, **kwargs) -> list:
+    '''Synchronous entry point of run_in_batches_async for the experiment scripts.'''
+    return asyncio.run(run_in_batches_async(coroutines, **kwargs))
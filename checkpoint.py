@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+
+# Row-level checkpoints of experiment runs
+#
+# Every finished judgement is appended as one JSON line keyed by (dataset, row, label, strategy, model), and the file is
+# flushed after each line. A restarted run reads the file, skips the judgements already made and computes only the
+# missing ones, and the final metrics are rebuilt from the stored judgements instead of from the lists of one process.
+# A line cut off by a crash is ignored. The summary is stored as a hash, such that a row that now selects another
+# summary is judged again.
+
+def summary_hash(summary: str) -> str:
+    return hashlib.sha256(summary.encode("utf-8")).hexdigest()[:16]
+
+class Checkpoint:
+    '''This class stores the finished judgements of an experiment in a JSONL file.
+
+    - Input: the path of the checkpoint file, created if missing
+    - Output: the checkpoint with the judgements already stored
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.judgements = {}
+        self.restored = 0
+        self.computed = 0
+        self._lock = threading.Lock()
+        complete = True
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    complete = line.endswith("\n")
+                    try:
+                        judgement = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.judgements[self._key(judgement)] = judgement
+        self._file = open(path, "a", encoding="utf-8")
+        if not complete:
+            # Start after the line cut off by a crash instead of continuing it
+            self._file.write("\n")
+
+    @staticmethod
+    def _key(judgement: dict) -> tuple:
+        return (judgement["dataset"], judgement["row"], judgement["label"], judgement["strategy"], judgement["model"])
+
+    def get(self, key: tuple, summary: str) -> dict:
+        '''This function looks up a stored judgement.
+
+        - Input: the key (dataset, row, label, strategy, model) and the judged summary
+        - Output: the stored judgement with its prediction and parts, None when missing or made on another summary
+        '''
+        judgement = self.judgements.get(key)
+        if judgement is None or judgement["summary"] != summary_hash(summary):
+            return None
+        return judgement
+
+    def put(self, key: tuple, summary: str, prediction: int, parts: list = None, probabilities: list = None) -> None:
+        '''This function stores a judgement.
+
+        - Input: the key (dataset, row, label, strategy, model), the judged summary, the prediction,
+          the reasoning or debates following it in the result of the strategy, None for a prediction alone,
+          and optionally the verdict probabilities of its judge calls
+        - Output: None
+        '''
+        (dataset, row, label, strategy, model) = key
+        judgement = {"dataset": dataset, "row": row, "label": label, "strategy": strategy, "model": model,
+                     "summary": summary_hash(summary), "prediction": prediction}
+        if parts is not None:
+            judgement["parts"] = [str(part) for part in parts]
+        if probabilities is not None:
+            judgement["probabilities"] = probabilities
+        with self._lock:
+            self.judgements[key] = judgement
+            self._file.write(json.dumps(judgement) + "\n")
+            self._file.flush()
+
+    def run(self, key: tuple, summary: str, function):
+        '''This function returns the stored result of a judgement, or makes and stores it.
+
+        - Input: the key (dataset, row, label, strategy, model), the judged summary and a function making the judgement,
+          returning the prediction or a tuple of the prediction and its reasoning or debates
+        - Output: the result of the function, as it returned it
+        '''
+        judgement = self.get(key, summary)
+        if judgement is not None:
+            self.restored += 1
+            if "parts" in judgement:
+                return (judgement["prediction"], *judgement["parts"])
+            return judgement["prediction"]
+        result = function()
+        self.computed += 1
+        if isinstance(result, tuple):
+            self.put(key, summary, result[0], list(result[1:]))
+        else:
+            self.put(key, summary, result)
+        return result
+
+    def predictions(self, dataset: str, strategy: str, model: str, rows: list = None) -> tuple:
+        '''This function collects the stored judgements of a strategy and model, to compute the metrics from.
+
+        - Input: the dataset, the strategy, the model and optionally the rows to include
+        - Output: the true labels and the predictions, ordered by row and label
+        '''
+        rows = set(rows) if rows is not None else None
+        judgements = sorted((key, judgement) for (key, judgement) in self.judgements.items()
+                            if key[0] == dataset and key[3] == strategy and key[4] == model and (rows is None or key[1] in rows))
+        return ([judgement["label"] for (_, judgement) in judgements], [judgement["prediction"] for (_, judgement) in judgements])
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,340 @@
+import functools
+import math
+import re
+import statistics
+import warnings
+from collections import namedtuple
+from sentence_splitter import split_sentences
+from retrieval import bm25_filter
+from helpers import (
+    create_summary_sentence_extractor_messages,
+    create_sentence_statement_extractor_messages,
+    create_document_sentences_extractor_messages,
+    create_hallucination_abduction_messages,
+    create_supported_abduction_messages,
+    create_hallucinated_critic_messages,
+    create_supported_critic_messages,
+    create_defence_hallucination_messages,
+    create_defence_supported_messages,
+    create_judge_messages,
+    create_extended_judge_messages,
+    create_collaboration_messages,
+    create_collaboration_feedback_messages,
+    create_statement_hallucination_abduction_messages,
+    create_statement_supported_abduction_messages,
+    create_chain_debates_judge_messages,
+    create_zeroshot_hallucination_judge,
+    create_chain_thought_hallucination_judge,
+    create_knowledge_filtered_hallucination_judge,
+    create_sentence_level_hallucination_judge,
+    create_statement_level_hallucination_judge,
+    create_chain_tailored_thoughts_hallucination_judge,
+    create_chain_tailored_thoughts_sentence_hallucination_judge,
+)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Offline dry-run planner for the calls, tokens, cost and duration of an experiment
+#
+# Every call a strategy would make is rendered with the create_*_messages builders and its tokens are counted
+# offline with tiktoken, or estimated as characters / 4 when tiktoken or its encoding files are not available; the plan
+# then names the estimated models in its tokenizer and sets estimated_tokens.
+# Nothing is sent to a model, so the parts of a prompt that are earlier answers (debate arguments, critiques,
+# filtered documents) are counted from their expected length, and so are the answers themselves:
+#   - the sentences of a summary come from the rule-based splitter,
+#   - the statements of a sentence are estimated by splitting it at clause boundaries,
+#   - a document filtered by an LLM is as long as the bm25 filtered document.
+# The decomposed strategies stop at the first hallucinated verdict, so their calls are reported both without
+# early exit (the upper bound) and expected with early exit, assuming the hallucinated part of a hallucinated
+# summary is equally likely to be at any position.
+
+MODEL_NAMES = {"phi3": "phi3:14b-instruct",
+               "gpt4o_mini": "gpt-4o-mini",
+               "gpt35": "gpt-3.5-turbo-0125",
+               "gpt4": "gpt-4-turbo",
+               "gpt4o": "gpt-4o"}
+
+# USD per million input and output tokens, the local phi3 is free; the Batch API halves the prices
+PRICES = {"phi3": (0.0, 0.0),
+          "gpt4o_mini": (0.15, 0.60),
+          "gpt35": (0.50, 1.50),
+          "gpt4": (10.00, 30.00),
+          "gpt4o": (2.50, 10.00)}
+
+# Seconds until the first token, prompt tokens per second and completion tokens per second
+LATENCIES = {"phi3": (0.3, 1500.0, 25.0),
+             "gpt4o_mini": (0.4, 8000.0, 80.0),
+             "gpt35": (0.4, 8000.0, 90.0),
+             "gpt4": (0.8, 4000.0, 30.0),
+             "gpt4o": (0.5, 6000.0, 60.0)}
+
+# Expected completion tokens of the answers that are not copied from the summary or the document
+VERDICT_TOKENS = 5
+REASONING_TOKENS = 200
+ARGUMENT_TOKENS = 120
+
+# Clause boundaries at which the statement estimate splits a sentence
+_CLAUSE = re.compile(r",\s+(?:and|but|while|which|who|after|before|as)\s+|;\s+|\s+(?:and|but|while|after)\s+(?=[a-z]+\s+[a-z]+)")
+
+PlannedCall = namedtuple("PlannedCall", ["LLM", "prompt_tokens", "completion_tokens", "unit", "prompt"])
+
+# The model keys whose tokens were estimated from the characters since the last plan_run
+estimated_models = set()
+
+@functools.lru_cache(maxsize=None)
+def _encoding(LLM: str):
+    if tiktoken is None:
+        warnings.warn(f"tiktoken is not installed (see requirements.txt), the tokens of {LLM} are estimated as characters / 4")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(MODEL_NAMES.get(LLM, "gpt-4o"))
+        except KeyError:
+            # phi3 and unknown models are counted with the gpt-4o encoding
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as error:
+        # The encoding files could not be loaded, e.g. without network access and without TIKTOKEN_CACHE_DIR
+        warnings.warn(f"tiktoken encoding unavailable ({error}), the tokens of {LLM} are estimated as characters / 4")
+        return None
+
+def count_tokens(text: str, LLM: str = "gpt4o_mini") -> int:
+    encoding = _encoding(LLM)
+    if encoding is None:
+        estimated_models.add(LLM)
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def tokenizer_name() -> str:
+    '''This function names how the tokens of the last plan were counted.
+
+    - Input: None
+    - Output: "tiktoken", or the models whose tokens are estimated as characters / 4
+    '''
+    if not estimated_models:
+        return "tiktoken"
+    return f"characters / 4 for {', '.join(sorted(estimated_models))} (estimated)"
+
+def count_message_tokens(messages: list, LLM: str = "gpt4o_mini") -> int:
+    '''This function counts the prompt tokens of a conversation list like the chat completions API does.
+
+    - Input: the conversation list and the model key
+    - Output: the number of prompt tokens
+    '''
+    # Every message adds 3 formatting tokens and the answer is primed with 3 more
+    return sum(3 + count_tokens(message["content"], LLM) for message in messages) + 3
+
+def estimate_statements(sentence: str) -> list:
+    '''This function estimates the statements the LLM extractor would return for a sentence.
+
+    - Input: a sentence
+    - Output: the estimated statements, at least the sentence itself
+    '''
+    pieces = [piece.strip() for piece in _CLAUSE.split(sentence) if len(piece.split()) >= 3]
+    return pieces or [sentence]
+
+class _Planner:
+    # Collects the calls of one strategy on one summary
+
+    def __init__(self):
+        self.calls = []
+
+    def call(self, LLM: str, messages: list, completion_tokens: int, unit: int = None, extra_prompt_tokens: int = 0, estimated: bool = False) -> None:
+        prompt_tokens = count_message_tokens(messages, LLM) + extra_prompt_tokens
+        # Prompts that contain estimated answers differ in the real run, so only the others can be deduplicated
+        prompt = None if estimated or extra_prompt_tokens else "\n".join(message["content"] for message in messages)
+        self.calls.append(PlannedCall(LLM, prompt_tokens, completion_tokens, unit, prompt))
+
+def _decomposition(summary: str) -> list:
+    sentences = split_sentences(summary)
+    return [(sentence, estimate_statements(sentence)) for sentence in sentences]
+
+def _plan_baseline(planner, LLM, document, summary):
+    planner.call(LLM or "gpt4o_mini", create_zeroshot_hallucination_judge(document, summary), VERDICT_TOKENS)
+
+def _plan_chain_thoughts(planner, LLM, document, summary):
+    planner.call("gpt4o_mini", create_chain_thought_hallucination_judge(document, summary), REASONING_TOKENS)
+
+def _plan_knowledge_filtering(planner, LLM, document, summary):
+    filtered_document = bm25_filter(document, summary)
+    if LLM != "bm25":
+        planner.call(LLM, create_document_sentences_extractor_messages(document, summary), count_tokens(filtered_document, LLM))
+    planner.call("gpt4o", create_knowledge_filtered_hallucination_judge(filtered_document, summary), VERDICT_TOKENS, estimated=LLM != "bm25")
+
+def _plan_sentence_extraction(planner, summary, decomposition):
+    planner.call("gpt4o_mini", create_summary_sentence_extractor_messages(summary), count_tokens("\n".join(sentence for (sentence, _) in decomposition)), unit=0)
+
+def _plan_sentence_judges(planner, LLM, document, summary, builder, completion_tokens):
+    decomposition = _decomposition(summary)
+    _plan_sentence_extraction(planner, summary, decomposition)
+    for (unit, (sentence, _)) in enumerate(decomposition):
+        planner.call(LLM, builder(document, summary, sentence), completion_tokens, unit)
+
+def _plan_statement_judges(planner, LLM, document, summary, builder, completion_tokens):
+    decomposition = _decomposition(summary)
+    _plan_sentence_extraction(planner, summary, decomposition)
+    unit = 0
+    for (sentence, statements) in decomposition:
+        # The statements of a sentence are only extracted when the strategy reaches the sentence
+        planner.call("gpt4o_mini", create_sentence_statement_extractor_messages(summary, sentence), count_tokens("\n".join(statements)), unit)
+        for statement in statements:
+            planner.call(LLM, builder(document, summary, sentence, statement), completion_tokens, unit)
+            unit += 1
+
+def _plan_sentence_level(planner, LLM, document, summary):
+    _plan_sentence_judges(planner, LLM, document, summary, create_sentence_level_hallucination_judge, VERDICT_TOKENS)
+
+def _plan_chain_tailored_thoughts_sentence(planner, LLM, document, summary):
+    _plan_sentence_judges(planner, LLM, document, summary, create_chain_tailored_thoughts_sentence_hallucination_judge, REASONING_TOKENS)
+
+def _plan_statement_level(planner, LLM, document, summary):
+    _plan_statement_judges(planner, LLM, document, summary, create_statement_level_hallucination_judge, VERDICT_TOKENS)
+
+def _plan_chain_tailored_thoughts(planner, LLM, document, summary):
+    _plan_statement_judges(planner, LLM, document, summary, create_chain_tailored_thoughts_hallucination_judge, REASONING_TOKENS)
+
+def _plan_counterfactual_debate(planner, LLM, document, summary):
+    for (abduction, critic, defence) in ((create_hallucination_abduction_messages, create_hallucinated_critic_messages, create_defence_hallucination_messages),
+                                         (create_supported_abduction_messages, create_supported_critic_messages, create_defence_supported_messages)):
+        planner.call(LLM, abduction(document, summary), ARGUMENT_TOKENS)
+        planner.call(LLM, critic(document, summary, ""), ARGUMENT_TOKENS, extra_prompt_tokens=ARGUMENT_TOKENS)
+        planner.call(LLM, defence(document, summary, "", ""), ARGUMENT_TOKENS, extra_prompt_tokens=2 * ARGUMENT_TOKENS)
+    planner.call("gpt4o", create_judge_messages(summary, ""), VERDICT_TOKENS, extra_prompt_tokens=6 * ARGUMENT_TOKENS)
+
+def _plan_counterfactual_debate_extended(planner, LLM, document, summary):
+    # The debate is read from an earlier counterfactual_debate run
+    planner.call("gpt4o", create_extended_judge_messages(document, summary, ""), VERDICT_TOKENS, extra_prompt_tokens=6 * ARGUMENT_TOKENS)
+
+def _plan_counterfactual_debate_modified(planner, LLM, document, summary):
+    planner.call(LLM, create_hallucination_abduction_messages(document, summary), ARGUMENT_TOKENS)
+    planner.call(LLM, create_supported_abduction_messages(document, summary), ARGUMENT_TOKENS)
+    planner.call("gpt4o", create_extended_judge_messages(document, summary, ""), VERDICT_TOKENS, extra_prompt_tokens=2 * ARGUMENT_TOKENS)
+
+def _plan_collaborative_debate(planner, LLM, document, summary):
+    planner.call(LLM, create_collaboration_messages(document, summary), ARGUMENT_TOKENS)
+    planner.call(LLM, create_collaboration_feedback_messages(document, summary, ""), ARGUMENT_TOKENS, extra_prompt_tokens=ARGUMENT_TOKENS)
+    planner.call("gpt4o", create_extended_judge_messages(document, summary, ""), VERDICT_TOKENS, extra_prompt_tokens=2 * ARGUMENT_TOKENS)
+
+def _plan_chain_debates(planner, LLM, document, summary):
+    decomposition = _decomposition(summary)
+    _plan_sentence_extraction(planner, summary, decomposition)
+    for (unit, (sentence, _)) in enumerate(decomposition):
+        planner.call(LLM, create_statement_hallucination_abduction_messages(document, summary, sentence), ARGUMENT_TOKENS, unit)
+        planner.call(LLM, create_statement_supported_abduction_messages(document, summary, sentence), ARGUMENT_TOKENS, unit)
+        planner.call("gpt4o", create_chain_debates_judge_messages(document, summary, ""), VERDICT_TOKENS, unit, extra_prompt_tokens=2 * ARGUMENT_TOKENS)
+
+# dict that converts a strategy name into its plan
+strategy_plans = {"baseline": _plan_baseline,
+                  "chain_thoughts": _plan_chain_thoughts,
+                  "knowledge_filtering": _plan_knowledge_filtering,
+                  "sentence_level": _plan_sentence_level,
+                  "statement_level": _plan_statement_level,
+                  "chain_tailored_thoughts": _plan_chain_tailored_thoughts,
+                  "chain_tailored_thoughts_sentence": _plan_chain_tailored_thoughts_sentence,
+                  "counterfactual_debate": _plan_counterfactual_debate,
+                  "counterfactual_debate_extended": _plan_counterfactual_debate_extended,
+                  "counterfactual_debate_modified": _plan_counterfactual_debate_modified,
+                  "collaborative_debate": _plan_collaborative_debate,
+                  "chain_debates": _plan_chain_debates}
+
+def plan_strategy(strategy: str, LLM: str, document: str, summary: str) -> list:
+    '''This function lists the calls a strategy would make on one summary, without calling any model.
+
+    - Input: the strategy name, its model argument (judging, debating or filtering LLM, None where the strategy has none), a document and a summary
+    - Output: the planned calls, with the index of the judged part for the calls an early exit can skip
+    '''
+    planner = _Planner()
+    strategy_plans[strategy](planner, LLM, document, summary)
+    return planner.calls
+
+def call_latency(call: PlannedCall) -> float:
+    (first_token, prompt_rate, completion_rate) = LATENCIES[call.LLM]
+    return first_token + call.prompt_tokens / prompt_rate + call.completion_tokens / completion_rate
+
+def call_cost(call: PlannedCall, batch: bool = False) -> float:
+    (input_price, output_price) = PRICES[call.LLM]
+    cost = (call.prompt_tokens * input_price + call.completion_tokens * output_price) / 1_000_000
+    return cost / 2 if batch else cost
+
+def expected_share(calls: list, label: int) -> list:
+    '''This function gives the probability that each planned call is made.
+    Supported summaries make every call; a hallucinated summary stops after a uniformly random judged part.
+
+    - Input: the planned calls of one strategy on one summary and the label of the summary
+    - Output: the probability of every call
+    '''
+    units = sorted({call.unit for call in calls if call.unit is not None})
+    if label == 0 or not units:
+        return [1.0] * len(calls)
+    # The call for unit u is made when the exit happens at unit u or later
+    return [1.0 if call.unit is None else (len(units) - units.index(call.unit)) / len(units) for call in calls]
+
+def plan_run(summaries: list, strategies: list, concurrency: dict = None, batch: bool = False, deduplicate: bool = False) -> dict:
+    '''This function plans an experiment: every strategy on every summary.
+
+    - Input: the summaries as (document, summary, label) tuples, the strategies as (strategy, LLM) pairs, the concurrency per model
+      (None for a sequential run), whether the OpenAI models are answered by the Batch API and whether identical prompts are
+      answered once, as with the response cache or a shared SummaryDecomposition
+    - Output: a dict with the totals of the run and the statistics per strategy
+    '''
+    estimated_models.clear()
+    seen_prompts = set()
+    per_strategy = {}
+    latency_per_model = {}
+    critical_path = 0.0
+
+    for (document, summary, label) in summaries:
+        for (strategy, LLM) in strategies:
+            calls = plan_strategy(strategy, LLM, document, summary)
+            if deduplicate:
+                keys = [(call.LLM, call.prompt) for call in calls]
+                calls = [call for (call, key) in zip(calls, keys) if call.prompt is None or key not in seen_prompts]
+                seen_prompts.update(key for key in keys if key[1] is not None)
+            shares = expected_share(calls, label)
+
+            name = strategy if LLM is None else f"{strategy} ({LLM})"
+            stats = per_strategy.setdefault(name, {"calls_per_summary": [], "max_calls": 0, "expected_calls": 0.0,
+                                                   "prompt_tokens": 0.0, "completion_tokens": 0.0,
+                                                   "max_cost": 0.0, "expected_cost": 0.0, "expected_latency": 0.0})
+            stats["calls_per_summary"].append(len(calls))
+            stats["max_calls"] += len(calls)
+            stats["max_cost"] += sum(call_cost(call, batch) for call in calls)
+            path = 0.0
+            for (call, share) in zip(calls, shares):
+                latency = call_latency(call)
+                stats["expected_calls"] += share
+                stats["prompt_tokens"] += share * call.prompt_tokens
+                stats["completion_tokens"] += share * call.completion_tokens
+                stats["expected_cost"] += share * call_cost(call, batch)
+                stats["expected_latency"] += share * latency
+                latency_per_model[call.LLM] = latency_per_model.get(call.LLM, 0.0) + share * latency
+                path += share * latency
+            critical_path = max(critical_path, path)
+
+    sequential = sum(latency_per_model.values())
+    if concurrency is None:
+        wall_clock = sequential
+    else:
+        # The models have separate limits, so the slowest model bounds the run, and no strategy finishes faster than its own call chain
+        wall_clock = max([critical_path] + [latency / concurrency.get(LLM, 1) for (LLM, latency) in latency_per_model.items()])
+
+    for stats in per_strategy.values():
+        calls_per_summary = sorted(stats.pop("calls_per_summary"))
+        stats["calls_per_summary_median"] = statistics.median(calls_per_summary)
+        stats["calls_per_summary_p90"] = calls_per_summary[min(len(calls_per_summary) - 1, int(0.9 * len(calls_per_summary)))]
+        stats["calls_per_summary_max"] = calls_per_summary[-1]
+
+    return {"summaries": len(summaries),
+            "tokenizer": tokenizer_name(),
+            "estimated_tokens": bool(estimated_models),
+            "expected_calls": sum(stats["expected_calls"] for stats in per_strategy.values()),
+            "max_calls": sum(stats["max_calls"] for stats in per_strategy.values()),
+            "prompt_tokens": sum(stats["prompt_tokens"] for stats in per_strategy.values()),
+            "completion_tokens": sum(stats["completion_tokens"] for stats in per_strategy.values()),
+            "expected_cost": sum(stats["expected_cost"] for stats in per_strategy.values()),
+            "max_cost": sum(stats["max_cost"] for stats in per_strategy.values()),
+            "sequential_seconds": sequential,
+            "wall_clock_seconds": wall_clock,
+            "strategies": per_strategy}
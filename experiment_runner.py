@@ -0,0 +1,312 @@
+import asyncio
+import inspect
+import itertools
+import json
+import random
+import time
+import pandas as pd
+from datetime import datetime
+import async_helpers
+import batch_mode
+import response_cache
+from checkpoint import Checkpoint
+from live_metrics import LiveMetrics
+from metrics import confusion_matrices
+from result_sink import ResultSink
+from verdict_probabilities import collect_probabilities, summary_probability
+from helpers import SummaryDecomposition, find_random_summary_with_consistency_5, find_random_summary_with_hallucinations
+
+# Config-driven experiment runner
+#
+# A sweep is a list of matrix entries, each a dataset with strategies, models, the number of rows and optional settings:
+#
+#     matrix = [{"dataset": "HaluEval", "strategies": ["baseline", "sentence_level"], "models": ["gpt4o_mini", "gpt4o"], "n": 100},
+#               {"dataset": "SummEval", "strategies": ["statement_level"], "models": ["gpt4o_mini"], "n": 25,
+#                "sentence_splitter": "rule", "options": {"lexical_threshold": 0.9}}]
+#
+# Every dataset × strategy × model combination is a cell. The rows of every cell, with a right and a hallucinated summary
+# each, are scheduled at once on one event loop through the async strategies, within the per-model concurrency limits.
+# Cells on the same summary share one SummaryDecomposition, and the response cache is shared by the whole sweep.
+# Every judged summary is written to one results file in long format, one line per (dataset, row, label, strategy, model),
+# by the background writer of result_sink, and the TPR, TNR and F1 of every cell are computed from those lines.
+# The judgements are also stored in a checkpoint under the same key, such that a restarted sweep only runs the missing ones.
+
+DATASETS = ("HaluEval", "SummEval", "QAGS")
+
+strategy_functions = {"baseline": async_helpers.baseline_async,
+                      "chain_thoughts": async_helpers.chain_thoughts_async,
+                      "sentence_level": async_helpers.sentence_level_async,
+                      "statement_level": async_helpers.statement_level_async,
+                      "chain_tailored_thoughts": async_helpers.chain_tailored_thoughts_async,
+                      "chain_tailored_thoughts_sentence": async_helpers.chain_tailored_thoughts_sentence_async,
+                      "knowledge_filtering": async_helpers.knowledge_filtering_async,
+                      "counterfactual_debate": async_helpers.counterfactual_debate_async,
+                      "counterfactual_debate_modified": async_helpers.counterfactual_debate_modified_async,
+                      "collaborative_debate": async_helpers.collaborative_debate_async,
+                      "chain_debates": async_helpers.chain_debates_async}
+
+# Strategies taking a SummaryDecomposition, and chain_thoughts which always judges with gpt4o_mini
+DECOMPOSED_STRATEGIES = {"sentence_level", "statement_level", "chain_tailored_thoughts", "chain_tailored_thoughts_sentence", "chain_debates"}
+FIXED_MODELS = {"chain_thoughts": "gpt4o_mini"}
+
+LIVE_METRICS_INTERVAL = 2.0
+
+RESULT_COLUMNS = ['Timestamp', 'Dataset', 'Row', 'True Label', 'Strategy', 'Model', 'Prediction', 'Probability', 'Unit Probabilities', 'Details', 'Error', 'Seconds', 'Document', 'Summary']
+
+# Loading the datasets, with the row selection of the experiment scripts
+
+def load_items(dataset: str, n: int) -> list:
+    '''This function loads the first n rows of a dataset as judged summaries, a right (label 0) and a hallucinated (label 1) one per row.
+    The rows are shuffled with random_state=42 and keep their index in the dataset as row id.
+
+    - Input: the dataset ("HaluEval", "SummEval" or "QAGS") and the number of rows
+    - Output: a list of dicts with the row, label, document and summary
+    '''
+    items = []
+    if dataset == "HaluEval":
+        from datasets import load_dataset
+        # The first three rows are used for fewshot prompting
+        df = load_dataset("pminervini/HaluEval", "summarization")['data'].to_pandas().iloc[3:]
+        df = df.sample(frac=1, random_state=42)
+        for (index, row) in df.iterrows():
+            if len(items) == 2 * n:
+                break
+            (document, right_summary, hallucinated_summary) = (row['document'], row['right_summary'], row['hallucinated_summary'])
+            # Filter rows with data contaminations and summaries of different length, as the chain of tailored thoughts scripts do
+            if "CLICK HERE" in right_summary or "CLICK HERE" in hallucinated_summary or "CLICK HERE" in document:
+                continue
+            if len(hallucinated_summary) > (1.05 * len(right_summary)) or len(hallucinated_summary) < (0.95 * len(right_summary)):
+                continue
+            items.append({"row": int(index), "label": 0, "document": document, "summary": right_summary})
+            items.append({"row": int(index), "label": 1, "document": document, "summary": hallucinated_summary})
+
+    elif dataset == "SummEval":
+        from datasets import load_dataset
+        df = load_dataset("mteb/summeval")['test'].to_pandas().sample(frac=1, random_state=42)
+        # The summaries are drawn at random, seeded such that a rerun judges the same summaries
+        state = random.getstate()
+        random.seed(42)
+        try:
+            for (index, row) in df.iterrows():
+                if len(items) == 2 * n:
+                    break
+                right_summary = find_random_summary_with_consistency_5(row)
+                hallucinated_summary = find_random_summary_with_hallucinations(row)
+                if right_summary is None or hallucinated_summary is None:
+                    continue
+                items.append({"row": int(index), "label": 0, "document": row['text'], "summary": right_summary})
+                items.append({"row": int(index), "label": 1, "document": row['text'], "summary": hallucinated_summary})
+        finally:
+            random.setstate(state)
+
+    elif dataset == "QAGS":
+        # The right and the hallucinated summaries come from two files and belong to different articles
+        correct = pd.read_csv("Data/QAGS/correct.csv").sample(frac=1, random_state=42)
+        hallucinated = pd.read_csv("Data/QAGS/hallucinated.csv").sample(frac=1, random_state=42)
+        for (i, ((index, right_row), (_, hallucinated_row))) in enumerate(zip(correct.iterrows(), hallucinated.iterrows())):
+            if i == n:
+                break
+            items.append({"row": int(index), "label": 0, "document": right_row['article'], "summary": right_row['summary']})
+            items.append({"row": int(index), "label": 1, "document": hallucinated_row['article'], "summary": hallucinated_row['summary']})
+
+    else:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    return items
+
+# Expanding the matrix into cells
+
+def expand_matrix(matrix: list) -> list:
+    '''This function expands the matrix entries into cells, one per dataset, strategy and model.
+
+    - Input: the matrix, a list of dicts with dataset, strategies, models, n and optionally sentence_splitter and options
+    - Output: the list of cells, dicts with dataset, strategy, model, n, sentence_splitter and options
+    '''
+    cells = {}
+    for entry in matrix:
+        if entry["dataset"] not in DATASETS:
+            raise ValueError(f"Unknown dataset: {entry['dataset']}")
+        for (strategy, model) in itertools.product(entry["strategies"], entry.get("models", ["gpt4o_mini"])):
+            if strategy not in strategy_functions:
+                raise ValueError(f"Unknown strategy: {strategy}")
+            model = FIXED_MODELS.get(strategy, model)
+            # "bm25" only exists as the knowledge filter
+            if model not in async_helpers.async_response_dict and not (strategy == "knowledge_filtering" and model == "bm25"):
+                raise ValueError(f"Unknown model for {strategy}: {model}")
+            key = (entry["dataset"], strategy, model)
+            if key in cells:
+                print(f"Skipping {key}, the cell is already in the matrix")
+                continue
+            cells[key] = {"dataset": entry["dataset"],
+                          "strategy": strategy,
+                          "model": model,
+                          "n": entry["n"],
+                          "sentence_splitter": entry.get("sentence_splitter", "llm"),
+                          "options": entry.get("options", {})}
+    return list(cells.values())
+
+def strategy_options(strategy: str, options: dict) -> dict:
+    # An entry's options apply to the strategies that accept them, e.g. lexical_threshold to statement_level but not to sentence_level
+    parameters = inspect.signature(strategy_functions[strategy]).parameters
+    return {name: value for (name, value) in options.items() if name in parameters}
+
+# Running the cells
+
+async def judge_async(cell: dict, item: dict, decomposition: SummaryDecomposition) -> dict:
+    '''This function judges one summary with the strategy and model of a cell.
+    A failing strategy is recorded with its error instead of stopping the sweep.
+    With verdict probabilities on, the P(hallucinated) of every judge call is recorded, in the order of the calls, as a JSON list
+    and the largest as the probability of the summary.
+
+    - Input: the cell, the summary item and the shared decomposition of the summary
+    - Output: the result record
+    '''
+    (strategy, model) = (cell["strategy"], cell["model"])
+    function = strategy_functions[strategy]
+    options = strategy_options(strategy, cell["options"])
+    start = time.perf_counter()
+    (prediction, details, error) = (None, "", "")
+    probabilities = []
+    try:
+        with collect_probabilities() as probabilities:
+            if strategy == "baseline":
+                result = await function(item["document"], item["summary"], model, **options)
+            elif strategy in FIXED_MODELS:
+                result = await function(item["document"], item["summary"], **options)
+            elif strategy in DECOMPOSED_STRATEGIES:
+                result = await function(model, item["document"], item["summary"], decomposition, **options)
+            else:
+                result = await function(model, item["document"], item["summary"], **options)
+        # The strategies return the prediction alone or followed by their reasoning or debates
+        if isinstance(result, tuple):
+            (prediction, details) = (result[0], "\n".join(str(part) for part in result[1:]))
+        else:
+            prediction = result
+    except Exception as exception:
+        error = repr(exception)
+        print(f"{strategy} with {model} failed on {cell['dataset']} row {item['row']}: {error}")
+
+    return {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Dataset': cell["dataset"],
+            'Row': item["row"],
+            'True Label': item["label"],
+            'Strategy': strategy,
+            'Model': model,
+            'Prediction': prediction,
+            'Probability': summary_probability(probabilities) if prediction is not None else None,
+            'Unit Probabilities': json.dumps(probabilities) if probabilities and prediction is not None else None,
+            'Details': details,
+            'Error': error,
+            'Seconds': time.perf_counter() - start,
+            'Document': item["document"],
+            'Summary': item["summary"]}
+
+async def run_matrix_async(matrix: list, results_file: str = "experiment_runner.jsonl", batch: bool = False, checkpoint_file: str = "experiment_runner_checkpoint.jsonl") -> list:
+    '''This function runs every cell of the matrix concurrently and writes each judged summary as soon as it is done.
+    Judgements found in the checkpoint are not run again, they are returned from the checkpoint without a new results line.
+
+    - Input: the matrix, the results file (.jsonl or .parquet), whether the OpenAI calls are answered through the Batch API
+      and the checkpoint file (None to run every judgement)
+    - Output: the result records of the whole matrix, restored and new
+    '''
+    cells = expand_matrix(matrix)
+    items = {}
+    for cell in cells:
+        n = max(other["n"] for other in cells if other["dataset"] == cell["dataset"])
+        if cell["dataset"] not in items:
+            items[cell["dataset"]] = load_items(cell["dataset"], n)
+
+    checkpoint = Checkpoint(checkpoint_file) if checkpoint_file is not None else None
+    sink = ResultSink(results_file)
+    # One decomposition per summary and sentence splitter, shared by the cells
+    decompositions = {}
+    records = []
+
+    async def judge_and_write(cell: dict, item: dict) -> None:
+        key = (item["summary"], cell["sentence_splitter"])
+        if key not in decompositions:
+            decompositions[key] = SummaryDecomposition(item["summary"], sentence_splitter=cell["sentence_splitter"])
+        record = await judge_async(cell, item, decompositions[key])
+        sink.write(record)
+        live_metrics.update(record['Strategy'], record['Model'], record['True Label'], record['Prediction'], record['Dataset'])
+        live_metrics.advance()
+        if checkpoint is not None and not record['Error']:
+            checkpoint.put(judgement_key(cell, item), item["summary"], record['Prediction'], [record['Details']] if record['Details'] else None,
+                           json.loads(record['Unit Probabilities']) if record['Unit Probabilities'] else None)
+        records.append(record)
+
+    coroutines = []
+    for cell in cells:
+        for item in items[cell["dataset"]][:2 * cell["n"]]:
+            judgement = checkpoint.get(judgement_key(cell, item), item["summary"]) if checkpoint is not None else None
+            if judgement is not None:
+                records.append(restored_record(cell, item, judgement))
+            else:
+                coroutines.append(judge_and_write(cell, item))
+
+    print(f"Running {len(cells)} cells with {len(coroutines)} judged summaries ({len(records)} restored from the checkpoint)")
+    # The judgements finish out of order, the status line is printed at most every LIVE_METRICS_INTERVAL seconds
+    live_metrics = LiveMetrics(total=len(coroutines) + len(records), interval=LIVE_METRICS_INTERVAL, unit="Judgement")
+    for record in records:
+        live_metrics.update(record['Strategy'], record['Model'], record['True Label'], record['Prediction'], record['Dataset'])
+    if records:
+        live_metrics.advance(len(records), restored=True)
+    try:
+        if batch:
+            await batch_mode.run_in_batches_async(coroutines)
+        else:
+            await asyncio.gather(*coroutines)
+    finally:
+        live_metrics.close()
+        sink.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    return records
+
+def judgement_key(cell: dict, item: dict) -> tuple:
+    return (cell["dataset"], item["row"], item["label"], cell["strategy"], cell["model"])
+
+def restored_record(cell: dict, item: dict, judgement: dict) -> dict:
+    return {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Dataset': cell["dataset"],
+            'Row': item["row"],
+            'True Label': item["label"],
+            'Strategy': cell["strategy"],
+            'Model': cell["model"],
+            'Prediction': judgement["prediction"],
+            'Probability': summary_probability(judgement.get("probabilities")),
+            'Unit Probabilities': json.dumps(judgement["probabilities"]) if judgement.get("probabilities") else None,
+            'Details': "\n".join(judgement.get("parts", [])),
+            'Error': "",
+            'Seconds': 0.0,
+            'Document': item["document"],
+            'Summary': item["summary"]}
+
+def run_matrix(matrix: list, results_file: str = "experiment_runner.jsonl", batch: bool = False, cache: bool = True, concurrency: dict = None, checkpoint_file: str = "experiment_runner_checkpoint.jsonl") -> list:
+    '''Synchronous entry point of run_matrix_async.
+
+    - Input: the matrix, the results file, whether to use the Batch API, whether to share the response cache,
+      the concurrency limit per model key, e.g. {"gpt4o": 16}, and the checkpoint file (None to run every judgement)
+    - Output: the result records
+    '''
+    if cache and response_cache.active_cache is None:
+        response_cache.enable_response_cache()
+    for (LLM, limit) in (concurrency or {}).items():
+        async_helpers.set_concurrency_limit(LLM, limit)
+    return asyncio.run(run_matrix_async(matrix, results_file, batch, checkpoint_file))
+
+# Metrics per cell
+
+def summarize(records: list) -> pd.DataFrame:
+    '''This function computes the TPR, TNR and F1 score of every cell from the result records.
+    Failed judgements are counted and left out of the metrics.
+
+    - Input: the result records
+    - Output: a DataFrame with one line per dataset, strategy and model
+    '''
+    df = pd.DataFrame(records, columns=RESULT_COLUMNS)
+    cells = df.groupby(['Dataset', 'Strategy', 'Model'], sort=False).agg(**{'Number of Rows': ('Row', 'nunique'),
+                                                                           'Failed Judgements': ('Prediction', lambda predictions: predictions.isna().sum())})
+    matrices = confusion_matrices(df) if df['Prediction'].notna().any() else pd.DataFrame(columns=['Dataset', 'Strategy', 'Model'])
+    summary = cells.reset_index().merge(matrices, on=['Dataset', 'Strategy', 'Model'], how='left')
+    summary.insert(0, 'Timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return summary[['Timestamp', 'Dataset', 'Strategy', 'Model', 'Number of Rows', 'Failed Judgements', 'F1 Score', 'TPR', 'TNR']]
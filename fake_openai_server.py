@@ -0,0 +1,321 @@
+import email.parser
+import email.policy
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the OpenAI endpoints used in this repository
+#
+# It serves chat completions, file uploads and the Batch API, such that the batch mode
+# can be exercised without network access or API spend, e.g.
+#
+#     server = start_fake_server(port=8765)
+#     client = openai.OpenAI(base_url="http://127.0.0.1:8765/v1", api_key="nokeyneeded")
+#
+# The content of every completion is produced by server.responder, which can be replaced.
+# Errors and slow responses of chat completions can be injected to exercise the retries, e.g.
+#
+#     server.inject_fault(status=429, retry_after=2, count=3)
+#     server.inject_fault(delay=30)
+#     server.error_rate = 0.1
+#
+# With logprobs=True every word of the content is a token with logprob log(p). A word holding a verdict label gets
+# the other label of its pair as the alternative with log(1 - p), p being drawn between 0.5 and 1 per answer; the
+# quoted labels of the JSON answers of the batched statement judges get the other quoted label.
+#
+# Requests with stream=True are answered as server-sent events, one word per chunk, with server.stream_delay seconds
+# between two chunks, such that stopping a stream early can be measured.
+
+# The verdict labels and the label replacing each of them in the alternatives of the logprobs
+OTHER_LABELS = {"[HALLUCINATED]": "[SUPPORTED]", "[SUPPORTED]": "[HALLUCINATED]", "[TRUE]": "[FALSE]", "[FALSE]": "[TRUE]",
+                '"HALLUCINATED"': '"SUPPORTED"', '"SUPPORTED"': '"HALLUCINATED"'}
+
+def default_responder(body: dict) -> str:
+    '''This function answers every request with a supported verdict.
+
+    - Input: the JSON body of a chat completion request
+    - Output: the content of the completion
+    '''
+    return "[SUPPORTED]"
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+
+    def __init__(self, address, responder=default_responder):
+        super().__init__(address, FakeOpenAIHandler)
+        self.responder = responder
+        self.files = {}
+        self.batches = {}
+        self.requests = []
+        # Prompt caching like OpenAI's: prefixes of at least prefix_cache_min_tokens tokens, cached in steps of 128 tokens
+        self.prefix_cache_min_tokens = 1024
+        self.prompts = []
+        # Injected faults, consumed by the next chat completion requests, and the share of other requests failing with a 500 or 429
+        self.faults = []
+        self.error_rate = 0.0
+        self.failed_requests = 0
+        # Seconds between two chunks of a streamed completion, and the content chunks sent in all streams
+        self.stream_delay = 0.0
+        self.streamed_chunks = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a delayed response close the connection, which is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def next_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    def inject_fault(self, status: int = None, retry_after: float = None, delay: float = 0.0, count: int = 1) -> None:
+        '''This function makes the next chat completion requests fail or respond slowly.
+
+        - Input: the HTTP status of the error (None to answer normally after the delay), the Retry-After header in seconds,
+          the delay before responding in seconds and the number of requests affected
+        - Output: None
+        '''
+        with self._lock:
+            self.faults.extend([{"status": status, "retry_after": retry_after, "delay": delay}] * count)
+
+    def next_fault(self) -> dict:
+        with self._lock:
+            if self.faults:
+                return self.faults.pop(0)
+            if self.error_rate and random.random() < self.error_rate:
+                return {"status": random.choice([429, 500, 503]), "retry_after": None, "delay": 0.0}
+        return None
+
+    def completion(self, body: dict) -> dict:
+        with self._lock:
+            self.requests.append(body)
+        content = self.responder(body)
+        # Stop sequences end the content before them, and max_tokens cuts it after as many words
+        finish_reason = "stop"
+        for stop in ([body["stop"]] if isinstance(body.get("stop"), str) else body.get("stop") or []):
+            content = content.split(stop)[0]
+        limit = body.get("max_tokens") or body.get("max_completion_tokens")
+        if limit is not None and len(content.split()) > limit:
+            content = " ".join(content.split()[:limit])
+            finish_reason = "length"
+        prompt = [token for message in body.get("messages", []) for token in str(message.get("content", "")).split()]
+        prompt_tokens = len(prompt)
+        cached_tokens = self.cached_prefix(prompt)
+        completion_tokens = len(content.split())
+        logprobs = None
+        if body.get("logprobs"):
+            p = random.uniform(0.5, 1.0)
+            logprobs = {"content": [self.token_logprob(piece, p, body.get("top_logprobs") or 0) for piece in split_tokens(content)]}
+        return {"id": self.next_id("chatcmpl"),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{"index": 0,
+                             "finish_reason": finish_reason,
+                             "message": {"role": "assistant", "content": content},
+                             "logprobs": logprobs}],
+                "usage": {"prompt_tokens": prompt_tokens,
+                          "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens,
+                          "prompt_tokens_details": {"cached_tokens": cached_tokens}}}
+
+    @staticmethod
+    def token_logprob(piece: str, p: float, top_logprobs: int) -> dict:
+        alternatives = [{"token": piece, "logprob": math.log(p), "bytes": list(piece.encode("utf-8"))}]
+        for (label, other) in OTHER_LABELS.items():
+            if label in piece and p < 1.0:
+                alternative = piece.replace(label, other)
+                alternatives.append({"token": alternative, "logprob": math.log(1.0 - p), "bytes": list(alternative.encode("utf-8"))})
+                break
+        return {**alternatives[0], "top_logprobs": alternatives[:top_logprobs]}
+
+    def cached_prefix(self, prompt: list) -> int:
+        # The longest prefix shared with an earlier prompt, counting whitespace separated words as tokens
+        with self._lock:
+            longest = 0
+            for earlier in self.prompts:
+                shared = 0
+                for (token, earlier_token) in zip(prompt, earlier):
+                    if token != earlier_token:
+                        break
+                    shared += 1
+                longest = max(longest, shared)
+            self.prompts.append(prompt)
+        if longest < self.prefix_cache_min_tokens:
+            return 0
+        return longest - longest % 128
+
+    def file_object(self, file_id: str) -> dict:
+        stored = self.files[file_id]
+        return {"id": file_id,
+                "object": "file",
+                "bytes": len(stored["content"]),
+                "created_at": stored["created_at"],
+                "filename": stored["filename"],
+                "purpose": stored["purpose"],
+                "status": "processed"}
+
+    def run_batch(self, batch: dict) -> None:
+        # Batches are executed synchronously, so they are completed on the first poll
+        output_lines = []
+        for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output_lines.append(json.dumps({"id": self.next_id("batch_req"),
+                                            "custom_id": request["custom_id"],
+                                            "response": {"status_code": 200,
+                                                         "request_id": self.next_id("req"),
+                                                         "body": self.completion(request["body"])},
+                                            "error": None}))
+        output_file_id = self.next_id("file")
+        self.files[output_file_id] = {"content": "\n".join(output_lines).encode("utf-8"),
+                                      "filename": "batch_output.jsonl",
+                                      "purpose": "batch_output",
+                                      "created_at": int(time.time())}
+        batch["status"] = "completed"
+        batch["output_file_id"] = output_file_id
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {"total": len(output_lines), "completed": len(output_lines), "failed": 0}
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200, headers: dict = None) -> None:
+        encoded = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            body = json.loads(self._read_body())
+            fault = self.server.next_fault()
+            if fault is not None:
+                time.sleep(fault["delay"])
+                if fault["status"] is not None:
+                    self._send_fault(fault)
+                    return
+            if body.get("stream"):
+                self._send_stream(body, self.server.completion(body))
+            else:
+                self._send_json(self.server.completion(body))
+        elif path.endswith("/files"):
+            self._upload_file()
+        elif path.endswith("/batches"):
+            body = json.loads(self._read_body())
+            batch_id = self.server.next_id("batch")
+            self.server.batches[batch_id] = {"id": batch_id,
+                                             "object": "batch",
+                                             "endpoint": body["endpoint"],
+                                             "input_file_id": body["input_file_id"],
+                                             "completion_window": body["completion_window"],
+                                             "status": "validating",
+                                             "created_at": int(time.time())}
+            self._send_json(self.server.batches[batch_id])
+        else:
+            self._send_json({"error": {"message": f"Unknown path {path}"}}, 404)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        parts = path.strip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "batches":
+            batch = self.server.batches[parts[-1]]
+            if batch["status"] == "validating":
+                self.server.run_batch(batch)
+            self._send_json(batch)
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+            content = self.server.files[parts[-2]]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif len(parts) >= 2 and parts[-2] == "files":
+            self._send_json(self.server.file_object(parts[-1]))
+        else:
+            self._send_json({"error": {"message": f"Unknown path {path}"}}, 404)
+
+    def _send_stream(self, body: dict, completion: dict) -> None:
+        # A client that stopped reading closes the connection, the next write then fails and ends the stream
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+        content = completion["choices"][0]["message"]["content"]
+        logprobs = completion["choices"][0]["logprobs"]
+        for (i, piece) in enumerate(split_tokens(content)):
+            if i and self.server.stream_delay:
+                time.sleep(self.server.stream_delay)
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            choice = {"index": 0, "delta": delta, "finish_reason": None}
+            if logprobs is not None:
+                choice["logprobs"] = {"content": [logprobs["content"][i]]}
+            self._send_event({**chunk, "choices": [choice]})
+            with self.server._lock:
+                self.server.streamed_chunks += 1
+        self._send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": completion["choices"][0]["finish_reason"]}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**chunk, "choices": [], "usage": completion["usage"]})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_event(self, payload: dict) -> None:
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _send_fault(self, fault: dict) -> None:
+        with self.server._lock:
+            self.server.failed_requests += 1
+        headers = {"Retry-After": str(fault["retry_after"])} if fault["retry_after"] is not None else {}
+        error_type = "rate_limit_exceeded" if fault["status"] == 429 else "server_error"
+        self._send_json({"error": {"message": f"Injected error {fault['status']}", "type": error_type, "code": None}},
+                        fault["status"], headers)
+
+    def _upload_file(self) -> None:
+        # The OpenAI client uploads files as multipart/form-data
+        raw = b"Content-Type: " + self.headers["Content-Type"].encode("utf-8") + b"\r\n\r\n" + self._read_body()
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(raw)
+        fields = {}
+        for part in message.iter_parts():
+            fields[part.get_param("name", header="content-disposition")] = (part.get_filename(), part.get_payload(decode=True))
+        file_id = self.server.next_id("file")
+        (filename, content) = fields["file"]
+        self.server.files[file_id] = {"content": content,
+                                      "filename": filename or "upload.jsonl",
+                                      "purpose": fields.get("purpose", (None, b"batch"))[1].decode("utf-8"),
+                                      "created_at": int(time.time())}
+        self._send_json(self.server.file_object(file_id))
+
+def split_tokens(content: str) -> list:
+    # Words with their surrounding whitespace, such that the tokens join to the content
+    return re.findall(r"\s*\S+\s*", content) or [content]
+
+def start_fake_server(host: str = "127.0.0.1", port: int = 8765, responder=default_responder) -> FakeOpenAIServer:
+    '''This function starts the stand-in server on a background thread.
+
+    - Input: the host, the port and optionally a responder function
+    - Output: the running server, stop it with server.shutdown()
+    '''
+    server = FakeOpenAIServer((host, port), responder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    server = FakeOpenAIServer(("127.0.0.1", 8765))
+    print("Serving a fake OpenAI API on http://127.0.0.1:8765/v1")
+    server.serve_forever()
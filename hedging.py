@@ -0,0 +1,185 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+
+# Hedged requests
+#
+# A few slow completions dominate the tail latency of the multi-call strategies, e.g. the gpt-4o debate judges.
+# With hedging on for a model, a call that has not returned after the HEDGE_PERCENTILE of the recent latencies of
+# the model is sent a second time. The first answer is taken and the other call is cancelled; in the synchronous
+# scripts a started HTTP request cannot be cancelled, so its answer is discarded when it arrives. All calls use
+# temperature 0, so both calls ask the same question.
+#
+# Hedging waits for MIN_SAMPLES latencies of a model before it fires, and the extra calls are capped at
+# HEDGE_BUDGET times the calls of the model. The latencies are those of the first calls only: when the duplicate wins,
+# the time the first call has run until then is recorded as a lower bound of its latency, such that the slow calls
+# stay in the window and the percentile does not drift down. Switch it on with enable_hedging or HEDGING="gpt-4o" (API model names).
+
+HEDGE_PERCENTILE = 0.95
+HEDGE_BUDGET = 0.1
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# The hedged models with their percentile and budget
+hedging_policy = {}
+
+# Counters per API model name
+hedging_stats = {}
+_latencies = {}
+_lock = threading.Lock()
+
+# Threads for the synchronous calls, both copies of a hedged call run there
+_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="hedging")
+
+def enable_hedging(models: list = ("gpt-4o",), percentile: float = HEDGE_PERCENTILE, budget: float = HEDGE_BUDGET) -> None:
+    '''This function switches hedged requests on for the given models.
+
+    - Input: the API model names, the percentile of the recent latencies after which the duplicate is sent
+      and the extra calls allowed as a share of the calls of the model
+    - Output: None
+    '''
+    if not 0 < percentile < 1:
+        raise ValueError("The percentile must be between 0 and 1")
+    for model in models:
+        hedging_policy[model] = {"percentile": percentile, "budget": budget}
+
+def disable_hedging(models: list = None) -> None:
+    for model in (models if models is not None else list(hedging_policy)):
+        hedging_policy.pop(model, None)
+
+def _stats(model: str) -> dict:
+    return hedging_stats.setdefault(model, {"calls": 0, "hedged_calls": 0, "hedge_wins": 0, "over_budget": 0})
+
+def hedge_delay(model: str) -> float:
+    '''This function gives how long a call to the model runs before it is hedged.
+
+    - Input: the API model name
+    - Output: the percentile of the recent latencies in seconds, None when the model is not hedged or has too few latencies
+    '''
+    policy = hedging_policy.get(model)
+    if policy is None:
+        return None
+    with _lock:
+        latencies = sorted(_latencies.get(model, ()))
+    if len(latencies) < MIN_SAMPLES:
+        return None
+    return latencies[min(len(latencies) - 1, int(policy["percentile"] * len(latencies)))]
+
+def _record_latency(model: str, latency: float) -> None:
+    with _lock:
+        _latencies.setdefault(model, collections.deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+def _take_budget(model: str) -> bool:
+    with _lock:
+        stats = _stats(model)
+        if stats["hedged_calls"] + 1 > hedging_policy[model]["budget"] * stats["calls"]:
+            stats["over_budget"] += 1
+            return False
+        stats["hedged_calls"] += 1
+        return True
+
+def _count_call(model: str) -> None:
+    with _lock:
+        _stats(model)["calls"] += 1
+
+def _count_win(model: str) -> None:
+    with _lock:
+        _stats(model)["hedge_wins"] += 1
+
+def _timed(send):
+    start = time.perf_counter()
+    result = send()
+    return (result, time.perf_counter() - start)
+
+def hedged_call(model: str, send):
+    '''This function calls send, and calls it a second time if the first call is slow for the model.
+
+    - Input: the API model name and a function sending the request once
+    - Output: the first result, or the error when both calls fail
+    '''
+    if model not in hedging_policy:
+        return send()
+    _count_call(model)
+    delay = hedge_delay(model)
+    # The copies run in other threads, with the context of the caller such that the usage is attributed to its strategy
+    start = time.perf_counter()
+    primary = _executor.submit(contextvars.copy_context().run, _timed, send)
+    futures = {primary}
+    try:
+        (done, _) = concurrent.futures.wait(futures, timeout=delay)
+        if not done and _take_budget(model):
+            futures.add(_executor.submit(contextvars.copy_context().run, _timed, send))
+        while futures:
+            (done, futures) = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    (result, latency) = future.result()
+                    if future is primary:
+                        _record_latency(model, latency)
+                    else:
+                        _count_win(model)
+                        if not primary.done():
+                            # The primary is still running, so its latency is at least the time it has run
+                            _record_latency(model, time.perf_counter() - start)
+                    return result
+                error = future.exception()
+        raise error
+    finally:
+        for future in futures:
+            future.cancel()
+
+async def hedged_call_async(model: str, send):
+    '''This function awaits send, and awaits it a second time if the first call is slow for the model.
+    The slower call is cancelled.
+
+    - Input: the API model name and a coroutine function sending the request once
+    - Output: the first result, or the error when both calls fail
+    '''
+    if model not in hedging_policy:
+        return await send()
+    _count_call(model)
+    delay = hedge_delay(model)
+
+    async def timed():
+        start = time.perf_counter()
+        result = await send()
+        return (result, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    primary = asyncio.ensure_future(timed())
+    tasks = {primary}
+    try:
+        (done, _) = await asyncio.wait(tasks, timeout=delay)
+        if not done and _take_budget(model):
+            tasks.add(asyncio.ensure_future(timed()))
+        while tasks:
+            (done, tasks) = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    (result, latency) = task.result()
+                    if task is primary:
+                        _record_latency(model, latency)
+                    else:
+                        _count_win(model)
+                        if not primary.done():
+                            # The primary is cancelled below, so its latency is at least the time it has run
+                            _record_latency(model, time.perf_counter() - start)
+                    return result
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def print_hedging_stats() -> None:
+    with _lock:
+        for (model, stats) in hedging_stats.items():
+            print(f"Hedging {model}:", stats)
+
+# A run can hedge models without code changes, e.g. HEDGING="gpt-4o"
+if os.environ.get("HEDGING"):
+    enable_hedging([model.strip() for model in os.environ["HEDGING"].split(",")])
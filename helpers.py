@@ -1,7 +1,25 @@
+import asyncio
 import openai
 import os
 from typing import Tuple
 import random
+import time
+from openai.types.chat import ChatCompletion
+import response_cache
+import rate_limiter
+import retries
+import hedging
+import streaming
+import verdict_only
+import verdict_probabilities
+import structured_verdicts
+from verdict_only import verdict_only_judge, TRUTH_LABELS
+from streaming import verdict_stream
+from usage_telemetry import record_usage, strategy_context, track_strategy
+from sentence_splitter import split_sentences
+from suspicion import order_by_suspicion
+from retrieval import bm25_filter, BM25_COVERAGE
+from lexical_support import lexically_supported, print_lexical_support_stats, LEXICAL_SUPPORT_JUDGEMENT
 
 # Utilities
 
@@ -15,53 +33,113 @@ client_openai = openai.OpenAI(
 )
 
 # Functions for LLM invocation  
+
+def chat_completion(client: openai.OpenAI, **params) -> ChatCompletion:
+    '''This function sends a chat completion request, answering it from the response cache when possible.
+    The cache is only consulted when it is switched on with response_cache.enable_response_cache.
+    Calls to a model with limits set in rate_limiter wait until its RPM and TPM buckets can take them,
+    transient errors are retried as set in retries and slow calls are duplicated when hedging is on for the model.
+    Judge calls inside streaming.verdict_stream() are streamed and stopped at the verdict when streaming is on for the model.
+    Judge calls inside verdict_only.verdict_only_judge() answer with the label only when verdict-only mode is on for the model.
+    Judge calls of models with verdict probabilities on request logprobs, and their P(hallucinated) is collected.
+
+    - Input: the client and the keyword arguments of chat.completions.create
+    - Output: the chat completion
+    '''
+    labels = verdict_only.labels_for(params)
+    if labels is not None:
+        params = verdict_only.constrain(params, labels)
+    judged_labels = verdict_probabilities.judge_labels(params)
+    if judged_labels is not None:
+        params = verdict_probabilities.request_logprobs(params)
+    streamed = streaming.streams(params)
+    cache_params = streaming.cache_params(params) if streamed else params
+    cache = response_cache.active_cache
+    if cache is not None:
+        cached = cache.get(cache_params)
+        if cached is not None:
+            response = ChatCompletion.model_validate_json(cached)
+            verdict_probabilities.record(response, judged_labels)
+            return verdict_only.canonical(response, labels, params["model"])
+
+    limiter = rate_limiter.get_rate_limiter(params["model"])
+
+    def send(options: dict) -> ChatCompletion:
+        reserved = limiter.reserve(rate_limiter.estimate_tokens(params)) if limiter is not None else 0
+        start = time.perf_counter()
+        try:
+            if streamed:
+                response = streaming.stream_completion(client.with_options(**options), params)
+            else:
+                response = client.with_options(**options).chat.completions.create(**params)
+        except Exception:
+            if limiter is not None:
+                limiter.reconcile(reserved, 0)
+            raise
+        record_usage(response, time.perf_counter() - start)
+        if limiter is not None:
+            limiter.reconcile(reserved, rate_limiter.used_tokens(response))
+        return response
+
+    # Every attempt is hedged when hedging is on for the model
+    response = retries.call_with_retries(params["model"], lambda options: hedging.hedged_call(params["model"], lambda: send(options)))
+
+    if cache is not None:
+        cache.put(cache_params, response.model_dump_json())
+    verdict_probabilities.record(response, judged_labels)
+    return verdict_only.canonical(response, labels, params["model"])
   
-def phi3_response(messages: list) -> str:
-    response = client_local.chat.completions.create(
+def phi3_response(messages: list, **options) -> str:
+    response = chat_completion(client_local,
         model="phi3:14b-instruct",
         temperature=0.0,
         n=1,
         messages=messages,
+        **options,
     )
 
     return response.choices[0].message.content
 
-def gpt4o_mini_response(messages: list) -> str:
-    response = client_openai.chat.completions.create(
+def gpt4o_mini_response(messages: list, **options) -> str:
+    response = chat_completion(client_openai,
         model="gpt-4o-mini",
         temperature=0.0,
         n=1,
         messages=messages,
+        **options,
     )
 
     return response.choices[0].message.content
 
-def gpt35_response(messages: list) -> str:
-    response = client_openai.chat.completions.create(
+def gpt35_response(messages: list, **options) -> str:
+    response = chat_completion(client_openai,
         model="gpt-3.5-turbo-0125",
         temperature=0.0,
         n=1,
         messages=messages,
+        **options,
     )
 
     return response.choices[0].message.content
 
-def gpt4_response(messages: list) -> str:
-    response = client_openai.chat.completions.create(
+def gpt4_response(messages: list, **options) -> str:
+    response = chat_completion(client_openai,
         model="gpt-4-turbo",
         temperature=0.0,
         n=1,
         messages=messages,
+        **options,
     )
 
     return response.choices[0].message.content
 
-def gpt4o_response(messages: list) -> str:
-    response = client_openai.chat.completions.create(
+def gpt4o_response(messages: list, **options) -> str:
+    response = chat_completion(client_openai,
         model="gpt-4o",
         temperature=0.0,
         n=1,
         messages=messages,
+        **options,
     )
 
     return response.choices[0].message.content
@@ -166,6 +244,72 @@ def create_document_sentences_extractor_messages(document: str, summary: str) ->
                         '''}
             ]
 
+# Summary decomposition shared by the decomposed strategies
+
+class SummaryDecomposition:
+    '''This class holds the sentences of a summary and the statements of each sentence.
+    The extractor calls are made lazily and only once, such that sentence_level, statement_level,
+    chain_tailored_thoughts_sentence, chain_tailored_thoughts and chain_debates can share one object per summary
+    while keeping their early exit.
+    With sentence_splitter="rule" the sentences are split locally by sentence_splitter.split_sentences instead of the LLM.
+
+    - Input: a summary, the LLM used for extraction and the sentence splitter ("llm" or "rule")
+    - Output: the decomposition object
+    '''
+
+    def __init__(self, summary: str, extractor_LLM: str = "gpt4o_mini", sentence_splitter: str = "llm"):
+        if sentence_splitter not in ("llm", "rule"):
+            raise ValueError(f"Unknown sentence splitter: {sentence_splitter}")
+        self.summary = summary
+        self.extractor_LLM = extractor_LLM
+        self.sentence_splitter = sentence_splitter
+        self._sentences = None
+        self._statements = {}
+        self._tasks = {}
+
+    def get_sentences(self) -> list:
+        if self._sentences is None and self.sentence_splitter == "rule":
+            self._sentences = split_sentences(self.summary)
+        if self._sentences is None:
+            response_function = response_dict[self.extractor_LLM]
+            with strategy_context("summary_decomposition"):
+                self._sentences = response_function(create_summary_sentence_extractor_messages(self.summary)).split('\n')
+        return self._sentences
+
+    def get_statements(self, sentence: str) -> list:
+        if sentence not in self._statements:
+            response_function = response_dict[self.extractor_LLM]
+            with strategy_context("summary_decomposition"):
+                self._statements[sentence] = response_function(create_sentence_statement_extractor_messages(self.summary, sentence)).split('\n')
+        return self._statements[sentence]
+
+    async def _extract_async(self, task_key: tuple, messages: list) -> list:
+        # Concurrent strategies on the same summary await the same extraction instead of repeating it
+        from async_helpers import async_response_dict
+        from batch_mode import shared
+        if task_key not in self._tasks:
+            # The task copies the context, so its calls are attributed to the decomposition rather than the first strategy
+            with strategy_context("summary_decomposition"):
+                self._tasks[task_key] = asyncio.ensure_future(async_response_dict[self.extractor_LLM](messages))
+        try:
+            # In batch mode the wait counts for every strategy awaiting the extraction, not only for the one that started it
+            return (await shared(asyncio.shield(self._tasks[task_key]))).split('\n')
+        except Exception:
+            self._tasks.pop(task_key, None)
+            raise
+
+    async def get_sentences_async(self) -> list:
+        if self._sentences is None and self.sentence_splitter == "rule":
+            self._sentences = split_sentences(self.summary)
+        if self._sentences is None:
+            self._sentences = await self._extract_async(("sentences",), create_summary_sentence_extractor_messages(self.summary))
+        return self._sentences
+
+    async def get_statements_async(self, sentence: str) -> list:
+        if sentence not in self._statements:
+            self._statements[sentence] = await self._extract_async(("statements", sentence), create_sentence_statement_extractor_messages(self.summary, sentence))
+        return self._statements[sentence]
+
 # Functions for counterfactual debate
 
 def create_hallucination_abduction_messages(knowledge: str, statement: str) -> list:
@@ -450,6 +594,47 @@ def create_extended_judge_messages(document: str, summary: str, debates: str) ->
                     '''}
             ]   
 
+def create_reasoning_judge_messages(document: str, summary: str, reasoning: str) -> list:
+    '''This function initiates the messages for invoking an LLM response that judges a summary after reviewing stored reasoning about it.
+    The conversation list are messages including the system prompt, the document, the summary and the reasoning.
+
+    - Input: a document, a summary and the reasoning
+    - Output: the conversation list
+    '''
+    return [
+                {"role": "system", "content":
+                    '''You are an expert judge.
+
+                    It is your task to review the reasoning of an analyst.
+                    The reasoning is about whether or not a summary of a source text contains hallucinations.
+
+                    There are three types of hallucinations;
+                        Factual hallucinations refer to content that might be verifiable by world knowledge but is not inferable from the source text.
+                        Non-factual hallucinations are entities that are neither inferable from the source text nor factual.
+                        Intrinsic hallucinations are statements that contradict the source text.
+                    If the entity can be directly entailed using the information from the source text, then it is non-hallucinated.
+
+                    Base yourself on the source text and the reasoning.
+                    The reasoning might contain errors.
+
+                    After reviewing the reasoning, do you think the summary contains hallucinations or not?
+                    If it contains hallucinated contents, respond with [HALLUCINATED].
+                    If the summary is supported by the document, respond with [SUPPORTED].
+
+                    Do not give an explanation.
+                    '''},
+                {"role": "user", "content":
+                    f'''Document: {document}
+
+                        Summary: {summary}
+
+                        Reasoning: {reasoning}
+
+                        Judgement about the summary:
+                    '''}
+            ]
+
+@track_strategy
 def counterfactual_debate(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
 
     response_function = response_dict[debating_LLM]
@@ -474,7 +659,8 @@ def counterfactual_debate(debating_LLM: str, document: str, summary: str) -> Tup
     # Append the debates
     debates = "\n" + debate_hallucinated + "\n" + debate_supported
     
-    final_judgement = gpt4o_response(create_judge_messages(summary, debates))
+    with verdict_only_judge():
+        final_judgement = gpt4o_response(create_judge_messages(summary, debates))
     print("The final judgement after counterfactual debating:\n" + final_judgement)
 
     if "[HALLUCINATED]" in final_judgement:
@@ -482,6 +668,7 @@ def counterfactual_debate(debating_LLM: str, document: str, summary: str) -> Tup
     
     return (0, debate_hallucinated, debate_supported)
   
+@track_strategy
 def counterfactual_debate_extended(document: str, summary: str, debate: str) -> int:
         
     final_judgement = gpt4o_response(create_extended_judge_messages(document, summary, debate))
@@ -492,6 +679,7 @@ def counterfactual_debate_extended(document: str, summary: str, debate: str) ->
     
     return 0
   
+@track_strategy
 def counterfactual_debate_modified(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
 
     response_function = response_dict[debating_LLM]
@@ -511,7 +699,8 @@ def counterfactual_debate_modified(debating_LLM: str, document: str, summary: st
     print(debates)
     print("-" * 100)
 
-    final_judgement = gpt4o_response(create_extended_judge_messages(document, summary, debates))
+    with verdict_only_judge():
+        final_judgement = gpt4o_response(create_extended_judge_messages(document, summary, debates))
     print("The final judgement after counterfactual debating:\n" + final_judgement)
 
     if "[HALLUCINATED]" in final_judgement:
@@ -596,6 +785,7 @@ def create_collaboration_feedback_messages(knowledge: str, statement: str, reaso
                     '''}
             ]  
   
+@track_strategy
 def collaborative_debate(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
 
     response_function = response_dict[debating_LLM]
@@ -615,7 +805,8 @@ def collaborative_debate(debating_LLM: str, document: str, summary: str) -> Tupl
     print(debates)
     print("-" * 100)
 
-    final_judgement = gpt4o_response(create_extended_judge_messages(document, summary, debates))
+    with verdict_only_judge():
+        final_judgement = gpt4o_response(create_extended_judge_messages(document, summary, debates))
     print("The final judgement after counterfactual debating:\n" + final_judgement)
 
     if "[HALLUCINATED]" in final_judgement:
@@ -736,11 +927,15 @@ def create_chain_debates_judge_messages(document: str, summary: str, debate: str
                     '''}
             ] 
 
-def chain_debates(debating_LLM: str, document: str, summary: str) -> Tuple[int, str, str]:
+@track_strategy
+def chain_debates(debating_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None) -> Tuple[int, str, str]:
 
-    sentences = gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split("\n")
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = decomposition.get_sentences()
 
     debate_history = ""
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported without a debate
+    debate = ""
     
     for statement in sentences:
     
@@ -851,14 +1046,8 @@ def create_chain_thought_hallucination_judge(document: str, summary: str) -> lis
                     '''}
             ]     
   
-def baseline(document: str, summary: str) -> int:
-    baseline_judgement = gpt4o_mini_response(create_zeroshot_hallucination_judge(document, summary))
-    print("The baseline zeroshot judgement:\n" + baseline_judgement)
-    if "[HALLUCINATED]" in baseline_judgement:
-        return 1
-    return 0  
-
-def baseline(document: str, summary: str, filtering_LLM: str) -> int:
+@track_strategy
+def baseline(document: str, summary: str, filtering_LLM: str = "gpt4o_mini") -> int:
     
     response_function = response_dict[filtering_LLM]
 
@@ -868,8 +1057,10 @@ def baseline(document: str, summary: str, filtering_LLM: str) -> int:
         return 1
     return 0  
 
+@track_strategy
 def chain_thoughts(document: str, summary: str) -> Tuple[int, str]:
-    thought_judgement = gpt4o_mini_response(create_chain_thought_hallucination_judge(document, summary))
+    with verdict_stream():
+        thought_judgement = gpt4o_mini_response(create_chain_thought_hallucination_judge(document, summary))
     print("The chain of thought judgement:\n" + thought_judgement)
     if "[HALLUCINATED]" in thought_judgement:
         return (1, thought_judgement)
@@ -916,13 +1107,19 @@ def create_knowledge_filtered_hallucination_judge(document: str, summary: str) -
                     '''}
             ] 
 
-def knowledge_filtering(filtering_LLM: str, document: str, summary: str) -> Tuple[int, str]:
+@track_strategy
+def knowledge_filtering(filtering_LLM: str, document: str, summary: str, top_k: int = None, coverage: float = BM25_COVERAGE) -> Tuple[int, str]:
     
-    response_function = response_dict[filtering_LLM]
-    filtered_document = response_function(create_document_sentences_extractor_messages(document, summary))
+    # "bm25" retrieves the knowledge locally, top_k and coverage only apply to it
+    if filtering_LLM == "bm25":
+        filtered_document = bm25_filter(document, summary, top_k, coverage)
+    else:
+        response_function = response_dict[filtering_LLM]
+        filtered_document = response_function(create_document_sentences_extractor_messages(document, summary))
     print(f"The filtered document using {filtering_LLM}:\n" + filtered_document)
     
-    baseline_judgement = gpt4o_response(create_knowledge_filtered_hallucination_judge(filtered_document, summary))
+    with verdict_only_judge(TRUTH_LABELS):
+        baseline_judgement = gpt4o_response(create_knowledge_filtered_hallucination_judge(filtered_document, summary))
     print(f"The judgement with filtered knowledge using {filtering_LLM}:\n" + baseline_judgement)
     
     if "[TRUE]" in baseline_judgement:
@@ -938,6 +1135,8 @@ def create_sentence_level_hallucination_judge(document: str, summary: str, sente
     - Input: a document and a summary 
     - Output: the conversation list 
     '''
+    if prompt_layout == "prefix_cache":
+        return create_prefix_cached_sentence_level_hallucination_judge(document, summary, sentence)
     return [
                 {"role": "system", "content": 
                     '''You are an expert in classifying sentences. 
@@ -973,16 +1172,21 @@ def create_sentence_level_hallucination_judge(document: str, summary: str, sente
                     '''}
             ] 
     
-def sentence_level(judging_LLM: str, document: str, summary: str) -> int:
+@track_strategy
+def sentence_level(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False) -> int:
     response_function = response_dict[judging_LLM]
-    sentences = gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split('\n')
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = decomposition.get_sentences()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
     
     for highlighted_sentence in sentences:
         print("-" * 25)
         #print(f"The highlighted sentence using {judging_LLM}:\n" + highlighted_sentence)
         print(f"The highlighted sentence:\n" + highlighted_sentence)
 
-        partial_judgement = response_function(create_sentence_level_hallucination_judge(document, summary, highlighted_sentence))
+        with verdict_stream():
+            partial_judgement = response_function(create_sentence_level_hallucination_judge(document, summary, highlighted_sentence))
         print(f"The partial judgement with sentence level detection using {judging_LLM}:\n" + partial_judgement)
         
         if "[HALLUCINATED]" in partial_judgement:
@@ -998,6 +1202,8 @@ def create_statement_level_hallucination_judge(document: str, summary: str, high
     - Input: a document and a summary 
     - Output: the conversation list 
     '''
+    if prompt_layout == "prefix_cache":
+        return create_prefix_cached_statement_level_hallucination_judge(document, summary, highlighted_sentence, isolated_statement)
     return [
                 {"role": "system", "content": 
                     '''You are an expert in classifying statements in either hallucinated and supported.
@@ -1034,23 +1240,36 @@ def create_statement_level_hallucination_judge(document: str, summary: str, high
                     '''}
             ] 
 
-def statement_level(judging_LLM: str, document: str, summary: str) -> int:
+@track_strategy
+def statement_level(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False, lexical_threshold: float = None, batch_statements: str = None) -> int:
     
     response_function = response_dict[judging_LLM]
-    sentences = gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split('\n')
+    decomposition = decomposition or SummaryDecomposition(summary)
+    if batch_statements is not None:
+        return batched_statement_judgements(judging_LLM, document, summary, decomposition, suspicion_order, lexical_threshold, batch_statements, reasoning=False)[0]
+    sentences = decomposition.get_sentences()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
     
     for highlighted_sentence in sentences:
         print("-" * 25)
         print(f"The highlighted sentence:\n" + highlighted_sentence)
         
-        statements = gpt4o_mini_response(create_sentence_statement_extractor_messages(summary, highlighted_sentence)).split('\n')
+        statements = decomposition.get_statements(highlighted_sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
         
         for highlighted_statement in statements: 
             print("-" * 25)
             #print(f"The highlighted sentence using {judging_LLM}:\n" + highlighted_sentence)
             print(f"The highlighted statement:\n" + highlighted_statement)
 
-            partial_judgement = response_function(create_statement_level_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
+            if lexical_threshold is not None and lexically_supported(document, highlighted_statement, lexical_threshold):
+                print("The statement is contained in a sentence of the document, the judge is skipped")
+                continue
+
+            with verdict_stream():
+                partial_judgement = response_function(create_statement_level_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
             print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
             
             if "HALLUCINATED" in partial_judgement:
@@ -1066,6 +1285,8 @@ def create_chain_tailored_thoughts_hallucination_judge(document: str, summary: s
     - Input: a document and a summary 
     - Output: the conversation list 
     '''
+    if prompt_layout == "prefix_cache":
+        return create_prefix_cached_chain_tailored_thoughts_hallucination_judge(document, summary, highlighted_sentence, isolated_statement)
     return [
                 {"role": "system", "content": 
                     '''You are an expert in classifying statements in either hallucinated and supported.
@@ -1103,23 +1324,39 @@ def create_chain_tailored_thoughts_hallucination_judge(document: str, summary: s
                     '''}
             ] 
 
-def chain_tailored_thoughts(judging_LLM: str, document: str, summary: str) -> Tuple[int, str]:
+@track_strategy
+def chain_tailored_thoughts(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False, lexical_threshold: float = None, batch_statements: str = None) -> Tuple[int, str]:
     
     response_function = response_dict[judging_LLM]
-    sentences = gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split('\n')
+    decomposition = decomposition or SummaryDecomposition(summary)
+    if batch_statements is not None:
+        return batched_statement_judgements(judging_LLM, document, summary, decomposition, suspicion_order, lexical_threshold, batch_statements, reasoning=True)
+    sentences = decomposition.get_sentences()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported
+    partial_judgement = "[SUPPORTED]"
     
     for highlighted_sentence in sentences:
         print("-" * 25)
         print(f"The highlighted sentence:\n" + highlighted_sentence)
         
-        statements = gpt4o_mini_response(create_sentence_statement_extractor_messages(summary, highlighted_sentence)).split('\n')
+        statements = decomposition.get_statements(highlighted_sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
         
         for highlighted_statement in statements: 
             print("-" * 25)
             #print(f"The highlighted sentence using {judging_LLM}:\n" + highlighted_sentence)
             print(f"The highlighted statement:\n" + highlighted_statement)
 
-            partial_judgement = response_function(create_chain_tailored_thoughts_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
+            if lexical_threshold is not None and lexically_supported(document, highlighted_statement, lexical_threshold):
+                print("The statement is contained in a sentence of the document, the judge is skipped")
+                partial_judgement = LEXICAL_SUPPORT_JUDGEMENT
+                continue
+
+            with verdict_stream():
+                partial_judgement = response_function(create_chain_tailored_thoughts_hallucination_judge(document, summary, highlighted_sentence, highlighted_statement))
             print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
             
             if "HALLUCINATED" in partial_judgement:
@@ -1133,6 +1370,8 @@ def create_chain_tailored_thoughts_sentence_hallucination_judge(document: str, s
     - Input: a document and a summary 
     - Output: the conversation list 
     '''
+    if prompt_layout == "prefix_cache":
+        return create_prefix_cached_chain_tailored_thoughts_sentence_hallucination_judge(document, summary, highlighted_sentence)
     return [
                 {"role": "system", "content": 
                     '''You are an expert in classifying sentences in either hallucinated and supported.
@@ -1168,22 +1407,234 @@ def create_chain_tailored_thoughts_sentence_hallucination_judge(document: str, s
                     '''}
             ] 
     
-def chain_tailored_thoughts_sentence(judging_LLM: str, document: str, summary: str) -> Tuple[int, str]:
+@track_strategy
+def chain_tailored_thoughts_sentence(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition = None, suspicion_order: bool = False) -> Tuple[int, str]:
     
     response_function = response_dict[judging_LLM]
-    sentences = gpt4o_mini_response(create_summary_sentence_extractor_messages(summary)).split('\n')
+    decomposition = decomposition or SummaryDecomposition(summary)
+    sentences = decomposition.get_sentences()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    # A summary without sentences, e.g. an empty one with the rule-based splitter, is supported
+    partial_judgement = "[SUPPORTED]"
     
     for highlighted_sentence in sentences:
         print("-" * 25)
         print(f"The highlighted sentence:\n" + highlighted_sentence)
         
-        partial_judgement = response_function(create_chain_tailored_thoughts_sentence_hallucination_judge(document, summary, highlighted_sentence))
+        with verdict_stream():
+            partial_judgement = response_function(create_chain_tailored_thoughts_sentence_hallucination_judge(document, summary, highlighted_sentence))
         print(f"The partial judgement with statement level detection using {judging_LLM}:\n" + partial_judgement)
         
         if "HALLUCINATED" in partial_judgement:
             return (1, partial_judgement)
     return (0, partial_judgement)
 
+# Functions for batched statement judges
+
+def create_batched_statements_judge_messages(document: str, summary: str, pairs: list, reasoning: bool = False) -> list:
+    '''This function initiates the messages for invoking the LLM response when judging several isolated statements at once.
+    The conversation list are messages including the system prompt, the document, the summary and the numbered statements.
+    The verdicts are asked as a JSON object, such that the labels are written without brackets.
+
+    - Input: a document, a summary, the (highlighted sentence, isolated statement) pairs and whether to reason before every verdict
+    - Output: the conversation list
+    '''
+    statements = "\n".join(f'''{number}. Highlighted sentence: "{sentence}"
+                           Isolated statement: "{statement}"''' for (number, (sentence, statement)) in enumerate(pairs, 1))
+    answer = ('''Write "statement", then "reasoning" with your step-by-step thoughts about the statement, then "verdict".''' if reasoning
+              else '''Write "statement", then "verdict". Do not give an explanation.''')
+    return [
+                {"role": "system", "content":
+                    f'''You are an expert in classifying statements in either hallucinated and supported.
+
+                    You are given a document.
+                    You are also given a summary of the document and numbered isolated statements, each with the highlighted sentence of the summary it is taken from.
+                    It is your task to judge whether each isolated statement is hallucinated or supported, based on the document.
+                    Judge every statement on its own.
+
+                    There are three types of hallucinations;
+                        Factual hallucinations refer to content that might be verifiable by world knowledge but is not inferable from the document.
+                        Non-factual hallucinations are entities that are neither inferable from the document nor factual.
+                        Intrinsic hallucinations are statements that contradict the document.
+
+                    On the other hand, if an isolated statement can be inferred from the document in its entirety, then it is supported.
+                    Or if an isolated statement is directly entailed by the document, then it is supported.
+
+                    Given the document, does each isolated statement contain hallucinations or is it supported?
+
+                    Respond with a JSON object with a "verdicts" array holding one object per statement, in the order of the statements.
+                    Every object has the number of the statement in "statement" and HALLUCINATED or SUPPORTED in "verdict".
+                    {answer}
+                    '''},
+                {"role": "user", "content":
+                    f'''[Beginning of document]
+                        {document}
+                        [End of document]
+
+                        Summary: {summary}
+
+                        Statements:
+                        {statements}
+
+                        Judgements of the statements in JSON:
+                    '''}
+            ]
+
+def _statement_groups(document: str, decomposition: SummaryDecomposition, suspicion_order: bool, batch_statements: str):
+    # The statements in the order of the per-statement loop, one group per sentence or one group for the summary
+    sentences = decomposition.get_sentences()
+    if suspicion_order:
+        sentences = order_by_suspicion(document, sentences)
+    group = []
+    for highlighted_sentence in sentences:
+        statements = decomposition.get_statements(highlighted_sentence)
+        if suspicion_order:
+            statements = order_by_suspicion(document, statements)
+        group += [(highlighted_sentence, statement) for statement in statements]
+        if batch_statements == "sentence":
+            yield group
+            group = []
+    if batch_statements == "summary":
+        yield group
+
+def batched_statement_judgements(judging_LLM: str, document: str, summary: str, decomposition: SummaryDecomposition, suspicion_order: bool, lexical_threshold: float, batch_statements: str, reasoning: bool) -> Tuple[int, str]:
+    '''This function judges the statements of a summary in batches with one JSON answer per batch.
+    A batch holds the statements of one sentence or of the whole summary, as set by batch_statements, and the batches
+    of a summary stop at the first hallucinated statement. Malformed answers are split as set in structured_verdicts.
+
+    - Input: the judging LLM, a document, a summary, its decomposition, the options of the per-statement loop,
+      "sentence" or "summary" and whether to reason before every verdict
+    - Output: the prediction and the judgement of the first hallucinated statement, or of the last statement
+    '''
+    if batch_statements not in structured_verdicts.BATCH_SCOPES:
+        raise ValueError(f"Unknown batch scope: {batch_statements}")
+    response_function = response_dict[judging_LLM]
+    response_format = structured_verdicts.verdicts_response_format(judging_LLM, reasoning)
+    create_single_judge = create_chain_tailored_thoughts_hallucination_judge if reasoning else create_statement_level_hallucination_judge
+
+    def judge_batch(pairs: list) -> str:
+        return response_function(create_batched_statements_judge_messages(document, summary, pairs, reasoning), response_format=response_format)
+
+    def judge_single(pair: Tuple[str, str]) -> str:
+        with verdict_stream():
+            return response_function(create_single_judge(document, summary, *pair))
+
+    judgement = "[SUPPORTED]"
+    for group in _statement_groups(document, decomposition, suspicion_order, batch_statements):
+        if not group:
+            continue
+        pairs = [(sentence, statement) for (sentence, statement) in group
+                 if lexical_threshold is None or not lexically_supported(document, statement, lexical_threshold)]
+        print("-" * 25)
+        print(f"Judging {len(pairs)} of {len(group)} statements in one batch using {judging_LLM}, {len(group) - len(pairs)} are contained in the document")
+        judgements = structured_verdicts.judge_in_batches(pairs, judge_batch, judge_single, reasoning) if pairs else []
+        for ((sentence, statement), partial_judgement) in zip(pairs, judgements):
+            print(f"The highlighted statement:\n" + statement)
+            print(f"The partial judgement with batched statement level detection using {judging_LLM}:\n" + partial_judgement)
+            if "HALLUCINATED" in partial_judgement:
+                return (1, partial_judgement)
+        # As in the loop, a summary without hallucinations keeps the judgement of its last statement
+        judgement = judgements[-1] if pairs[-1:] == group[-1:] else LEXICAL_SUPPORT_JUDGEMENT
+    return (0, judgement)
+
+# Prefix cache friendly prompt layout
+
+# The judges of the decomposed strategies make one call per sentence or statement with the same document and summary.
+# In the prefix cache layout every judge shares one static system prompt, and the user message starts with the document
+# and the summary, such that OpenAI's prompt caching and Ollama's KV reuse serve everything up to the per-call task.
+# The layout is switched on with set_prompt_layout("prefix_cache") or PROMPT_LAYOUT=prefix_cache.
+
+prompt_layout = os.environ.get("PROMPT_LAYOUT", "default")
+
+def set_prompt_layout(layout: str) -> None:
+    '''This function selects the layout of the sentence and statement level judge prompts.
+
+    - Input: "default" for the original prompts or "prefix_cache" for the prefix cache friendly prompts
+    - Output: None
+    '''
+    global prompt_layout
+    if layout not in ("default", "prefix_cache"):
+        raise ValueError(f"Unknown prompt layout: {layout}")
+    prompt_layout = layout
+
+PREFIX_CACHED_JUDGE_INSTRUCTIONS = '''You are an expert in classifying parts of summaries in either hallucinated and supported.
+                    
+                    You are given a document and a summary of the document, followed by a task about one part of the summary.
+                    The part is either a highlighted sentence from the summary or an isolated statement from a highlighted sentence.
+                    It is your task to judge whether that part is hallucinated or supported, based on the document.
+                    Only classify the part named in the task, not the rest of the summary.
+                        
+                    There are three types of hallucinations; 
+                        Factual hallucinations refer to content that might be verifiable by world knowledge but is not inferable from the document. 
+                        Non-factual hallucinations are entities that are neither inferable from the document nor factual. 
+                        Intrinsic hallucinations are statements that contradict the document.
+                    
+                    On the other hand, if the part can be inferred from the document in its entirety, then it is supported.
+                    Or if the part is directly entailed by the document, then it is supported.
+                    
+                    Respond with [HALLUCINATED] or with [SUPPORTED], as described in the task.
+                    '''
+
+def create_prefix_cached_judge_messages(document: str, summary: str, task: str) -> list:
+    '''This function initiates the messages of a judge in the prefix cache layout.
+    The system prompt, the document and the summary come first and are identical for every judge call on the same summary.
+
+    - Input: a document, a summary and the task with the highlighted part of the summary
+    - Output: the conversation list 
+    '''
+    return [
+                {"role": "system", "content": PREFIX_CACHED_JUDGE_INSTRUCTIONS},
+                {"role": "user", "content": 
+                    f'''[Beginning of document]
+                        {document}
+                        [End of document]
+                        
+                        Summary: {summary}
+                        
+                        {task}'''}
+            ]
+
+def create_prefix_cached_sentence_level_hallucination_judge(document: str, summary: str, sentence: str) -> list:
+    return create_prefix_cached_judge_messages(document, summary,
+                    f'''Task: does the highlighted sentence contain hallucinated content or is it supported? Do not give an explanation.
+                       
+                        Highlighted sentence: [{sentence}]
+                       
+                        Judgement:
+                    ''')
+
+def create_prefix_cached_statement_level_hallucination_judge(document: str, summary: str, highlighted_sentence: str, isolated_statement: str) -> list:
+    return create_prefix_cached_judge_messages(document, summary,
+                    f'''Task: does the isolated statement contain hallucinations or is it supported? Do not give an explanation.
+                        
+                        Highlighted sentence: "{highlighted_sentence}"
+                        
+                        Isolated statement: "{isolated_statement}"
+                       
+                        Judgement of the statement:
+                    ''')
+
+def create_prefix_cached_chain_tailored_thoughts_hallucination_judge(document: str, summary: str, highlighted_sentence: str, isolated_statement: str) -> list:
+    return create_prefix_cached_judge_messages(document, summary,
+                    f'''Task: does the isolated statement contain hallucinations or is it supported? First, let's think step-by-step.
+                        
+                        Highlighted sentence: {highlighted_sentence}
+                        
+                        Isolated statement: "{isolated_statement}"
+                       
+                        Reasoning:
+                    ''')
+
+def create_prefix_cached_chain_tailored_thoughts_sentence_hallucination_judge(document: str, summary: str, highlighted_sentence: str) -> list:
+    return create_prefix_cached_judge_messages(document, summary,
+                    f'''Task: does the highlighted sentence contain hallucinations or is it supported? First, let's think step-by-step.
+                        
+                        Highlighted sentence: "{highlighted_sentence}"
+                                               
+                        Reasoning:
+                    ''')
+
 # Extracting SummEval summaries
 
 def find_random_summary_with_consistency_5(row):
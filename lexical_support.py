@@ -0,0 +1,92 @@
+import functools
+from typing import Tuple
+from sentence_splitter import split_sentences
+from suspicion import DocumentIndex, content_words, numbers, entities
+
+# Lexical support pre-check for statements
+#
+# Many extracted statements are near-verbatim copies of a document sentence. Such a statement is marked
+# SUPPORTED without a judge call when one document sentence contains
+#   - all of its numbers and entities,
+#   - the same negation (a "not" in either of them must be in both),
+#   - at least the threshold share of its content words.
+# The check is purely lexical, so swapped roles ("A beat B" for "B beat A") pass it; the accuracy cost
+# on the labelled datasets is measured in Lexical_Support_Benchmark.py.
+
+# Default minimal share of the content words of a statement found in one document sentence
+LEXICAL_SUPPORT_THRESHOLD = 1.0
+
+# Statements with fewer content words are always judged, as they match almost any sentence
+MIN_CONTENT_WORDS = 3
+
+NEGATIONS = {"not", "no", "never", "nor", "none", "neither", "nobody", "nothing", "nowhere", "without", "n't"}
+
+# The judgement recorded for statements that skip the judge
+LEXICAL_SUPPORT_JUDGEMENT = "[SUPPORTED] The isolated statement is contained in a sentence of the document."
+
+# Counters of the pre-check, every supported statement saves one judge call
+lexical_support_stats = {"checked": 0,
+                         "supported": 0}
+
+def is_negated(text: str) -> bool:
+    words = [word.strip(".,;:!?\"'()") for word in text.lower().replace("’", "'").split()]
+    return any(word in NEGATIONS or word.endswith("n't") for word in words)
+
+class DocumentSentenceIndex:
+    '''The sentences of a document with their vocabulary, numbers and negation, computed once per document.
+
+    - Input: a document
+    - Output: the index object
+    '''
+
+    def __init__(self, document: str):
+        self.sentences = []
+        for sentence in split_sentences(document):
+            self.sentences.append((sentence, DocumentIndex(sentence), is_negated(sentence)))
+
+    def support(self, statement: str) -> Tuple[float, str]:
+        '''This function finds the document sentence that covers most of the content words of a statement.
+        Sentences that miss a number or an entity of the statement, or differ in negation, do not count.
+
+        - Input: a statement
+        - Output: the share of content words covered and the covering sentence (0.0 and None without any)
+        '''
+        words = set(content_words(statement))
+        if len(words) < MIN_CONTENT_WORDS:
+            return (0.0, None)
+        statement_numbers = numbers(statement)
+        statement_entities = entities(statement)
+        statement_negated = is_negated(statement)
+
+        (best_coverage, best_sentence) = (0.0, None)
+        for (sentence, sentence_index, sentence_negated) in self.sentences:
+            if sentence_negated != statement_negated:
+                continue
+            if not statement_numbers <= sentence_index.numbers or not statement_entities <= sentence_index.words:
+                continue
+            coverage = len(words & sentence_index.words) / len(words)
+            if coverage > best_coverage:
+                (best_coverage, best_sentence) = (coverage, sentence)
+        return (best_coverage, best_sentence)
+
+@functools.lru_cache(maxsize=64)
+def document_sentence_index(document: str) -> DocumentSentenceIndex:
+    # The strategies of one row share the document, so the index is built once per document
+    return DocumentSentenceIndex(document)
+
+def lexically_supported(document: str, statement: str, threshold: float = LEXICAL_SUPPORT_THRESHOLD) -> bool:
+    '''This function decides whether a statement is supported by a single document sentence without a judge call.
+
+    - Input: a document, a statement and the minimal share of content words that must be covered
+    - Output: True if the judge can be skipped
+    '''
+    (coverage, _) = document_sentence_index(document).support(statement)
+    supported = coverage >= threshold and coverage > 0.0
+    lexical_support_stats["checked"] += 1
+    lexical_support_stats["supported"] += supported
+    return supported
+
+def print_lexical_support_stats() -> None:
+    checked = lexical_support_stats["checked"]
+    supported = lexical_support_stats["supported"]
+    print(f"Lexical support: {supported} of {checked} statements skipped the judge ({supported / checked if checked else 0.0:.1%})")
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from usage_telemetry import usage_totals
+
+# Live metrics during a run
+#
+# Every judgement updates the confusion counters of its strategy and model in constant time, and after every row a
+# status line shows the running F1, TPR and TNR of each strategy and model, the API calls and tokens per second and
+# the estimated time left. The same snapshot can be written to a JSON file and served as JSON over HTTP on localhost,
+# e.g. to watch a run from another terminal with curl, and abort a configuration that goes wrong early.
+#
+# LIVE_METRICS_FILE=live_metrics.json and LIVE_METRICS_PORT=8765 turn both on without code changes.
+
+class LiveMetrics:
+    '''This class keeps running confusion counters per strategy and model and publishes them while a run progresses.
+
+    - Input: the number of rows of the run, the JSON file and the local HTTP port to publish to (None for neither,
+      defaulting to LIVE_METRICS_FILE and LIVE_METRICS_PORT), the minimum seconds between two status lines
+      and the name of a unit of progress
+    - Output: the live metrics, to be closed with close()
+    '''
+
+    def __init__(self, total: int, path: str = None, port: int = None, interval: float = 0.0, unit: str = "Row"):
+        self.total = total
+        self.path = path or os.environ.get("LIVE_METRICS_FILE")
+        self.interval = interval
+        self.unit = unit
+        # (dataset, strategy, model) -> [TN, FP, FN, TP, failed]
+        self.counters = {}
+        self.done = 0
+        self.restored = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._published = float("-inf")
+        self._usage_start = usage_totals()
+
+        self._server = None
+        port = port or (int(os.environ["LIVE_METRICS_PORT"]) if os.environ.get("LIVE_METRICS_PORT") else None)
+        if port is not None:
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+            threading.Thread(target=self._server.serve_forever, name="live-metrics", daemon=True).start()
+            print(f"Live metrics on http://127.0.0.1:{port}")
+
+    def update(self, strategy: str, model: str, label: int, prediction: int, dataset: str = None) -> None:
+        '''This function counts a judgement, None as prediction for a failed one.
+        The dataset only needs to be given when a run judges several.'''
+        with self._lock:
+            counters = self.counters.setdefault((dataset, strategy, model), [0, 0, 0, 0, 0])
+            if prediction is None:
+                counters[4] += 1
+            else:
+                counters[2 * int(label) + int(prediction)] += 1
+
+    def advance(self, done: int = 1, restored: bool = False) -> None:
+        '''This function counts finished rows and publishes the metrics, at most once per interval.
+
+        - Input: the number of finished rows and whether they were restored instead of run, which the ETA leaves out
+        - Output: None
+        '''
+        with self._lock:
+            self.done += done
+            self.restored += done if restored else 0
+        now = time.monotonic()
+        if now - self._published >= self.interval or self.done >= self.total:
+            self._published = now
+            self.publish()
+
+    def snapshot(self) -> dict:
+        '''This function returns the current metrics as a JSON serializable dict.'''
+        usage = usage_totals()
+        with self._lock:
+            elapsed = time.monotonic() - self._start
+            run = self.done - self.restored
+            rate = run / elapsed if elapsed > 0 else 0.0
+            cells = []
+            for ((dataset, strategy, model), (tn, fp, fn, tp, failed)) in self.counters.items():
+                cells.append({"dataset": dataset,
+                              "strategy": strategy,
+                              "model": model,
+                              "tp": tp, "fp": fp, "tn": tn, "fn": fn, "failed": failed,
+                              "tpr": tp / (tp + fn) if tp + fn else None,
+                              "tnr": tn / (tn + fp) if tn + fp else None,
+                              "f1": 2 * tp / (2 * tp + fp + fn) if tp + fp + fn else None})
+            return {"done": self.done,
+                    "total": self.total,
+                    "restored": self.restored,
+                    "elapsed_seconds": elapsed,
+                    "calls_per_second": (usage["calls"] - self._usage_start["calls"]) / elapsed if elapsed > 0 else 0.0,
+                    "tokens_per_second": (usage["tokens"] - self._usage_start["tokens"]) / elapsed if elapsed > 0 else 0.0,
+                    "eta_seconds": (self.total - self.done) / rate if rate > 0 else None,
+                    "cells": cells}
+
+    def status_line(self, snapshot: dict = None) -> str:
+        snapshot = snapshot or self.snapshot()
+        eta = snapshot["eta_seconds"]
+        parts = [f"{self.unit} {snapshot['done']}/{snapshot['total']}",
+                 f"{snapshot['calls_per_second']:.1f} calls/s",
+                 f"{snapshot['tokens_per_second']:.0f} tokens/s",
+                 f"ETA {int(eta // 60)}m{int(eta % 60):02d}s" if eta is not None else "ETA -"]
+        for cell in snapshot["cells"]:
+            metrics = " ".join(f"{name.upper()} {cell[name]:.2f}" if cell[name] is not None else f"{name.upper()} -"
+                               for name in ("f1", "tpr", "tnr"))
+            failed = f" ({cell['failed']} failed)" if cell["failed"] else ""
+            dataset = f"{cell['dataset']} " if cell["dataset"] is not None else ""
+            parts.append(f"{dataset}{cell['strategy']} {cell['model']} {metrics}{failed}")
+        return "[live] " + " | ".join(parts)
+
+    def publish(self) -> None:
+        '''This function prints the status line and writes the JSON file.'''
+        snapshot = self.snapshot()
+        print(self.status_line(snapshot))
+        if self.path is not None:
+            # Replace the file in one step, such that a reader never sees a partial snapshot
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file, indent=1)
+            os.replace(temporary, self.path)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _handler(self):
+        live_metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(live_metrics.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,242 @@
+import math
+import warnings
+import numpy as np
+import pandas as pd
+
+# Vectorized metrics on long result records
+#
+# The metrics are computed from records with one line per judged summary: Dataset, Row, True Label, Strategy, Model and
+# Prediction, as written by the experiment runner or the results store. The labels come with every record, so nothing
+# depends on the right and hallucinated summaries alternating in a list.
+#
+# confusion_matrices counts the confusion matrices of all strategies and models with one bincount. bootstrap_intervals
+# resamples the judged summaries of a dataset: every resample is a vector of multinomial counts, and the confusion
+# counts of all resamples and all cells are one matrix product of these counts with the indicator matrix of the judged
+# summaries. The same resamples are used for every cell of a dataset, such that the intervals are paired.
+# mcnemar_tests compares every pair of cells judging the same summaries with an exact McNemar test.
+#
+# With verdict probabilities the records also hold the P(hallucinated) of every summary. threshold_curves computes the
+# ROC and precision-recall curves of every cell from one sort and cumulative sums, one point per distinct probability,
+# and threshold_sweep the areas under them and the threshold with the best F1 score, without running the cells again.
+
+GROUP_COLUMNS = ["Dataset", "Strategy", "Model"]
+
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+SEED = 42
+
+# Upper bound on the entries of one block of resample counts, to bound the memory on full datasets
+BLOCK_ENTRIES = 10_000_000
+
+def true_positive_rate(labels: list, predictions: list) -> float:
+    '''This function computes the share of hallucinated summaries judged hallucinated.
+
+    - Input: the true labels and the predictions, in any order
+    - Output: the TPR, nan without hallucinated summaries
+    '''
+    labels = np.asarray(labels)
+    predictions = np.asarray(predictions)
+    return float((predictions[labels == 1] == 1).mean()) if (labels == 1).any() else float('nan')
+
+def true_negative_rate(labels: list, predictions: list) -> float:
+    '''This function computes the share of right summaries judged supported.
+
+    - Input: the true labels and the predictions, in any order
+    - Output: the TNR, nan without right summaries
+    '''
+    labels = np.asarray(labels)
+    predictions = np.asarray(predictions)
+    return float((predictions[labels == 0] == 0).mean()) if (labels == 0).any() else float('nan')
+
+def _judged(records) -> pd.DataFrame:
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    df = df[df['Prediction'].notna()]
+    df['True Label'] = df['True Label'].astype(int)
+    df['Prediction'] = df['Prediction'].astype(int)
+    return df
+
+def _rates(tp, fp, tn, fn) -> dict:
+    # Works on arrays of any shape, an empty denominator gives nan, and an F1 score without positives 0 as in sklearn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = np.where(tp + fn > 0, tp / (tp + fn), np.nan)
+        tnr = np.where(tn + fp > 0, tn / (tn + fp), np.nan)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+    return {'TPR': tpr, 'TNR': tnr, 'Precision': precision, 'F1 Score': f1}
+
+def confusion_matrices(records, by: list = GROUP_COLUMNS) -> pd.DataFrame:
+    '''This function computes the confusion matrix and the metrics of every group at once.
+    Records without a prediction are left out.
+
+    - Input: the result records (a list of dicts or a DataFrame) and the columns defining a group
+    - Output: a DataFrame with one line per group, with the TP, FP, TN and FN counts, TPR, TNR, precision and F1 score
+    '''
+    df = _judged(records)
+    codes = df.groupby(by, sort=False).ngroup().to_numpy()
+    groups = df[by].drop_duplicates().reset_index(drop=True)
+    # Each record falls in one of four cells of its group: 2 * label + prediction
+    cells = 4 * codes + 2 * df['True Label'].to_numpy() + df['Prediction'].to_numpy()
+    counts = np.bincount(cells, minlength=4 * len(groups)).reshape(len(groups), 4)
+    (tn, fp, fn, tp) = counts.T
+
+    matrices = groups.assign(**{'Number of Judgements': counts.sum(axis=1), 'TP': tp, 'FP': fp, 'TN': tn, 'FN': fn})
+    for (metric, values) in _rates(tp, fp, tn, fn).items():
+        matrices[metric] = values
+    return matrices
+
+def _wide(df: pd.DataFrame, cells: list) -> pd.DataFrame:
+    # One line per judged summary of a dataset and one column per cell, nan where the cell did not judge the summary.
+    # A summary judged in several runs keeps the last prediction.
+    return df.pivot_table(index=['Row', 'True Label'], columns=cells, values='Prediction', aggfunc='last')
+
+def bootstrap_intervals(records, resamples: int = RESAMPLES, confidence: float = CONFIDENCE, seed: int = SEED) -> pd.DataFrame:
+    '''This function computes bootstrap confidence intervals of the TPR, TNR and F1 score of every cell,
+    resampling the judged summaries of each dataset.
+
+    - Input: the result records, the number of resamples, the confidence level and the seed
+    - Output: a DataFrame with one line per dataset, strategy and model, with the metrics and their lower and upper bounds
+    '''
+    df = _judged(records)
+    rng = np.random.default_rng(seed)
+    quantiles = [100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2]
+    intervals = []
+    for (dataset, part) in df.groupby('Dataset', sort=False):
+        wide = _wide(part, ['Strategy', 'Model'])
+        predictions = wide.to_numpy(dtype=float)
+        labels = wide.index.get_level_values('True Label').to_numpy() == 1
+        judged = ~np.isnan(predictions)
+        hallucinated = judged & labels[:, None]
+        right = judged & ~labels[:, None]
+        positive = predictions == 1
+        # Indicators of the summaries counting as TP, FP, positives and negatives of every cell, side by side
+        indicators = np.hstack([hallucinated & positive, right & positive, hallucinated, right]).astype(np.float32)
+
+        n = len(wide)
+        block = max(1, BLOCK_ENTRIES // n)
+        counts = []
+        for start in range(0, resamples, block):
+            weights = rng.multinomial(n, np.full(n, 1 / n), size=min(block, resamples - start)).astype(np.float32)
+            counts.append(weights @ indicators)
+        (tp, fp, positives, negatives) = np.split(np.vstack(counts), 4, axis=1)
+        resampled = _rates(tp, fp, negatives - fp, positives - tp)
+
+        (all_tp, all_fp, all_positives, all_negatives) = indicators.sum(axis=0).reshape(4, -1)
+        estimates = _rates(all_tp, all_fp, all_negatives - all_fp, all_positives - all_tp)
+        # A metric without any defined resample, e.g. the TPR of a cell without hallucinated summaries, stays nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            bounds = {metric: np.nanpercentile(values, quantiles, axis=0) for (metric, values) in resampled.items()}
+        for (i, (strategy, model)) in enumerate(wide.columns):
+            interval = {'Dataset': dataset, 'Strategy': strategy, 'Model': model, 'Number of Judgements': int(judged[:, i].sum())}
+            for metric in ('TPR', 'TNR', 'F1 Score'):
+                interval[metric] = estimates[metric][i]
+                interval[f'{metric} Low'] = bounds[metric][0, i]
+                interval[f'{metric} High'] = bounds[metric][1, i]
+            intervals.append(interval)
+    return pd.DataFrame(intervals)
+
+def _mcnemar_p_value(b: int, c: int) -> float:
+    # Exact two-sided binomial test of b successes in b + c trials with p = 0.5
+    n = b + c
+    if n == 0:
+        return 1.0
+    return min(1.0, 2 * sum(math.comb(n, k) for k in range(min(b, c) + 1)) / 2 ** n)
+
+def mcnemar_tests(records) -> pd.DataFrame:
+    '''This function compares every pair of cells of a dataset with an exact McNemar test on the summaries both judged.
+
+    - Input: the result records
+    - Output: a DataFrame with one line per pair, with the summaries only the first or only the second cell judged
+      right, the continuity corrected chi-squared statistic and the exact p-value
+    '''
+    df = _judged(records)
+    tests = []
+    for (dataset, part) in df.groupby('Dataset', sort=False):
+        wide = _wide(part, ['Strategy', 'Model'])
+        predictions = wide.to_numpy(dtype=float)
+        labels = wide.index.get_level_values('True Label').to_numpy()
+        judged = ~np.isnan(predictions)
+        right = (judged & (predictions == labels[:, None])).astype(np.int64)
+        wrong = (judged & (predictions != labels[:, None])).astype(np.int64)
+        # only_right[i, j] counts the summaries cell i judged right and cell j wrong, for all pairs at once
+        only_right = right.T @ wrong
+        both_judged = judged.T.astype(np.int64) @ judged.astype(np.int64)
+        for i in range(len(wide.columns)):
+            for j in range(i + 1, len(wide.columns)):
+                (b, c) = (int(only_right[i, j]), int(only_right[j, i]))
+                tests.append({'Dataset': dataset,
+                              'Strategy A': wide.columns[i][0], 'Model A': wide.columns[i][1],
+                              'Strategy B': wide.columns[j][0], 'Model B': wide.columns[j][1],
+                              'Both Judged': int(both_judged[i, j]),
+                              'Only A Right': b,
+                              'Only B Right': c,
+                              'Chi Squared': max(0, abs(b - c) - 1) ** 2 / (b + c) if b + c else 0.0,
+                              'P Value': _mcnemar_p_value(b, c)})
+    return pd.DataFrame(tests)
+
+def _scored(records) -> pd.DataFrame:
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    if 'Probability' not in df.columns:
+        return df.iloc[0:0].assign(Probability=pd.Series(dtype=float))
+    df = df[pd.to_numeric(df['Probability'], errors='coerce').notna()]
+    df['True Label'] = df['True Label'].astype(int)
+    df['Probability'] = df['Probability'].astype(float)
+    return df
+
+def _curve(labels: np.ndarray, probabilities: np.ndarray) -> tuple:
+    # Predicting hallucinated from each distinct probability down: the thresholds and the TP and FP counts at each
+    order = np.argsort(-probabilities, kind='mergesort')
+    (labels, probabilities) = (labels[order], probabilities[order])
+    last = np.r_[probabilities[1:] != probabilities[:-1], True]
+    return (probabilities[last], np.cumsum(labels)[last], np.cumsum(1 - labels)[last])
+
+def threshold_curves(records, by: list = GROUP_COLUMNS) -> pd.DataFrame:
+    '''This function computes the ROC and precision-recall curves of every group from the verdict probabilities.
+    A summary is predicted hallucinated when its probability is at least the threshold, records without a probability are left out.
+
+    - Input: the result records and the columns defining a group
+    - Output: a DataFrame with one line per group and threshold, with the TP, FP, TN and FN counts, TPR, FPR, TNR, precision and F1 score
+    '''
+    df = _scored(records)
+    curves = []
+    for (group, part) in df.groupby(by, sort=False):
+        labels = part['True Label'].to_numpy()
+        (thresholds, tp, fp) = _curve(labels, part['Probability'].to_numpy())
+        (positives, negatives) = (labels.sum(), len(labels) - labels.sum())
+        curve = pd.DataFrame(dict(zip(by, group if isinstance(group, tuple) else (group,))), index=range(len(thresholds)))
+        curve = curve.assign(**{'Threshold': thresholds, 'TP': tp, 'FP': fp, 'TN': negatives - fp, 'FN': positives - tp})
+        rates = _rates(tp, fp, negatives - fp, positives - tp)
+        curve['TPR'] = rates['TPR']
+        curve['FPR'] = 1 - rates['TNR']
+        for metric in ('TNR', 'Precision', 'F1 Score'):
+            curve[metric] = rates[metric]
+        curves.append(curve)
+    return pd.concat(curves, ignore_index=True) if curves else pd.DataFrame(columns=by + ['Threshold'])
+
+def threshold_sweep(records, by: list = GROUP_COLUMNS) -> pd.DataFrame:
+    '''This function summarizes the curves of every group: the area under the ROC curve, the average precision
+    and the threshold with the best F1 score, next to the F1 score at 0.5, the threshold of the hard verdicts.
+
+    - Input: the result records and the columns defining a group
+    - Output: a DataFrame with one line per group
+    '''
+    curves = threshold_curves(records, by)
+    sweeps = []
+    for (group, curve) in curves.groupby(by, sort=False):
+        # The curves start at the threshold above every probability, where nothing is predicted hallucinated
+        tpr = np.r_[0.0, curve['TPR'].to_numpy()]
+        fpr = np.r_[0.0, curve['FPR'].to_numpy()]
+        precision = curve['Precision'].to_numpy()
+        best = int(np.argmax(curve['F1 Score'].to_numpy()))
+        at_half = curve[curve['Threshold'] >= 0.5]
+        sweep = dict(zip(by, group if isinstance(group, tuple) else (group,)))
+        sweep.update({'Number of Judgements': int(curve['TP'].iloc[0] + curve['FP'].iloc[0] + curve['TN'].iloc[0] + curve['FN'].iloc[0]),
+                      'ROC AUC': float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)),
+                      'Average Precision': float(np.nansum(np.diff(tpr) * precision)),
+                      'Best Threshold': float(curve['Threshold'].iloc[best]),
+                      'Best F1 Score': float(curve['F1 Score'].iloc[best]),
+                      'Best TPR': float(curve['TPR'].iloc[best]),
+                      'Best TNR': float(curve['TNR'].iloc[best]),
+                      'F1 Score at 0.5': float(at_half['F1 Score'].iloc[-1]) if len(at_half) else 0.0})
+        sweeps.append(sweep)
+    return pd.DataFrame(sweeps)
@@ -0,0 +1,169 @@
+import asyncio
+import math
+import os
+import threading
+import time
+
+# Token bucket rate limiting per model
+#
+# OpenAI limits requests per minute (RPM) and tokens per minute (TPM) separately for every model, so gpt-4o and
+# gpt-4o-mini have their own pools. Before a call the limiter takes one request and the estimated tokens of the call
+# (the prompt estimate plus max_tokens, or COMPLETION_RESERVE without it) from the buckets of the model, waiting until
+# both can pay. After the call the reservation is reconciled with response.usage, returning unused tokens or recording
+# the excess as debt that delays the next calls.
+#
+# A bucket starts full and refills continuously at its limit per minute. The lock of a limiter is only held to update
+# the buckets, never while waiting, so synchronous threads and asyncio tasks can share one limiter.
+#
+# Limits are set per API model name with set_rate_limit, e.g. set_rate_limit("gpt-4o", rpm=500, tpm=30_000),
+# or for a whole run with RATE_LIMITS="gpt-4o=500:30000,gpt-4o-mini=500:200000". Models without limits are not limited.
+
+# Completion tokens reserved for calls without max_tokens
+COMPLETION_RESERVE = 256
+
+class TokenBucket:
+    '''A bucket of capacity units that refills at capacity units per minute.
+
+    - Input: the limit per minute
+    - Output: the bucket, full
+    '''
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A call larger than the bucket only waits for a full bucket, otherwise it would never be sent
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+class RateLimiter:
+    '''The RPM and TPM buckets of one model.
+
+    - Input: the requests per minute and the tokens per minute, None for no limit
+    - Output: the limiter
+    '''
+
+    def __init__(self, rpm: float = None, tpm: float = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0,
+                      "delayed_requests": 0,
+                      "waited_seconds": 0.0,
+                      "reserved_tokens": 0,
+                      "used_tokens": 0}
+
+    def _try_reserve(self, tokens: int) -> float:
+        # Take the request and the tokens if both buckets can pay, otherwise return how long to wait
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0.0:
+                return wait
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= tokens
+            self.stats["requests"] += 1
+            self.stats["reserved_tokens"] += tokens
+            return 0.0
+
+    def _record_wait(self, waited: float) -> None:
+        if waited > 0.0:
+            with self._lock:
+                self.stats["delayed_requests"] += 1
+                self.stats["waited_seconds"] += waited
+
+    def reserve(self, tokens: int) -> int:
+        '''This function blocks the calling thread until the model can take one more request of the given tokens.
+
+        - Input: the estimated tokens of the call
+        - Output: the reserved tokens, to be passed to reconcile
+        '''
+        waited = 0.0
+        while (wait := self._try_reserve(tokens)) > 0.0:
+            time.sleep(wait)
+            waited += wait
+        self._record_wait(waited)
+        return tokens
+
+    async def reserve_async(self, tokens: int) -> int:
+        '''This function waits, without blocking the event loop, until the model can take one more request of the given tokens.
+
+        - Input: the estimated tokens of the call
+        - Output: the reserved tokens, to be passed to reconcile
+        '''
+        waited = 0.0
+        while (wait := self._try_reserve(tokens)) > 0.0:
+            await asyncio.sleep(wait)
+            waited += wait
+        self._record_wait(waited)
+        return tokens
+
+    def reconcile(self, reserved: int, used: int) -> None:
+        '''This function corrects the token bucket with the tokens a call actually used.
+        Failed calls are reconciled with 0 used tokens, their request stays counted.
+
+        - Input: the reserved tokens and the used tokens (usage.total_tokens)
+        - Output: None
+        '''
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+            self.stats["used_tokens"] += used
+
+# One limiter per API model name
+rate_limiters = {}
+
+def set_rate_limit(model: str, rpm: float = None, tpm: float = None) -> None:
+    '''This function sets the RPM and TPM limits of a model, replacing its earlier limiter.
+
+    - Input: the API model name, e.g. "gpt-4o", the requests per minute and the tokens per minute (None for no limit)
+    - Output: None
+    '''
+    if rpm is None and tpm is None:
+        rate_limiters.pop(model, None)
+    else:
+        rate_limiters[model] = RateLimiter(rpm, tpm)
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    return rate_limiters.get(model)
+
+def estimate_tokens(params: dict) -> int:
+    '''This function estimates the tokens a chat completion request counts against the TPM limit.
+
+    - Input: the keyword arguments of chat.completions.create
+    - Output: the estimated prompt tokens plus the completion tokens that may be generated
+    '''
+    completion_tokens = params.get("max_tokens") or params.get("max_completion_tokens") or COMPLETION_RESERVE
+    return estimate_prompt_tokens(params) + completion_tokens * params.get("n", 1)
+
+def estimate_prompt_tokens(params: dict) -> int:
+    # About four characters per token, plus the tokens framing every message
+    return sum(4 + math.ceil(len(str(message.get("content", ""))) / 4) for message in params.get("messages", [])) + 3
+
+def used_tokens(response) -> int:
+    usage = getattr(response, "usage", None)
+    return usage.total_tokens if usage is not None else 0
+
+def print_rate_limit_stats() -> None:
+    for (model, limiter) in rate_limiters.items():
+        print(f"Rate limiter {model}:", limiter.stats)
+
+# A run can set limits without code changes, e.g. RATE_LIMITS="gpt-4o=500:30000,gpt-4o-mini=500:200000"
+if os.environ.get("RATE_LIMITS"):
+    for limit in os.environ["RATE_LIMITS"].split(","):
+        (model, values) = limit.split("=")
+        (rpm, tpm) = values.split(":")
+        set_rate_limit(model.strip(), float(rpm) if rpm else None, float(tpm) if tpm else None)
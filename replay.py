@@ -0,0 +1,108 @@
+import asyncio
+import time
+from datetime import datetime
+import pandas as pd
+import async_helpers
+import response_cache
+from helpers import create_extended_judge_messages, create_reasoning_judge_messages
+
+# Replaying stored transcripts
+#
+# The debates and reasonings of earlier runs are stored in the row-level CSV files. Replaying re-runs only the final
+# judge stage on them, with a chosen judge model and prompt, so a new judge prompt can be evaluated on every stored
+# transcript without generating the debates again. All judgements run concurrently through the async model functions,
+# within their concurrency limits and through the response cache. The label of every line is read from its
+# True Label column, and the judged summary is the right or hallucinated summary that label selects.
+
+# Stored transcripts, as the columns joined into one transcript
+TRANSCRIPTS = {"phi3_debate": ["Phi3 Debate Hallucinated", "Phi3 Debate Supported"],
+               "gpt4o_mini_debate": ["GPT4o Mini Debate Hallucinated", "GPT4o Mini Debate Supported"],
+               "gpt4o_debate": ["GPT4o Debate Hallucinated", "GPT4o Debate Supported"],
+               "gpt4o_mini_cot": ["GPT4o Mini CoT Reasoning"],
+               "gpt4o_mini_cott_sentence_level": ["GPT4o Mini CoTT Sentence Level Reasoning"],
+               "gpt4o_mini_cott_statement_level": ["GPT4o Mini CoTT Statement Level Reasoning"],
+               "tailored_reasoning": ["Reasoning"]}
+
+# Judge prompts, taking the document, the summary and the transcript
+JUDGE_PROMPTS = {"extended": create_extended_judge_messages,
+                 "reasoning": create_reasoning_judge_messages}
+
+def load_transcripts(path: str, transcripts: list, rows: list = None) -> list:
+    '''This function reads stored transcripts from a row-level CSV file.
+
+    - Input: the CSV file, the names of the transcripts in TRANSCRIPTS and optionally the rows to keep
+    - Output: a list of dicts with the row, the label, the document, the judged summary, the transcript name and its text
+    '''
+    df = pd.read_csv(path)
+    # Files appended to by several runs repeat the header line
+    df = df[pd.to_numeric(df['Row'], errors='coerce').notna()]
+    # A row judged again by a restarted run keeps its last line
+    df = df.assign(**{'Row': df['Row'].astype(float).astype(int), 'True Label': df['True Label'].astype(float).astype(int)})
+    df = df.drop_duplicates(['Row', 'True Label'], keep='last')
+    rows = set(rows) if rows is not None else None
+    items = []
+    for i in range(len(df)):
+        line = df.iloc[i]
+        (row, label) = (int(line['Row']), int(line['True Label']))
+        if rows is not None and row not in rows:
+            continue
+        summary = line['Hallucinated Summary'] if label == 1 else line['Right Summary']
+        for name in transcripts:
+            parts = [line[column] for column in TRANSCRIPTS[name]]
+            if not isinstance(line['Document'], str) or not isinstance(summary, str) or not all(isinstance(part, str) for part in parts):
+                continue
+            items.append({"row": row,
+                          "label": label,
+                          "document": line['Document'],
+                          "summary": summary,
+                          "transcript": name,
+                          "text": "\n" + "\n".join(parts) + "\n"})
+    return items
+
+async def judge_transcript_async(item: dict, judge_LLM: str = "gpt4o", prompt: str = "extended") -> dict:
+    '''This function judges a summary again from its stored transcript.
+    A failing judgement is recorded with its error.
+
+    - Input: the transcript item, the judge model and the name of the judge prompt
+    - Output: the result record
+    '''
+    start = time.perf_counter()
+    (prediction, judgement, error) = (None, "", "")
+    try:
+        judgement = await async_helpers.async_response_dict[judge_LLM](JUDGE_PROMPTS[prompt](item["document"], item["summary"], item["text"]))
+        prediction = 1 if "[HALLUCINATED]" in judgement else 0
+    except Exception as exception:
+        error = repr(exception)
+        print(f"Replaying {item['transcript']} of row {item['row']} with {judge_LLM} failed: {error}")
+    return {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Row': item["row"],
+            'True Label': item["label"],
+            'Transcript': item["transcript"],
+            'Prompt': prompt,
+            'Model': judge_LLM,
+            'Prediction': prediction,
+            'Details': judgement,
+            'Error': error,
+            'Seconds': time.perf_counter() - start}
+
+async def replay_async(items: list, judge_LLMs: list = ("gpt4o",), prompts: list = ("extended",)) -> list:
+    '''This function judges every transcript with every judge model and prompt concurrently.
+
+    - Input: the transcript items, the judge models and the names of the judge prompts
+    - Output: the result records, in the order of the items
+    '''
+    return list(await asyncio.gather(*(judge_transcript_async(item, judge_LLM, prompt)
+                                       for item in items for judge_LLM in judge_LLMs for prompt in prompts)))
+
+def replay(items: list, judge_LLMs: list = ("gpt4o",), prompts: list = ("extended",), cache: bool = True, concurrency: dict = None) -> list:
+    '''Synchronous entry point of replay_async.
+
+    - Input: the transcript items, the judge models, the names of the judge prompts, whether to use the response cache
+      and the concurrency limit per model key, e.g. {"gpt4o": 16}
+    - Output: the result records
+    '''
+    if cache and response_cache.active_cache is None:
+        response_cache.enable_response_cache()
+    for (LLM, limit) in (concurrency or {}).items():
+        async_helpers.set_concurrency_limit(LLM, limit)
+    return asyncio.run(replay_async(items, judge_LLMs, prompts))
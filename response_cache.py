@@ -0,0 +1,147 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# Persistent on-disk cache for LLM responses
+#
+# All calls are made with temperature=0.0, so identical requests can be answered from disk.
+# The key is a content hash of the model name, the normalized messages and the sampling parameters.
+# The value is the full chat completion serialized as JSON, such that usage and logprobs survive a cache hit.
+
+class ResponseCache:
+    '''A content-addressed SQLite cache with hit/miss counters, a size cap and LRU eviction.
+
+    - Input: the path of the SQLite file, the maximum number of entries and the maximum size in bytes
+    - Output: a cache object shared by the sync and async response functions
+    '''
+
+    def __init__(self, path: str = "response_cache.sqlite", max_entries: int = 200_000, max_bytes: int = 1024 ** 3):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access INTEGER NOT NULL
+            )''')
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._connection.commit()
+        (self._entries, self._bytes) = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        '''This function hashes the request parameters into a cache key.
+        Only the role and content of each message are kept, so equivalent requests map to the same key.
+
+        - Input: the keyword arguments of chat.completions.create
+        - Output: the hexadecimal SHA-256 key
+        '''
+        normalized = {name: value for name, value in params.items() if name not in ("messages", "timeout") and value is not None}
+        normalized["messages"] = [{"role": message["role"], "content": message["content"]} for message in params["messages"]]
+        encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, params: dict) -> Optional[str]:
+        key = self.make_key(params)
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time_ns(), key))
+            self._connection.commit()
+            return row[0]
+
+    def put(self, params: dict, value: str) -> None:
+        key = self.make_key(params)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._entries -= 1
+                self._bytes -= previous[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, params.get("model", ""), value, size, time.time_ns()))
+            self._entries += 1
+            self._bytes += size
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # Remove the least recently used entries until both caps are respected
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            row = self._connection.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._entries -= 1
+            self._bytes -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": self._entries,
+                "bytes": self._bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+            self._entries = 0
+            self._bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+# The cache used by the response functions, None when caching is switched off
+active_cache = None
+
+def enable_response_cache(path: str = "response_cache.sqlite", max_entries: int = 200_000, max_bytes: int = 1024 ** 3) -> ResponseCache:
+    '''This function switches the response cache on for the current run.
+
+    - Input: the path of the SQLite file, the maximum number of entries and the maximum size in bytes
+    - Output: the active cache
+    '''
+    global active_cache
+    if active_cache is not None:
+        active_cache.close()
+    active_cache = ResponseCache(path, max_entries, max_bytes)
+    return active_cache
+
+def disable_response_cache() -> None:
+    '''This function switches the response cache off for the current run.'''
+    global active_cache
+    if active_cache is not None:
+        active_cache.close()
+    active_cache = None
+
+def print_cache_stats() -> None:
+    if active_cache is not None:
+        print("Response cache:", active_cache.stats())
+
+# A run can switch the cache on without code changes, e.g. RESPONSE_CACHE=response_cache.sqlite python Sentence_Level_HaluEval.py
+if os.environ.get("RESPONSE_CACHE"):
+    enable_response_cache(os.environ["RESPONSE_CACHE"],
+                          max_bytes=int(float(os.environ.get("RESPONSE_CACHE_MAX_MB", 1024)) * 1024 ** 2))
+    atexit.register(print_cache_stats)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+
+# Streaming results writer
+#
+# The experiment loop hands every result record to ResultSink.write, which only puts it on a queue. A background thread
+# collects the records and appends them in batches, every FLUSH_ROWS records or FLUSH_SECONDS seconds, to a JSONL file
+# or to row groups of a Parquet file. Long texts that repeat across records, the document and the summary of every
+# strategy and model, are stored once in a documents file next to the results and replaced by their content hash.
+#
+# Parquet needs pyarrow, which is optional. A Parquet file cannot be appended to, so a sink writing to an existing
+# Parquet file starts a new file with a timestamp suffix; load_results reads them all.
+# A path without extension is the root of a results_store, partitioned by dataset, strategy, model and run, which
+# keeps the documents and summaries in its own tables.
+
+FLUSH_ROWS = 100
+FLUSH_SECONDS = 5.0
+
+# Columns stored once by content hash
+DEDUPLICATED_COLUMNS = ("Document", "Summary")
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def documents_path(path: str) -> str:
+    return os.path.splitext(path)[0] + "_documents.jsonl"
+
+class ResultSink:
+    '''This class writes result records from a background thread, in batches, with the repeated texts stored once.
+
+    - Input: the results file (.jsonl, .parquet or the directory of a results_store), the columns stored by content hash,
+      and the batch size and interval of the flushes
+    - Output: the sink, to be closed with close() or used as a context manager
+    '''
+
+    def __init__(self, path: str, deduplicated_columns: tuple = DEDUPLICATED_COLUMNS, flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS):
+        self.format = os.path.splitext(path)[1].lstrip(".") or "store"
+        if self.format not in ("jsonl", "parquet", "store"):
+            raise ValueError(f"Unknown results format: {path}, use .jsonl, .parquet or a directory")
+        self._store = None
+        if self.format == "store":
+            from results_store import ResultsStore
+            self._store = ResultsStore(path)
+        if self.format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Writing Parquet needs pyarrow, install it with pip install pyarrow or write .jsonl") from None
+            self._pyarrow = pyarrow
+        # The timestamped Parquet files of one results path share its documents file
+        self.documents_path = documents_path(path)
+        if self.format == "parquet" and os.path.exists(path):
+            path = f"{os.path.splitext(path)[0]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+        self.path = path
+        self.deduplicated_columns = deduplicated_columns
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.stats = {"records": 0, "flushes": 0, "documents": 0, "deduplicated_texts": 0}
+
+        # The hashes of the texts already stored, also by earlier runs
+        self._stored_hashes = set()
+        if os.path.exists(self.documents_path):
+            with open(self.documents_path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        self._stored_hashes.add(json.loads(line)["hash"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+
+        self._queue = queue.Queue()
+        self._error = None
+        self._parquet_writer = None
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict) -> None:
+        '''This function hands a record to the writer thread without waiting for the disk.'''
+        if self._error is not None:
+            raise RuntimeError("The result sink failed") from self._error
+        self._queue.put(dict(record))
+
+    def close(self) -> None:
+        '''This function writes the records still buffered and stops the writer thread.'''
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("The result sink failed") from self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = False
+            if record:
+                batch.append(record)
+            if record is None or len(batch) >= self.flush_rows or time.monotonic() >= deadline:
+                if batch:
+                    try:
+                        self._flush(batch)
+                    except Exception as error:
+                        self._error = error
+                        return
+                    batch = []
+                deadline = time.monotonic() + self.flush_seconds
+            if record is None:
+                if self._parquet_writer is not None:
+                    self._parquet_writer.close()
+                return
+
+    def _flush(self, batch: list) -> None:
+        if self._store is not None:
+            self._store.write(batch)
+            self.stats["records"] += len(batch)
+            self.stats["flushes"] += 1
+            return
+
+        documents = []
+        for record in batch:
+            for column in self.deduplicated_columns:
+                text = record.get(column)
+                if not isinstance(text, str):
+                    continue
+                text_hash = content_hash(text)
+                record[column] = text_hash
+                if text_hash in self._stored_hashes:
+                    self.stats["deduplicated_texts"] += 1
+                else:
+                    self._stored_hashes.add(text_hash)
+                    documents.append({"hash": text_hash, "text": text})
+
+        # The texts go first, such that every hash in the results can be resolved
+        if documents:
+            with open(self.documents_path, "a", encoding="utf-8") as file:
+                file.write("".join(json.dumps(document) + "\n" for document in documents))
+
+        if self.format == "jsonl":
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+        else:
+            self._write_parquet(batch)
+
+        self.stats["records"] += len(batch)
+        self.stats["flushes"] += 1
+        self.stats["documents"] += len(documents)
+
+    def _write_parquet(self, batch: list) -> None:
+        pa = self._pyarrow
+        if self._parquet_writer is None:
+            from results_store import FLOAT_COLUMNS
+            schema = pa.Table.from_pylist(batch).schema
+            # Columns without a value in the first batch would be typed null, store them as strings, or as floats when they hold numbers
+            schema = pa.schema([field.with_type(pa.float64() if field.name in FLOAT_COLUMNS else pa.string()) if pa.types.is_null(field.type) else field
+                                for field in schema])
+            self._parquet_writer = pa.parquet.ParquetWriter(self.path, schema)
+        schema = self._parquet_writer.schema
+        string_columns = {field.name for field in schema if pa.types.is_string(field.type)}
+        batch = [{column: str(value) if column in string_columns and value is not None and not isinstance(value, str) else value
+                  for (column, value) in record.items()} for record in batch]
+        self._parquet_writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+def load_results(path: str, with_texts: bool = True) -> pd.DataFrame:
+    '''This function reads the records written by ResultSink, with the hashed texts restored.
+
+    - Input: the results file (.jsonl or .parquet, the timestamped Parquet files of later runs are included)
+      or the root of a results_store, and whether to restore the texts
+    - Output: a DataFrame with one line per record
+    '''
+    if os.path.isdir(path):
+        from results_store import load_results_store
+        return load_results_store(path, with_texts=with_texts)
+
+    (stem, extension) = os.path.splitext(path)
+    if extension == ".parquet":
+        directory = os.path.dirname(path) or "."
+        name = os.path.basename(stem)
+        files = sorted(os.path.join(directory, file) for file in os.listdir(directory)
+                       if file == name + extension or (file.startswith(name + "_") and file.endswith(extension)))
+        df = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True) if files else pd.DataFrame()
+    else:
+        df = pd.read_json(path, lines=True, dtype=False, convert_dates=False) if os.path.exists(path) else pd.DataFrame()
+
+    if with_texts and os.path.exists(documents_path(path)):
+        texts = {}
+        with open(documents_path(path), encoding="utf-8") as file:
+            for line in file:
+                try:
+                    document = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                texts[document["hash"]] = document["text"]
+        for column in DEDUPLICATED_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].map(lambda value: texts.get(value, value))
+    return df
@@ -0,0 +1,165 @@
+import itertools
+import os
+import urllib.parse
+import uuid
+from datetime import datetime
+import pandas as pd
+from result_sink import content_hash
+
+# Partitioned Parquet results store
+#
+# The results are a Parquet dataset under one root directory, partitioned by dataset, strategy, model and run:
+#
+#     results_store/Dataset=HaluEval/Strategy=sentence_level/Model=gpt4o/Run=20241018_101500/part-....parquet
+#
+# The documents and summaries are kept once in the tables _documents and _summaries, keyed by content hash, and the
+# results reference them in the Document Hash and Summary Hash columns. All files are compressed with zstd, which
+# shrinks the long reasoning and debate columns most. Reading with filters on the partition columns only opens the
+# matching directories, and reading selected columns only decodes those, e.g. the predictions of one strategy.
+#
+# Every file name holds the run and a random id of the writer, and files are created exclusively, so two writers with
+# the same run name, e.g. the same CSV file name under two datasets or two sinks opened in the same second, never
+# overwrite each other's files.
+#
+# The store needs pyarrow, which is optional.
+
+PARTITIONING = ["Dataset", "Strategy", "Model", "Run"]
+
+# Text columns stored once, and the table holding them
+TEXT_TABLES = {"Document": "_documents", "Summary": "_summaries"}
+
+COMPRESSION = "zstd"
+
+# Columns with a fixed type in every file, such that files of different runs read as one dataset
+INTEGER_COLUMNS = ("Row", "True Label", "Prediction")
+FLOAT_COLUMNS = ("Seconds", "Probability")
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The results store needs pyarrow, install it with pip install pyarrow") from None
+    return pyarrow
+
+def _partitioning(pa):
+    return pa.dataset.partitioning(pa.schema([(column, pa.string()) for column in PARTITIONING]), flavor="hive")
+
+def _text_hashes(root: str, table: str) -> set:
+    pa = _import_pyarrow()
+    directory = os.path.join(root, table)
+    if not os.path.isdir(directory):
+        return set()
+    return set(pa.dataset.dataset(directory, format="parquet").to_table(columns=["hash"]).column("hash").to_pylist())
+
+class ResultsStore:
+    '''This class appends result records to the partitioned Parquet store.
+
+    - Input: the root directory of the store and the name of the run (defaults to the current time)
+    - Output: the store
+    '''
+
+    def __init__(self, root: str, run: str = None):
+        self.pa = _import_pyarrow()
+        self.root = root
+        self.run = run or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.stats = {"records": 0, "texts": 0, "deduplicated_texts": 0}
+        # The hashes of the texts already stored, also by earlier runs
+        self._hashes = {table: _text_hashes(root, table) for table in TEXT_TABLES.values()}
+        self._parts = itertools.count()
+        self._writer = uuid.uuid4().hex[:12]
+
+    def write(self, records: list) -> None:
+        '''This function appends records, dicts with the partition columns (Run defaults to the run of the store),
+        to the store as new files.
+
+        - Input: the records
+        - Output: None
+        '''
+        pa = self.pa
+        name = f"part-{self.run}-{self._writer}-{next(self._parts)}.parquet"
+        df = pd.DataFrame(records)
+        if "Run" not in df.columns:
+            df["Run"] = self.run
+        df["Run"] = df["Run"].fillna(self.run).astype(str)
+
+        for (column, table) in TEXT_TABLES.items():
+            if column not in df.columns:
+                continue
+            texts = df[column].where(df[column].map(lambda value: isinstance(value, str)))
+            hashes = texts.map(lambda text: content_hash(text) if isinstance(text, str) else None)
+            new_texts = {}
+            for (text_hash, text) in zip(hashes, texts):
+                if text_hash is None:
+                    continue
+                if text_hash in self._hashes[table] or text_hash in new_texts:
+                    self.stats["deduplicated_texts"] += 1
+                else:
+                    new_texts[text_hash] = text
+            if new_texts:
+                # The texts are written before the results referencing them
+                os.makedirs(os.path.join(self.root, table), exist_ok=True)
+                self._write_new(pa.table({"hash": list(new_texts), "text": list(new_texts.values())}), os.path.join(self.root, table, name))
+                self._hashes[table].update(new_texts)
+                self.stats["texts"] += len(new_texts)
+            df[f"{column} Hash"] = hashes
+            df = df.drop(columns=[column])
+
+        for column in INTEGER_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int64")
+        for column in FLOAT_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Columns without any value in these records would be typed null, store them as strings
+        table = table.cast(pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema]))
+        # One file per partition, in the hive layout read by load_results_store
+        for (values, group) in df.groupby(PARTITIONING, sort=False, dropna=False).indices.items():
+            directory = os.path.join(self.root, *[f"{column}={urllib.parse.quote(str(value), safe='')}" for (column, value) in zip(PARTITIONING, values)])
+            os.makedirs(directory, exist_ok=True)
+            self._write_new(table.take(group).drop_columns(PARTITIONING), os.path.join(directory, name))
+        self.stats["records"] += len(df)
+
+    def _write_new(self, table, path: str) -> None:
+        # Exclusive creation, an existing file is an error rather than overwritten
+        with open(path, "xb") as file:
+            self.pa.parquet.write_table(table, file, compression=COMPRESSION)
+
+def load_results_store(root: str, columns: list = None, filters: dict = None, with_texts: bool = False) -> pd.DataFrame:
+    '''This function reads results from the store, opening only the partitions and decoding only the columns asked for.
+
+    - Input: the root directory, the columns to read (None for all), filters from column to a value or a list of values,
+      e.g. {"Dataset": "HaluEval", "Model": ["gpt4o", "gpt4o_mini"]}, and whether to join the documents and summaries
+    - Output: a DataFrame with one line per judged summary
+    '''
+    pa = _import_pyarrow()
+    dataset = pa.dataset.dataset(root, format="parquet", partitioning=_partitioning(pa), ignore_prefixes=["_", "."])
+    expression = None
+    for (column, value) in (filters or {}).items():
+        condition = pa.dataset.field(column).isin(list(value)) if isinstance(value, (list, tuple, set)) else pa.dataset.field(column) == value
+        expression = condition if expression is None else expression & condition
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    if with_texts:
+        for (column, table) in TEXT_TABLES.items():
+            if f"{column} Hash" in df.columns:
+                texts = load_texts(root, table, set(df[f"{column} Hash"].dropna()))
+                df[column] = df[f"{column} Hash"].map(texts)
+    return df
+
+def load_texts(root: str, table: str = "_documents", hashes: set = None) -> dict:
+    '''This function reads stored texts by hash.
+
+    - Input: the root directory, the table ("_documents" or "_summaries") and the hashes to read (None for all)
+    - Output: a dict from hash to text
+    '''
+    pa = _import_pyarrow()
+    directory = os.path.join(root, table)
+    if not os.path.isdir(directory):
+        return {}
+    expression = pa.dataset.field("hash").isin(list(hashes)) if hashes is not None else None
+    texts = pa.dataset.dataset(directory, format="parquet").to_table(filter=expression)
+    return dict(zip(texts.column("hash").to_pylist(), texts.column("text").to_pylist()))
@@ -0,0 +1,196 @@
+import asyncio
+import email.utils
+import openai
+import os
+import random
+import threading
+import time
+
+# Retries of model calls
+#
+# A transient error (429, 408, 409, 5xx, connection error or timeout) would otherwise raise through the experiment
+# script and lose the row, so chat_completion and chat_completion_async resend failed requests. A chat completion that
+# failed produced nothing, and at temperature 0 the retry asks the same question again, so resending is safe.
+#
+# The delay before retry k is drawn uniformly from [0, min(MAX_DELAY, BASE_DELAY * 2 ** k)] (full jitter), such that
+# concurrent calls that failed together do not retry together. A Retry-After or retry-after-ms header of the error
+# replaces the drawn delay. The client's own retries are switched off for the calls, so a request is not retried twice.
+#
+# Per-model timeouts are set with set_timeout or TIMEOUTS="gpt-4o=60,phi3:14b-instruct=300" (API model names, seconds).
+
+# Defaults of the retry policy, changed with set_retry_policy
+MAX_ATTEMPTS = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# HTTP statuses below 500 that are worth retrying
+RETRY_STATUS_CODES = {408, 409, 429}
+
+retry_policy = {"max_attempts": MAX_ATTEMPTS, "base_delay": BASE_DELAY, "max_delay": MAX_DELAY}
+
+# Timeout in seconds per API model name
+timeouts = {}
+
+# Counters per API model name
+retry_stats = {}
+_lock = threading.Lock()
+
+def set_retry_policy(max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY) -> None:
+    '''This function sets how often and how patiently failed calls are retried, max_attempts=1 switches the retries off.
+
+    - Input: the attempts per call including the first one, the base and the maximum delay in seconds
+    - Output: None
+    '''
+    if max_attempts < 1:
+        raise ValueError("A call needs at least 1 attempt")
+    retry_policy.update(max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay)
+
+def set_timeout(model: str, seconds: float) -> None:
+    '''This function sets the timeout of every attempt of a call to a model, None for the client's default.
+
+    - Input: the API model name and the timeout in seconds
+    - Output: None
+    '''
+    if seconds is None:
+        timeouts.pop(model, None)
+    else:
+        timeouts[model] = seconds
+
+def request_options(model: str) -> dict:
+    '''This function gives the client options of a call, to be passed to client.with_options.
+
+    - Input: the API model name
+    - Output: the options, without the client's own retries and with the timeout of the model if set
+    '''
+    options = {"max_retries": 0}
+    if model in timeouts:
+        options["timeout"] = timeouts[model]
+    return options
+
+def is_retryable(error: Exception) -> bool:
+    # APITimeoutError is an APIConnectionError
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS_CODES or error.status_code >= 500
+    return False
+
+def retry_after(error: Exception) -> float:
+    '''This function reads the delay the server asks for before the next attempt.
+
+    - Input: the error of the failed attempt
+    - Output: the delay in seconds, None without a Retry-After or retry-after-ms header
+    '''
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after") is not None:
+            value = headers["retry-after"]
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                # An HTTP date
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    '''This function gives the delay before the next attempt of a call.
+
+    - Input: the number of failed attempts so far and the error of the last one
+    - Output: the delay in seconds
+    '''
+    asked = retry_after(error)
+    if asked is not None:
+        return asked
+    return random.uniform(0, min(retry_policy["max_delay"], retry_policy["base_delay"] * 2 ** (attempt - 1)))
+
+def _new_stats() -> dict:
+    return {"calls": 0,
+            "retried_calls": 0,
+            "retries": 0,
+            "failed_calls": 0,
+            "waited_seconds": 0.0,
+            "errors": {}}
+
+def _record(model: str, failed_attempts: list, waited: float, failed: bool) -> None:
+    with _lock:
+        stats = retry_stats.setdefault(model, _new_stats())
+        stats["calls"] += 1
+        retries = len(failed_attempts) - failed
+        stats["retried_calls"] += retries > 0
+        stats["retries"] += retries
+        stats["failed_calls"] += failed
+        stats["waited_seconds"] += waited
+        for error in failed_attempts:
+            name = type(error).__name__
+            stats["errors"][name] = stats["errors"].get(name, 0) + 1
+
+def _should_retry(error: Exception, attempt: int) -> bool:
+    return is_retryable(error) and attempt < retry_policy["max_attempts"]
+
+def call_with_retries(model: str, send):
+    '''This function calls send until it succeeds, retrying transient errors with jittered exponential backoff.
+
+    - Input: the API model name and a function sending the request once, with the options of request_options
+    - Output: the result of send, or the error of the last attempt
+    '''
+    failed_attempts = []
+    waited = 0.0
+    while True:
+        try:
+            result = send(request_options(model))
+        except Exception as error:
+            failed_attempts.append(error)
+            if not _should_retry(error, len(failed_attempts)):
+                _record(model, failed_attempts, waited, True)
+                raise
+            delay = backoff_delay(len(failed_attempts), error)
+            time.sleep(delay)
+            waited += delay
+            continue
+        _record(model, failed_attempts, waited, False)
+        return result
+
+async def call_with_retries_async(model: str, send):
+    '''This function awaits send until it succeeds, retrying transient errors with jittered exponential backoff.
+
+    - Input: the API model name and a coroutine function sending the request once, with the options of request_options
+    - Output: the result of send, or the error of the last attempt
+    '''
+    failed_attempts = []
+    waited = 0.0
+    while True:
+        try:
+            result = await send(request_options(model))
+        except Exception as error:
+            failed_attempts.append(error)
+            if not _should_retry(error, len(failed_attempts)):
+                _record(model, failed_attempts, waited, True)
+                raise
+            delay = backoff_delay(len(failed_attempts), error)
+            await asyncio.sleep(delay)
+            waited += delay
+            continue
+        _record(model, failed_attempts, waited, False)
+        return result
+
+def print_retry_stats() -> None:
+    with _lock:
+        for (model, stats) in retry_stats.items():
+            print(f"Retries {model}:", stats)
+
+def reset_retry_stats() -> None:
+    with _lock:
+        retry_stats.clear()
+
+# A run can set the timeouts without code changes, e.g. TIMEOUTS="gpt-4o=60,phi3:14b-instruct=300"
+if os.environ.get("TIMEOUTS"):
+    for timeout in os.environ["TIMEOUTS"].split(","):
+        (model, seconds) = timeout.rsplit("=", 1)
+        set_timeout(model.strip(), float(seconds))
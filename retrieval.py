@@ -0,0 +1,102 @@
+import functools
+import math
+from collections import Counter
+from sentence_splitter import split_sentences
+from suspicion import content_words, numbers
+
+# Local BM25 retrieval of document sentences for knowledge filtering
+#
+# A stand-in for the LLM call on create_document_sentences_extractor_messages. Every sentence of the
+# summary is a query against the sentences of the document, and the retrieved sentences are returned
+# in document order, one per line, like the output of the LLM extractor.
+#
+# The amount of retrieved knowledge is set either by top_k, the number of document sentences per summary
+# sentence, or by coverage, the share of the query terms of a summary sentence that the retrieved
+# sentences must contain before the retrieval for that summary sentence stops.
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Default share of the query terms to cover when no top_k is given
+BM25_COVERAGE = 0.8
+
+def terms(text: str) -> list:
+    return content_words(text) + sorted(numbers(text))
+
+class BM25Retriever:
+    '''A BM25 index over the sentences of a document.
+
+    - Input: a document and the BM25 parameters k1 and b
+    - Output: the retriever object
+    '''
+
+    def __init__(self, document: str, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.sentences = split_sentences(document)
+        self.sentence_terms = [Counter(terms(sentence)) for sentence in self.sentences]
+        self.lengths = [sum(counts.values()) for counts in self.sentence_terms]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequencies = Counter(term for counts in self.sentence_terms for term in counts)
+        self.idf = {term: math.log(1 + (len(self.sentences) - frequency + 0.5) / (frequency + 0.5))
+                    for (term, frequency) in document_frequencies.items()}
+
+    def scores(self, query: str) -> list:
+        '''This function scores every document sentence against a query.
+
+        - Input: a query
+        - Output: the BM25 score of every sentence, in document order
+        '''
+        query_terms = set(terms(query))
+        scores = []
+        for (counts, length) in zip(self.sentence_terms, self.lengths):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term, 0)
+                if frequency:
+                    normalization = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1.0))
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + normalization)
+            scores.append(score)
+        return scores
+
+    def retrieve(self, query: str, top_k: int = None, coverage: float = BM25_COVERAGE) -> list:
+        '''This function retrieves the indices of the document sentences that match a query best.
+
+        - Input: a query, the number of sentences to retrieve or else the share of query terms to cover
+        - Output: the indices of the retrieved sentences, best first
+        '''
+        scores = self.scores(query)
+        ranking = [index for index in sorted(range(len(scores)), key=lambda index: -scores[index]) if scores[index] > 0.0]
+        if top_k is not None:
+            return ranking[:top_k]
+
+        query_terms = set(terms(query))
+        covered = set()
+        retrieved = []
+        for index in ranking:
+            if query_terms and len(covered) / len(query_terms) >= coverage:
+                break
+            new_terms = (query_terms & set(self.sentence_terms[index])) - covered
+            # Sentences that add no query term only repeat retrieved knowledge
+            if retrieved and not new_terms:
+                continue
+            retrieved.append(index)
+            covered |= new_terms
+        return retrieved
+
+@functools.lru_cache(maxsize=64)
+def bm25_retriever(document: str) -> BM25Retriever:
+    # The right and the hallucinated summary of a row share the document, so the index is built once per document
+    return BM25Retriever(document)
+
+def bm25_filter(document: str, summary: str, top_k: int = None, coverage: float = BM25_COVERAGE) -> str:
+    '''This function filters a document to the sentences needed to fact-check a summary, without calling an LLM.
+
+    - Input: a document, a summary, the number of document sentences per summary sentence or else the share of query terms to cover
+    - Output: the filtered document, one sentence per line in document order
+    '''
+    retriever = bm25_retriever(document)
+    retrieved = set()
+    for sentence in split_sentences(summary):
+        retrieved.update(retriever.retrieve(sentence, top_k, coverage))
+    return "\n".join(retriever.sentences[index] for index in sorted(retrieved))
@@ -0,0 +1,119 @@
+import re
+
+# Rule-based sentence splitter
+#
+# A local, deterministic alternative to the LLM call on create_summary_sentence_extractor_messages.
+# It is tuned to the summaries in HaluEval, SummEval and QAGS, which mix regular text with
+# tokenized CNN/DailyMail text (" ." before punctuation, `` '' quotes and fully lowercased summaries).
+
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "gen", "gov", "sen", "rep", "rev", "lt", "col",
+    "sgt", "capt", "cmdr", "adm", "maj", "pres", "supt", "insp", "det", "hon", "mt", "ft", "ave", "blvd",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "mon", "tue", "tues", "wed", "thu", "thurs", "fri", "sat", "sun",
+    "inc", "ltd", "co", "corp", "plc", "llc", "bros", "dept", "univ", "assn",
+    "vs", "v", "etc", "approx", "est", "no", "nos", "vol", "fig", "al", "cf",
+}
+
+# Abbreviations that also end sentences, e.g. "at 3 p.m. They left."
+SENTENCE_FINAL_ABBREVIATIONS = {"etc", "inc", "ltd", "co", "corp", "plc", "llc", "bros", "jr", "sr", "a.m", "p.m"}
+
+# Closing quotes and brackets that may follow the sentence final punctuation
+_CLOSERS = "\"'”’)]"
+_BOUNDARY = re.compile(r"([.!?]+)((?:''|[\"'”’)\]])*)(\s+)")
+_PREVIOUS_TOKEN = re.compile(r"(\S+)\s*$")
+_NEXT_TOKEN = re.compile(r"\s*(\S+)")
+
+def _is_abbreviation(token: str) -> bool:
+    # The token is the text before the period, e.g. "Mr", "U.S" or "J"
+    stripped = token.lstrip("(\"'`‘“[")
+    if not stripped:
+        return False
+    if stripped.lower() in ABBREVIATIONS:
+        return True
+    # Initials such as "J." in "J. K. Rowling"
+    if len(stripped) == 1 and stripped.isalpha():
+        return True
+    # Dotted acronyms such as "U.S" in "U.S." or "a.m" in "a.m."
+    if re.fullmatch(r"(?:[A-Za-z]\.)+[A-Za-z]", stripped):
+        return True
+    return False
+
+def _split_line(line: str, cased: bool) -> list:
+    sentences = []
+    start = 0
+    for match in _BOUNDARY.finditer(line):
+        (punctuation, closers, _) = match.groups()
+        before = line[start:match.start()]
+        after = line[match.end():]
+        if not after:
+            break
+
+        previous = _PREVIOUS_TOKEN.search(before)
+        previous_token = previous.group(1) if previous else ""
+        next_token = _NEXT_TOKEN.match(after).group(1)
+
+        if punctuation == "." and not closers and _is_abbreviation(previous_token):
+            ends_sentence = previous_token.lower() in SENTENCE_FINAL_ABBREVIATIONS and cased and next_token[:1].isupper()
+            if not ends_sentence:
+                continue
+        # Speech attribution after a quoted question or exclamation, e.g. "How?" says one man.
+        if closers and punctuation in ("?", "!") and next_token[:1].islower():
+            continue
+        # In cased text a sentence does not continue with a lowercase word
+        if cased and next_token[:1].islower():
+            continue
+        # A lone closing quote or bracket on the next token belongs to the current sentence
+        if all(character in _CLOSERS for character in next_token):
+            continue
+
+        sentences.append(line[start:match.end()].strip())
+        start = match.end()
+
+    sentences.append(line[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+def _merge_fragments(sentences: list) -> list:
+    # Pieces with at most one word, such as the "By ." of a news byline or a trailing quote, are not sentences on their own
+    merged = []
+    leading = ""
+    for sentence in sentences:
+        words = [word for word in sentence.split() if any(character.isalnum() for character in word)]
+        if len(words) <= 1:
+            if merged:
+                merged[-1] = merged[-1] + " " + sentence
+            else:
+                leading = leading + sentence + " "
+        else:
+            merged.append(leading + sentence)
+            leading = ""
+    if leading:
+        merged.append(leading.strip())
+    return merged
+
+def _strip_dateline(line: str) -> list:
+    # News datelines such as "LONDON, England (CNN) --" are kept with the first sentence
+    match = re.match(r"^\s*((?:[A-Z][A-Za-z.'\-]*[ ,]*){1,4}\((?:CNN|AP|Reuters|AFP)\)\s*(?:--|—|-)\s*)", line)
+    if match:
+        return [match.group(1), line[match.end():]]
+    return ["", line]
+
+def split_sentences(text: str) -> list:
+    '''This function splits a summary into sentences without calling an LLM.
+    Line breaks are hard boundaries; abbreviations, initials, acronyms, quotes and news datelines do not end a sentence.
+
+    - Input: a summary
+    - Output: the list of sentences, in the same format as the split output of the LLM sentence extractor
+    '''
+    # Only treat lowercase words as continuations when the text uses capitalization at all
+    cased = any(character.isupper() for character in text)
+    sentences = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        (dateline, body) = _strip_dateline(line)
+        line_sentences = _split_line(body, cased)
+        if dateline and line_sentences:
+            line_sentences[0] = dateline + line_sentences[0]
+        sentences += line_sentences
+    return _merge_fragments(sentences)
@@ -0,0 +1,190 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import openai
+from openai.types.chat import ChatCompletion
+import rate_limiter
+
+# Streaming judges that stop at the verdict
+#
+# The judges reason step by step and end with [HALLUCINATED] or [SUPPORTED], while the strategies only look for
+# HALLUCINATED anywhere in the answer. With streaming on for a model, the judge calls of the early exit strategies are
+# sent with stream=True, the content is read as it arrives and the stream is closed as soon as [HALLUCINATED] is read,
+# which settles the prediction whatever follows. A [SUPPORTED] does not stop the stream, as a judge may write it while
+# reasoning and still conclude [HALLUCINATED], so supported answers are read to their end and predictions never change.
+# The answer keeps the reasoning up to and including the stopping verdict for the result CSV, and the tokens after it
+# are not generated. Only the calls made inside verdict_stream() stop early, as the debates quote the verdict markers.
+#
+# Answers stopped at the verdict are cached apart from complete answers. When the stream is closed before its usage
+# chunk, the usage is estimated from the prompt and the chunks read, counting one token per chunk.
+# Switch it on with enable_streaming or STREAM_VERDICTS="gpt-4o-mini,gpt-4o" (API model names).
+
+# The verdict that ends a stream, any later text could not change the prediction
+STOP_MARKER = "[HALLUCINATED]"
+
+# The API model names whose judges are streamed
+streaming_models = set()
+
+# Whether the current call is a judge that may stop at the verdict
+stop_at_verdict = contextvars.ContextVar("stop_at_verdict", default=False)
+
+# Counters per API model name
+streaming_stats = {}
+_lock = threading.Lock()
+
+def enable_streaming(models: list = ("gpt-4o-mini", "gpt-4o")) -> None:
+    '''This function switches streaming with early termination on for the judges of the given models.
+
+    - Input: the API model names
+    - Output: None
+    '''
+    streaming_models.update(models)
+
+def disable_streaming(models: list = None) -> None:
+    streaming_models.difference_update(models if models is not None else list(streaming_models))
+
+@contextlib.contextmanager
+def verdict_stream():
+    '''This context manager lets the judge calls made inside it stop at the verdict.'''
+    token = stop_at_verdict.set(True)
+    try:
+        yield
+    finally:
+        stop_at_verdict.reset(token)
+
+def streams(params: dict) -> bool:
+    '''This function tells whether a request is streamed and stopped at the verdict.
+
+    - Input: the keyword arguments of chat.completions.create
+    - Output: True for a single answer of a streamed model inside verdict_stream()
+    '''
+    return (params["model"] in streaming_models and stop_at_verdict.get()
+            and params.get("n", 1) == 1 and not params.get("stream"))
+
+def cache_params(params: dict) -> dict:
+    # Answers stopped at the verdict must not be served to calls expecting the complete answer, and the marker in the
+    # key keeps answers cut by an earlier stopping rule from being served
+    return {**params, "stop_at_verdict": STOP_MARKER}
+
+def find_verdict(text: str, start: int = 0) -> int:
+    '''This function finds the verdict marker that ends a stream in a text.
+
+    - Input: the text and the position from which to search
+    - Output: the position just after the first STOP_MARKER, -1 when the text has none
+    '''
+    position = text.find(STOP_MARKER, start)
+    return position + len(STOP_MARKER) if position >= 0 else -1
+
+def _stats(model: str) -> dict:
+    return streaming_stats.setdefault(model, {"calls": 0, "stopped_early": 0, "verdicts": 0, "chunks": 0, "seconds_to_verdict": 0.0})
+
+class _StreamedAnswer:
+    '''This class collects the chunks of a streamed completion until its verdict.
+
+    - Input: the keyword arguments of chat.completions.create
+    - Output: the answer, whose completion() is the chat completion read so far
+    '''
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.start = time.perf_counter()
+        self.content = ""
+        self.chunks = 0
+        self.finish_reason = None
+        self.usage = None
+        self.logprobs = []
+        self.verdict_seconds = None
+        (self.id, self.created, self.model) = ("", int(time.time()), params["model"])
+
+    def add(self, chunk) -> bool:
+        '''This function adds a chunk and tells whether the verdict is read, such that the stream can be closed.'''
+        (self.id, self.created, self.model) = (chunk.id, chunk.created, chunk.model)
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.finish_reason is not None:
+                self.finish_reason = choice.finish_reason
+            if choice.logprobs is not None and choice.logprobs.content:
+                self.logprobs.extend(choice.logprobs.content)
+            if not choice.delta.content:
+                continue
+            self.chunks += 1
+            # A marker can be split over chunks, so the search starts within the end of the content read before
+            searched = max(0, len(self.content) - len(STOP_MARKER) + 1)
+            self.content += choice.delta.content
+            end = find_verdict(self.content, searched)
+            if end >= 0:
+                self.content = self.content[:end]
+                self.verdict_seconds = time.perf_counter() - self.start
+                return True
+        return False
+
+    def completion(self) -> ChatCompletion:
+        stopped = self.finish_reason is None
+        if self.usage is not None:
+            usage = self.usage.model_dump()
+        else:
+            prompt_tokens = rate_limiter.estimate_prompt_tokens(self.params)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.chunks, "total_tokens": prompt_tokens + self.chunks}
+        with _lock:
+            stats = _stats(self.params["model"])
+            stats["calls"] += 1
+            stats["stopped_early"] += stopped
+            stats["chunks"] += self.chunks
+            if self.verdict_seconds is not None:
+                stats["verdicts"] += 1
+                stats["seconds_to_verdict"] += self.verdict_seconds
+        return ChatCompletion.model_validate({"id": self.id,
+                                              "object": "chat.completion",
+                                              "created": self.created,
+                                              "model": self.model,
+                                              "choices": [{"index": 0,
+                                                           "finish_reason": "stop" if stopped else self.finish_reason,
+                                                           "message": {"role": "assistant", "content": self.content},
+                                                           "logprobs": {"content": [token.model_dump() for token in self.logprobs]} if self.logprobs else None}],
+                                              "usage": usage})
+
+def stream_completion(client: openai.OpenAI, params: dict) -> ChatCompletion:
+    '''This function streams a chat completion and closes the stream once the verdict is read.
+
+    - Input: the client and the keyword arguments of chat.completions.create
+    - Output: the chat completion with the content up to and including the verdict
+    '''
+    answer = _StreamedAnswer(params)
+    stream = client.chat.completions.create(**params, stream=True, stream_options={"include_usage": True})
+    try:
+        for chunk in stream:
+            if answer.add(chunk):
+                break
+    finally:
+        stream.close()
+    return answer.completion()
+
+async def stream_completion_async(client: openai.AsyncOpenAI, params: dict) -> ChatCompletion:
+    '''Asynchronous version of stream_completion.'''
+    answer = _StreamedAnswer(params)
+    stream = await client.chat.completions.create(**params, stream=True, stream_options={"include_usage": True})
+    try:
+        async for chunk in stream:
+            if answer.add(chunk):
+                break
+    finally:
+        await stream.close()
+    return answer.completion()
+
+def print_streaming_stats() -> None:
+    for (model, stats) in streaming_stats.items():
+        line = f"Streaming {model}: {stats['calls']} calls, {stats['stopped_early']} stopped at a hallucinated verdict, {stats['chunks']} chunks read"
+        if stats["verdicts"]:
+            line += f", {stats['seconds_to_verdict'] / stats['verdicts']:.2f}s to the verdict on average"
+        print(line)
+
+def reset_streaming_stats() -> None:
+    with _lock:
+        streaming_stats.clear()
+
+# A run can stream the judges without code changes, e.g. STREAM_VERDICTS="gpt-4o-mini,gpt-4o"
+if os.environ.get("STREAM_VERDICTS"):
+    enable_streaming([model.strip() for model in os.environ["STREAM_VERDICTS"].split(",")])
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+import verdict_probabilities
+
+# Batched statement judges with structured output
+#
+# statement_level and chain_tailored_thoughts send the whole document once per statement. A batched judge sends the
+# document once with all statements of a sentence or of the summary, and answers with a JSON object holding one verdict
+# per statement, in JSON mode or, for the models supporting it, with structured outputs following verdicts_schema.
+# Every answer is validated: it must be JSON, hold exactly one verdict per statement and use the known verdicts.
+# A malformed answer is split: both halves of the statements are judged again in their own batches, down to single
+# statements, which are judged by the judge of the per-statement loop. The verdicts of a batch are turned into the
+# judgements of the loop, "[HALLUCINATED]" or "[SUPPORTED]" after the reasoning, such that the strategies read them as before.
+# The verdict probabilities of a batch are kept only when its answer is valid, a split batch is counted by its halves.
+
+VERDICTS = ("HALLUCINATED", "SUPPORTED")
+
+# The model keys answering with structured outputs, the others in JSON mode (Ollama supports both, phi3 uses JSON mode)
+STRUCTURED_OUTPUT_LLMS = {"gpt4o", "gpt4o_mini"}
+
+# How a batch groups the statements: all statements of one sentence, or all statements of the summary
+BATCH_SCOPES = ("sentence", "summary")
+
+batched_judge_stats = {"batches": 0, "statements": 0, "malformed": 0, "splits": 0, "single_judgements": 0}
+_lock = threading.Lock()
+
+class MalformedVerdicts(ValueError):
+    '''The answer of a batched judge that does not hold one valid verdict per statement.'''
+
+def verdicts_schema(reasoning: bool) -> dict:
+    '''This function gives the JSON schema of the answer of a batched judge.
+
+    - Input: whether every verdict follows a reasoning
+    - Output: the JSON schema
+    '''
+    properties = {"statement": {"type": "integer"}}
+    if reasoning:
+        # The reasoning comes first, such that the verdict is generated after it
+        properties["reasoning"] = {"type": "string"}
+    properties["verdict"] = {"type": "string", "enum": list(VERDICTS)}
+    return {"type": "object",
+            "properties": {"verdicts": {"type": "array",
+                                        "items": {"type": "object",
+                                                  "properties": properties,
+                                                  "required": list(properties),
+                                                  "additionalProperties": False}}},
+            "required": ["verdicts"],
+            "additionalProperties": False}
+
+def verdicts_response_format(LLM: str, reasoning: bool) -> dict:
+    '''This function gives the response_format of a batched judge call.
+
+    - Input: the model key and whether every verdict follows a reasoning
+    - Output: structured outputs with the schema for the models in STRUCTURED_OUTPUT_LLMS, JSON mode for the others
+    '''
+    if LLM in STRUCTURED_OUTPUT_LLMS:
+        return {"type": "json_schema",
+                "json_schema": {"name": "statement_verdicts" if not reasoning else "reasoned_statement_verdicts",
+                                "strict": True,
+                                "schema": verdicts_schema(reasoning)}}
+    return {"type": "json_object"}
+
+def parse_verdicts(content: str, count: int, reasoning: bool) -> list:
+    '''This function validates the answer of a batched judge.
+
+    - Input: the answer, the number of judged statements and whether every verdict follows a reasoning
+    - Output: the judgements in the order of the statements, as the per-statement judge would write them,
+      raising MalformedVerdicts when the answer is not valid
+    '''
+    try:
+        answer = json.loads(content or "")
+    except json.JSONDecodeError as error:
+        raise MalformedVerdicts(f"The answer is not JSON: {error}") from None
+    items = answer.get("verdicts") if isinstance(answer, dict) else None
+    if not isinstance(items, list):
+        raise MalformedVerdicts("The answer has no verdicts array")
+    if len(items) != count:
+        raise MalformedVerdicts(f"The answer has {len(items)} verdicts for {count} statements")
+
+    judgements = [None] * count
+    for item in items:
+        if not isinstance(item, dict):
+            raise MalformedVerdicts(f"The verdict {item!r} is not an object")
+        number = item.get("statement")
+        if not isinstance(number, int) or not 1 <= number <= count or judgements[number - 1] is not None:
+            raise MalformedVerdicts(f"The verdict has an unknown or repeated statement number {number!r}")
+        verdict = str(item.get("verdict", "")).strip().strip("[]").upper()
+        if verdict not in VERDICTS:
+            raise MalformedVerdicts(f"The verdict {item.get('verdict')!r} of statement {number} is unknown")
+        if reasoning and not isinstance(item.get("reasoning"), str):
+            raise MalformedVerdicts(f"The verdict of statement {number} has no reasoning")
+        judgements[number - 1] = (item["reasoning"].strip() + "\n" if reasoning else "") + f"[{verdict}]"
+    return judgements
+
+def _count(name: str, value: int = 1) -> None:
+    with _lock:
+        batched_judge_stats[name] += value
+
+def judge_in_batches(pairs: list, judge_batch, judge_single, reasoning: bool) -> list:
+    '''This function judges statements in one batch, splitting the batch while the answers are malformed.
+
+    - Input: the (highlighted sentence, isolated statement) pairs, a function answering a batch of pairs,
+      a function judging one pair with the per-statement judge and whether every verdict follows a reasoning
+    - Output: the judgements in the order of the pairs
+    '''
+    _count("batches")
+    _count("statements", len(pairs))
+    collected = verdict_probabilities.collected_probabilities.get()
+    with verdict_probabilities.collect_probabilities() as probabilities:
+        content = judge_batch(pairs)
+    try:
+        judgements = parse_verdicts(content, len(pairs), reasoning)
+        if collected is not None:
+            collected.extend(probabilities)
+        return judgements
+    except MalformedVerdicts as error:
+        _count("malformed")
+        print(f"Malformed verdicts for {len(pairs)} statements: {error}")
+    if len(pairs) == 1:
+        _count("single_judgements")
+        return [judge_single(pairs[0])]
+    _count("splits")
+    half = len(pairs) // 2
+    return judge_in_batches(pairs[:half], judge_batch, judge_single, reasoning) + judge_in_batches(pairs[half:], judge_batch, judge_single, reasoning)
+
+async def judge_in_batches_async(pairs: list, judge_batch, judge_single, reasoning: bool) -> list:
+    '''Asynchronous version of judge_in_batches, the halves of a split batch are judged concurrently.'''
+    _count("batches")
+    _count("statements", len(pairs))
+    collected = verdict_probabilities.collected_probabilities.get()
+    with verdict_probabilities.collect_probabilities() as probabilities:
+        content = await judge_batch(pairs)
+    try:
+        judgements = parse_verdicts(content, len(pairs), reasoning)
+        if collected is not None:
+            collected.extend(probabilities)
+        return judgements
+    except MalformedVerdicts as error:
+        _count("malformed")
+        print(f"Malformed verdicts for {len(pairs)} statements: {error}")
+    if len(pairs) == 1:
+        _count("single_judgements")
+        return [await judge_single(pairs[0])]
+    _count("splits")
+    half = len(pairs) // 2
+    (first, second) = await asyncio.gather(judge_in_batches_async(pairs[:half], judge_batch, judge_single, reasoning),
+                                           judge_in_batches_async(pairs[half:], judge_batch, judge_single, reasoning))
+    return first + second
+
+def print_batched_judge_stats() -> None:
+    print(f"Batched judges: {batched_judge_stats['batches']} batches of {batched_judge_stats['statements']} statements, "
+          f"{batched_judge_stats['malformed']} malformed, {batched_judge_stats['splits']} split, "
+          f"{batched_judge_stats['single_judgements']} judged one by one")
+
+def reset_batched_judge_stats() -> None:
+    with _lock:
+        for name in batched_judge_stats:
+            batched_judge_stats[name] = 0
@@ -0,0 +1,91 @@
+import re
+
+# Cheap local suspicion score for sentences and statements of a summary
+#
+# The sequential strategies stop at the first HALLUCINATED verdict, so judging the most suspicious
+# sentence or statement first minimises the number of judge calls on hallucinated summaries.
+# The score combines three signals that need no model call:
+#   - the share of content words that do not occur in the document,
+#   - the share of named entities (capitalized words) that do not occur in the document,
+#   - the share of numbers that do not occur in the document.
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "by", "for", "with", "from", "as",
+    "is", "are", "was", "were", "be", "been", "being", "has", "have", "had", "do", "does", "did", "will", "would",
+    "can", "could", "should", "may", "might", "must", "shall", "not", "no", "it", "its", "this", "that", "these",
+    "those", "he", "she", "they", "them", "his", "her", "their", "him", "we", "us", "our", "you", "your", "i", "me",
+    "my", "who", "whom", "which", "what", "when", "where", "why", "how", "than", "then", "there", "here", "so",
+    "also", "after", "before", "over", "under", "about", "into", "out", "up", "down", "more", "most", "some", "all",
+    "any", "each", "other", "such", "only", "own", "same", "too", "very", "just", "said", "says", "say", "s",
+    "n't", "'s", "while", "during", "since", "until", "because", "being", "both", "between", "against",
+}
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7", "eight": "8",
+    "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "thirteen": "13", "fourteen": "14", "fifteen": "15",
+    "sixteen": "16", "seventeen": "17", "eighteen": "18", "nineteen": "19", "twenty": "20", "thirty": "30",
+    "forty": "40", "fifty": "50", "hundred": "100", "thousand": "1000", "million": "1000000", "billion": "1000000000",
+    "first": "1", "second": "2", "third": "3", "fourth": "4", "fifth": "5",
+}
+
+# Weights of the three signals
+SUSPICION_WEIGHTS = {"words": 1.0, "entities": 1.5, "numbers": 2.0}
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z'\-]*|\d[\d,.]*")
+_ENTITY = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][a-zA-Z'\-]+")
+
+def _normalize_number(token: str) -> str:
+    return token.replace(",", "").rstrip(".")
+
+def content_words(text: str) -> list:
+    return [token.lower() for token in _WORD.findall(text) if token.lower() not in STOPWORDS and not token[0].isdigit()]
+
+def numbers(text: str) -> set:
+    found = {_normalize_number(token) for token in _WORD.findall(text) if token[0].isdigit()}
+    found |= {NUMBER_WORDS[token.lower()] for token in _WORD.findall(text) if token.lower() in NUMBER_WORDS}
+    return found
+
+def entities(text: str) -> set:
+    # Capitalized words that do not start a sentence, which in lowercased datasets is an empty set
+    return {entity.lower() for entity in _ENTITY.findall(text) if entity.lower() not in STOPWORDS}
+
+class DocumentIndex:
+    '''The vocabulary and numbers of a document, computed once and reused for every score.
+
+    - Input: a document
+    - Output: the index object
+    '''
+
+    def __init__(self, document: str):
+        self.words = {token.lower() for token in _WORD.findall(document)}
+        self.numbers = numbers(document)
+
+def suspicion_score(document_index: DocumentIndex, text: str) -> float:
+    '''This function scores how likely a sentence or statement is hallucinated, without any model call.
+
+    - Input: the index of the document and a sentence or statement
+    - Output: the score, higher is more suspicious
+    '''
+    words = content_words(text)
+    unseen_words = sum(word not in document_index.words for word in words) / len(words) if words else 0.0
+
+    text_entities = entities(text)
+    unseen_entities = sum(entity not in document_index.words for entity in text_entities) / len(text_entities) if text_entities else 0.0
+
+    text_numbers = numbers(text)
+    missing_numbers = sum(number not in document_index.numbers for number in text_numbers) / len(text_numbers) if text_numbers else 0.0
+
+    return (SUSPICION_WEIGHTS["words"] * unseen_words
+            + SUSPICION_WEIGHTS["entities"] * unseen_entities
+            + SUSPICION_WEIGHTS["numbers"] * missing_numbers)
+
+def order_by_suspicion(document: str, items: list, key=None) -> list:
+    '''This function orders sentences or statements from most to least suspicious.
+    Ties keep the order of the summary.
+
+    - Input: a document, the sentences or statements of its summary and optionally a function that returns the text of an item
+    - Output: the reordered list
+    '''
+    document_index = DocumentIndex(document)
+    scores = [suspicion_score(document_index, key(item) if key else item) for item in items]
+    return [items[index] for index in sorted(range(len(items)), key=lambda index: -scores[index])]
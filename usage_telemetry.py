@@ -0,0 +1,135 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+from openai.types.chat import ChatCompletion
+
+# Token and latency telemetry per strategy
+#
+# Every answered API call reports its prompt tokens and usage.prompt_tokens_details.cached_tokens, the part of
+# the prompt served from the provider's prefix cache. The calls are attributed to the strategy that made them
+# through a context variable, which follows the strategies into threads started with a copied context and into asyncio tasks.
+# Answers from the response cache are not API calls and are not counted.
+
+# The strategy the current call belongs to
+current_strategy = contextvars.ContextVar("current_strategy", default="other")
+
+# Counters per strategy, the latencies are summed separately for calls with and without cached prompt tokens
+usage_stats = {}
+_lock = threading.Lock()
+
+def _new_stats() -> dict:
+    return {"calls": 0,
+            "cached_calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "timed_cached_calls": 0,
+            "timed_uncached_calls": 0,
+            "cached_latency": 0.0,
+            "uncached_latency": 0.0}
+
+@contextlib.contextmanager
+def strategy_context(name: str):
+    '''This context manager attributes the calls made inside it to a strategy.'''
+    token = current_strategy.set(name)
+    try:
+        yield
+    finally:
+        current_strategy.reset(token)
+
+def track_strategy(function):
+    '''This decorator attributes the calls made by a strategy function, sync or async, to the strategy.
+    The _async suffix is dropped, such that both versions of a strategy share their counters.'''
+    name = function.__name__.removesuffix("_async")
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with strategy_context(name):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with strategy_context(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+def record_usage(response: ChatCompletion, latency: float = None) -> None:
+    '''This function adds the usage of an answered API call to the counters of the current strategy.
+
+    - Input: the chat completion and the latency of the call in seconds (None when not measured, e.g. in batch mode)
+    - Output: None
+    '''
+    usage = response.usage
+    if usage is None:
+        return
+    details = usage.prompt_tokens_details
+    cached_tokens = (details.cached_tokens or 0) if details is not None else 0
+
+    with _lock:
+        stats = usage_stats.setdefault(current_strategy.get(), _new_stats())
+        stats["calls"] += 1
+        stats["cached_calls"] += cached_tokens > 0
+        stats["prompt_tokens"] += usage.prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        stats["completion_tokens"] += usage.completion_tokens
+        if latency is not None:
+            if cached_tokens > 0:
+                stats["timed_cached_calls"] += 1
+                stats["cached_latency"] += latency
+            else:
+                stats["timed_uncached_calls"] += 1
+                stats["uncached_latency"] += latency
+
+def usage_summary() -> dict:
+    '''This function summarizes the counters per strategy.
+    The saved latency is estimated as the difference of the mean latency without and with cached tokens, times the calls with cached tokens.
+
+    - Input: None
+    - Output: a dict from strategy to its calls, tokens, cached share, mean latencies and estimated saved seconds
+    '''
+    summary = {}
+    with _lock:
+        for (strategy, stats) in usage_stats.items():
+            mean_cached = stats["cached_latency"] / stats["timed_cached_calls"] if stats["timed_cached_calls"] else None
+            mean_uncached = stats["uncached_latency"] / stats["timed_uncached_calls"] if stats["timed_uncached_calls"] else None
+            saved = None
+            if mean_cached is not None and mean_uncached is not None:
+                saved = (mean_uncached - mean_cached) * stats["timed_cached_calls"]
+            summary[strategy] = {"calls": stats["calls"],
+                                 "prompt_tokens": stats["prompt_tokens"],
+                                 "completion_tokens": stats["completion_tokens"],
+                                 "cached_tokens": stats["cached_tokens"],
+                                 "cached_share": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+                                 "mean_latency_cached": mean_cached,
+                                 "mean_latency_uncached": mean_uncached,
+                                 "estimated_latency_saved": saved}
+    return summary
+
+def usage_totals() -> dict:
+    '''This function sums the calls and the prompt and completion tokens of all strategies.'''
+    with _lock:
+        return {"calls": sum(stats["calls"] for stats in usage_stats.values()),
+                "tokens": sum(stats["prompt_tokens"] + stats["completion_tokens"] for stats in usage_stats.values())}
+
+def print_usage_stats() -> None:
+    for (strategy, summary) in sorted(usage_summary().items()):
+        line = (f"{strategy}: {summary['calls']} calls, {summary['prompt_tokens']} prompt tokens, "
+                f"{summary['cached_share']:.1%} cached, {summary['completion_tokens']} completion tokens")
+        if summary["estimated_latency_saved"] is not None:
+            line += (f", {summary['mean_latency_cached']:.2f}s with and {summary['mean_latency_uncached']:.2f}s without cached tokens"
+                     f" (about {summary['estimated_latency_saved']:.0f}s saved)")
+        print(line)
+
+def reset_usage_stats() -> None:
+    with _lock:
+        usage_stats.clear()
+
+# A run can print the counters at exit without code changes, e.g. USAGE_STATS=1 python Chain_Tailored_Toughts_HaluEval.py
+if os.environ.get("USAGE_STATS"):
+    atexit.register(print_usage_stats)
@@ -0,0 +1,154 @@
+import contextlib
+import contextvars
+import functools
+import os
+import re
+import threading
+from openai.types.chat import ChatCompletion
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Verdict-only judges
+#
+# The final judges of the debates and of knowledge filtering are told not to give an explanation, but nothing holds
+# the models to it. With verdict-only mode on for a model, the calls made inside verdict_only_judge() are limited to
+# VERDICT_MAX_TOKENS completion tokens and stop at the closing bracket of the label. For the OpenAI models the tokens
+# of the labels are also favoured with a logit_bias, when tiktoken knows the encoding of the model; Ollama ignores
+# logit_bias, so phi3 is held to the labels by max_tokens and the stop sequence alone.
+#
+# The stop sequence is not part of the answer, so the answer is replaced by the first label it contains, e.g.
+# "[HALLUCINATED" becomes "[HALLUCINATED]". A bracketed label comes before a bare word, and a bare word only counts when
+# it is whole and not negated. An answer without a label is kept as it is and counted as unlabelled.
+# Switch it on with enable_verdict_only or VERDICT_ONLY="gpt-4o" (API model names).
+
+HALLUCINATION_LABELS = ("[HALLUCINATED]", "[SUPPORTED]")
+TRUTH_LABELS = ("[TRUE]", "[FALSE]")
+
+VERDICT_MAX_TOKENS = 8
+# A mild bias, strong enough to keep the answer on the labels without choosing between them
+VERDICT_LOGIT_BIAS = 5
+
+# The API model names whose judges answer with the verdict only
+verdict_only_models = set()
+
+# The labels the current call is restricted to
+verdict_labels = contextvars.ContextVar("verdict_labels", default=None)
+
+# Counters per API model name
+verdict_only_stats = {}
+_lock = threading.Lock()
+
+def enable_verdict_only(models: list = ("gpt-4o",)) -> None:
+    '''This function switches verdict-only mode on for the judges of the given models.
+
+    - Input: the API model names
+    - Output: None
+    '''
+    verdict_only_models.update(models)
+
+def disable_verdict_only(models: list = None) -> None:
+    verdict_only_models.difference_update(models if models is not None else list(verdict_only_models))
+
+@contextlib.contextmanager
+def verdict_only_judge(labels: tuple = HALLUCINATION_LABELS):
+    '''This context manager restricts the judge calls made inside it to the labels.'''
+    token = verdict_labels.set(labels)
+    try:
+        yield
+    finally:
+        verdict_labels.reset(token)
+
+def labels_for(params: dict) -> tuple:
+    '''This function gives the labels a request is restricted to.
+
+    - Input: the keyword arguments of chat.completions.create
+    - Output: the labels for a single answer of a verdict-only model inside verdict_only_judge(), None otherwise
+    '''
+    labels = verdict_labels.get()
+    if labels is None or params["model"] not in verdict_only_models or params.get("n", 1) != 1:
+        return None
+    return labels
+
+@functools.lru_cache(maxsize=None)
+def label_logit_bias(model: str, labels: tuple) -> dict:
+    '''This function favours the tokens of the labels for an OpenAI model.
+
+    - Input: the API model name and the labels
+    - Output: the logit_bias from token id to bias, empty without tiktoken or for models it does not know
+    '''
+    if tiktoken is None:
+        return {}
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Local models such as phi3:14b-instruct have their own vocabulary
+        return {}
+    except Exception:
+        # The encoding files could not be loaded, e.g. without network access and without TIKTOKEN_CACHE_DIR
+        return {}
+    return {str(token): VERDICT_LOGIT_BIAS for label in labels for token in encoding.encode(label)}
+
+def constrain(params: dict, labels: tuple) -> dict:
+    '''This function limits a request to a short answer with one of the labels.
+
+    - Input: the keyword arguments of chat.completions.create and the labels
+    - Output: the keyword arguments with max_tokens, stop and, where supported, logit_bias
+    '''
+    constrained = {**params, "max_tokens": VERDICT_MAX_TOKENS, "stop": ["]"]}
+    logit_bias = label_logit_bias(params["model"], labels)
+    if logit_bias:
+        constrained["logit_bias"] = logit_bias
+    return constrained
+
+# A label after its opening bracket, the closing bracket is cut off by the stop sequence
+_BRACKETED = r"\[\s*{}\b"
+# A label as a whole word that is not negated, such that "UNSUPPORTED" and "NOT SUPPORTED" are no "[SUPPORTED]"
+_BARE = r"(?<!\bNOT )(?<!\bUN-)\b{}\b"
+
+def find_label(content: str, labels: tuple) -> str:
+    '''This function finds the first label in an answer, preferring a bracketed label over a bare word.
+
+    - Input: the answer and the labels
+    - Output: the label, None when the answer has none
+    '''
+    upper = (content or "").upper()
+    for pattern in (_BRACKETED, _BARE):
+        positions = [(match.start(), label) for label in labels
+                     for match in [re.search(pattern.format(re.escape(label.strip("[]"))), upper)] if match]
+        if positions:
+            return min(positions)[1]
+    return None
+
+def canonical(response: ChatCompletion, labels: tuple, model: str) -> ChatCompletion:
+    '''This function replaces the answer of a verdict-only call by its label.
+
+    - Input: the chat completion, the labels (None for a call that is not verdict-only) and the API model name
+    - Output: the chat completion with the label as its content, unchanged without labels or when no label is found
+    '''
+    if labels is None:
+        return response
+    label = find_label(response.choices[0].message.content, labels)
+    with _lock:
+        stats = verdict_only_stats.setdefault(model, {"calls": 0, "unlabelled": 0})
+        stats["calls"] += 1
+        stats["unlabelled"] += label is None
+    if label is None:
+        return response
+    response = response.model_copy(deep=True)
+    response.choices[0].message.content = label
+    return response
+
+def print_verdict_only_stats() -> None:
+    for (model, stats) in verdict_only_stats.items():
+        print(f"Verdict-only {model}: {stats['calls']} calls, {stats['unlabelled']} without a label")
+
+def reset_verdict_only_stats() -> None:
+    with _lock:
+        verdict_only_stats.clear()
+
+# A run can restrict the judges without code changes, e.g. VERDICT_ONLY="gpt-4o"
+if os.environ.get("VERDICT_ONLY"):
+    enable_verdict_only([model.strip() for model in os.environ["VERDICT_ONLY"].split(",")])
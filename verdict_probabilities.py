@@ -0,0 +1,166 @@
+import contextlib
+import contextvars
+import json
+import math
+import os
+import re
+from openai.types.chat import ChatCompletion
+
+# Verdict probabilities from logprobs
+#
+# The strategies turn every judgement into a hard 0/1 by looking for the verdict, so another trade-off between
+# precision and recall takes another run. With verdict probabilities on for a model, every judge call asks for the
+# logprobs of its tokens and of the TOP_LOGPROBS alternatives of each token. The token where the verdict is decided,
+# the first letter of the last label in the answer, gives P(hallucinated): the probability of the alternatives that
+# continue the hallucinated label, normalized over the alternatives that continue any of the labels.
+#
+# A judge call is recognized by its prompt, which asks for both labels of a pair. The probabilities of the judge calls
+# made inside collect_probabilities() are collected in order, one per judged sentence or statement for the decomposed
+# strategies, and the probability of a summary is the largest of them, the same rule as the hard verdict at 0.5.
+# A batched statement judge asks for the labels without brackets in a JSON answer with a response_format; it gives one
+# probability per "verdict" value, in the order of the statements. The batches structured_verdicts finds malformed
+# are judged again in halves, so their probabilities are dropped there.
+# Switch it on with enable_verdict_probabilities or VERDICT_PROBABILITIES="gpt-4o-mini,gpt-4o" (API model names).
+
+# The label pairs, the first label of a pair meaning hallucinated
+LABEL_PAIRS = (("[HALLUCINATED]", "[SUPPORTED]"), ("[TRUE]", "[FALSE]"))
+# The labels of the batched statement judges, written as JSON values
+BATCH_LABELS = ("HALLUCINATED", "SUPPORTED")
+
+# The start of a verdict value in a JSON answer, a label in brackets included
+_VERDICT_VALUE = re.compile(r'"verdict"\s*:\s*"\[?')
+
+TOP_LOGPROBS = 5
+
+# The API model names whose judges return probabilities
+probability_models = set()
+
+# The probabilities of the judge calls of the current judgement
+collected_probabilities = contextvars.ContextVar("collected_probabilities", default=None)
+
+def enable_verdict_probabilities(models: list = ("gpt-4o-mini", "gpt-4o")) -> None:
+    '''This function switches the logprobs of the judge calls on for the given models.
+
+    - Input: the API model names
+    - Output: None
+    '''
+    probability_models.update(models)
+
+def disable_verdict_probabilities(models: list = None) -> None:
+    probability_models.difference_update(models if models is not None else list(probability_models))
+
+@contextlib.contextmanager
+def collect_probabilities():
+    '''This context manager collects the probabilities of the judge calls made inside it into the list it yields.'''
+    probabilities = []
+    token = collected_probabilities.set(probabilities)
+    try:
+        yield probabilities
+    finally:
+        collected_probabilities.reset(token)
+
+def judge_labels(params: dict) -> tuple:
+    '''This function recognizes a judge call of a model with verdict probabilities on.
+
+    - Input: the keyword arguments of chat.completions.create
+    - Output: the label pair the prompt asks for, None for other calls
+    '''
+    if params["model"] not in probability_models or params.get("n", 1) != 1:
+        return None
+    prompt = "\n".join(str(message.get("content", "")) for message in params["messages"])
+    for labels in LABEL_PAIRS:
+        if all(label in prompt for label in labels):
+            return labels
+    if params.get("response_format") is not None and all(label in prompt for label in BATCH_LABELS):
+        return BATCH_LABELS
+    return None
+
+def request_logprobs(params: dict) -> dict:
+    return {**params, "logprobs": True, "top_logprobs": TOP_LOGPROBS}
+
+def _label_probability(tokens: list, text: str, start: int, labels: tuple) -> float:
+    # The token holding the first letter of the label starting at start decides between the labels
+    letter = start + 1 if labels[0].startswith("[") else start
+    offset = 0
+    for token in tokens:
+        if offset + len(token.token) > letter:
+            break
+        offset += len(token.token)
+    before = text[offset:start]
+    inside = text[start:offset]
+
+    mass = dict.fromkeys(labels, 0.0)
+    for alternative in token.top_logprobs or [token]:
+        if not alternative.token.startswith(before):
+            continue
+        continuation = inside + alternative.token[len(before):]
+        if not continuation:
+            continue
+        for label in labels:
+            if label.startswith(continuation) or continuation.startswith(label):
+                mass[label] += math.exp(alternative.logprob)
+    total = sum(mass.values())
+    return mass[labels[0]] / total if total > 0 else None
+
+def verdict_probability(response: ChatCompletion, labels: tuple) -> float:
+    '''This function computes the probability of the first label of a pair from the logprobs of an answer.
+
+    - Input: the chat completion, requested with logprobs, and the label pair
+    - Output: the probability, None when the answer has no logprobs or no label
+    '''
+    logprobs = response.choices[0].logprobs
+    tokens = logprobs.content if logprobs is not None else None
+    if not tokens:
+        return None
+    # The answer as the model produced it, the closing bracket of the label may be cut by a stop sequence
+    text = "".join(token.token for token in tokens)
+    (start, _) = max((text.rfind(label[:-1]), label) for label in labels)
+    if start < 0:
+        return None
+    return _label_probability(tokens, text, start, labels)
+
+def batch_verdict_probabilities(response: ChatCompletion) -> list:
+    '''This function computes the probability of HALLUCINATED for every verdict of a batched statement judge.
+
+    - Input: the chat completion, requested with logprobs
+    - Output: the probabilities in the order of the statement numbers, empty when the answer has no logprobs
+    '''
+    logprobs = response.choices[0].logprobs
+    tokens = logprobs.content if logprobs is not None else None
+    if not tokens:
+        return []
+    text = "".join(token.token for token in tokens)
+    probabilities = [_label_probability(tokens, text, match.end(), BATCH_LABELS) for match in _VERDICT_VALUE.finditer(text)
+                     if text.startswith(BATCH_LABELS, match.end())]
+    # The verdicts may be answered out of order, they are put in the order of their statement numbers when it is known
+    try:
+        numbers = [item["statement"] for item in json.loads(text)["verdicts"]]
+    except (ValueError, TypeError, KeyError):
+        numbers = None
+    if numbers is not None and len(numbers) == len(probabilities) and all(isinstance(number, int) for number in numbers):
+        probabilities = [probability for (_, probability) in sorted(zip(numbers, probabilities), key=lambda pair: pair[0])]
+    return [probability for probability in probabilities if probability is not None]
+
+def record(response: ChatCompletion, labels: tuple) -> None:
+    '''This function adds the probability of a judge call to the collected probabilities, if they are collected.
+
+    - Input: the chat completion and the label pair of the judge, None for other calls
+    - Output: None
+    '''
+    probabilities = collected_probabilities.get()
+    if labels is None or probabilities is None:
+        return
+    if labels == BATCH_LABELS:
+        probabilities.extend(batch_verdict_probabilities(response))
+        return
+    probability = verdict_probability(response, labels)
+    if probability is not None:
+        probabilities.append(probability)
+
+def summary_probability(probabilities: list) -> float:
+    # A summary is hallucinated as soon as one of its judgements is
+    return max(probabilities) if probabilities else None
+
+# A run can collect probabilities without code changes, e.g. VERDICT_PROBABILITIES="gpt-4o-mini,gpt-4o"
+if os.environ.get("VERDICT_PROBABILITIES"):
+    enable_verdict_probabilities([model.strip() for model in os.environ["VERDICT_PROBABILITIES"].split(",")])